@@ -1,9 +1,11 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
 from django.db import connection
 from django.core.cache import cache
 from drf_spectacular.utils import extend_schema
+from shortener.code_filter import ShortCodeFilter
 
 
 class HealthCheckView(APIView):
@@ -14,7 +16,7 @@ class HealthCheckView(APIView):
     permission_classes = []
 
     @extend_schema(
-        description="Check health status of the service (DB and Redis).",
+        description="Check health status of the service (DB and Redis), plus short code filter metrics.",
         responses={200: dict, 503: dict},
     )
     def get(self, request):
@@ -41,6 +43,15 @@ class HealthCheckView(APIView):
             health_status["status"] = "error"
             health_status["components"]["redis"] = f"unhealthy: {str(e)}"
 
+        # Short code filter effectiveness (not part of the health verdict)
+        if settings.SHORT_CODE_FILTER_ENABLED:
+            try:
+                health_status["metrics"] = {
+                    "short_code_filter": ShortCodeFilter().stats()
+                }
+            except Exception as e:
+                health_status["metrics"] = {"short_code_filter": f"unavailable: {e}"}
+
         status_code = (
             status.HTTP_200_OK
             if health_status["status"] == "ok"
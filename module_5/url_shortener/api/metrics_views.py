@@ -0,0 +1,38 @@
+import ipaddress
+import secrets
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views import View
+from prometheus_client import CONTENT_TYPE_LATEST
+from core.metrics import render_latest
+
+
+class MetricsView(View):
+    """
+    Prometheus scrape endpoint: request latency and DB query histograms,
+    redirect cache hit/miss counters and Celery enqueue latency.
+    A plain Django view, so scrapes skip DRF authentication and throttling.
+    Scrapes need METRICS_AUTH_TOKEN as a bearer token when it is set, and
+    otherwise must come from METRICS_ALLOWED_NETWORKS (loopback by default).
+    """
+
+    def get(self, request):
+        if not self.is_authorized(request):
+            return HttpResponseForbidden()
+        return HttpResponse(render_latest(), content_type=CONTENT_TYPE_LATEST)
+
+    def is_authorized(self, request) -> bool:
+        token = settings.METRICS_AUTH_TOKEN
+        if token:
+            header = request.META.get("HTTP_AUTHORIZATION", "")
+            return secrets.compare_digest(header, f"Bearer {token}")
+
+        # The socket address: X-Forwarded-For is set by the client
+        try:
+            address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+        except ValueError:
+            return False
+        return any(
+            address in ipaddress.ip_network(network)
+            for network in settings.METRICS_ALLOWED_NETWORKS
+        )
@@ -1,4 +1,7 @@
+from django.conf import settings
+from django.db.models import F
 from rest_framework import serializers
+from shortener.click_counter import ClickCounter
 from shortener.models import URL, Tag
 
 
@@ -47,13 +50,44 @@ class ShortenUrlSerializer(serializers.Serializer):
         return value
 
 
+class BulkShortenUrlSerializer(serializers.Serializer):
+    """
+    Serializer for the bulk shortening envelope.
+    Items are validated individually so one bad URL does not reject the batch.
+    """
+
+    urls = serializers.ListField(
+        child=serializers.DictField(),
+        min_length=1,
+        max_length=settings.BULK_SHORTEN_MAX_URLS,
+        help_text="List of URL objects, each accepting the single-create fields.",
+    )
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ["name"]
 
 
+class URLDetailListSerializer(serializers.ListSerializer):
+    """
+    Fetches the unflushed clicks of a whole page in one round trip.
+    """
+
+    def to_representation(self, data):
+        url_objs = list(data.all() if hasattr(data, "all") else data)
+        self.child.pending_clicks = ClickCounter().pending(
+            url_obj.id for url_obj in url_objs
+        )
+        return super().to_representation(url_objs)
+
+
 class URLDetailSerializer(serializers.ModelSerializer):
+    """
+    click_count includes the clicks still pending in the ClickCounter.
+    """
+
     owner_username = serializers.CharField(source="owner.username", read_only=True)
     tags = TagSerializer(many=True, read_only=True)
 
@@ -70,3 +104,82 @@ class URLDetailSerializer(serializers.ModelSerializer):
             "tags",
             "created_at",
         ]
+        list_serializer_class = URLDetailListSerializer
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        pending = getattr(self, "pending_clicks", None)
+        if pending is None:
+            pending = ClickCounter().pending([instance.id])
+        data["click_count"] += pending.get(instance.id, 0)
+        return data
+
+
+class URLListRowSerializer:
+    """
+    Values-based equivalent of URLDetailSerializer(many=True) for the list
+    endpoint: no model instances or nested serializers are built. Tags and
+    pending clicks are fetched once per page.
+
+    The output keys and their representation come from the detail
+    serializer's own fields, so the two cannot drift apart.
+    """
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    @staticmethod
+    def get_fields():
+        fields = URLDetailSerializer().fields
+        return {name: fields[name] for name in URLDetailSerializer.Meta.fields}
+
+    @staticmethod
+    def get_column(name, field):
+        # Related sources (owner.username) are joined in under the field name
+        return name if len(field.source_attrs) > 1 else field.source
+
+    @classmethod
+    def values(cls, queryset):
+        """
+        queryset.values() with every column the detail output needs.
+        """
+        columns, joined = ["id"], {}
+        for name, field in cls.get_fields().items():
+            if isinstance(field, serializers.ListSerializer):
+                continue
+            if len(field.source_attrs) > 1:
+                joined[name] = F("__".join(field.source_attrs))
+            else:
+                columns.append(field.source)
+        return queryset.values(*columns, **joined)
+
+    def get_tags(self, url_ids, tag_serializer):
+        names = tag_serializer.child.Meta.fields
+        tags = {}
+        for row in URL.tags.through.objects.filter(url_id__in=url_ids).values(
+            "url_id", *(f"tag__{name}" for name in names)
+        ):
+            tags.setdefault(row["url_id"], []).append(
+                {name: row[f"tag__{name}"] for name in names}
+            )
+        return tags
+
+    @property
+    def data(self):
+        fields = self.get_fields()
+        url_ids = [row["id"] for row in self.rows]
+        tags = self.get_tags(url_ids, fields["tags"])
+        pending = ClickCounter().pending(url_ids)
+
+        results = []
+        for row in self.rows:
+            item = {}
+            for name, field in fields.items():
+                if isinstance(field, serializers.ListSerializer):
+                    item[name] = tags.get(row["id"], [])
+                    continue
+                value = row[self.get_column(name, field)]
+                item[name] = None if value is None else field.to_representation(value)
+            item["click_count"] += pending.get(row["id"], 0)
+            results.append(item)
+        return results
@@ -1,6 +1,7 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
+    BulkShortenUrlView,
     ShortenUrlView,
     UrlAnalyticsView,
     UrlDetailView,
@@ -16,6 +17,7 @@ urlpatterns = [
     path("auth/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     # URL Operations
     path("urls/", ShortenUrlView.as_view(), name="url_list_create"),
+    path("urls/bulk/", BulkShortenUrlView.as_view(), name="url_bulk_create"),
     path("urls/<str:short_code>/", UrlDetailView.as_view(), name="url_detail"),
     path(
         "analytics/<str:short_code>/",
@@ -1,10 +1,14 @@
+import logging
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.generics import GenericAPIView
-from rest_framework.pagination import PageNumberPagination
+from asgiref.sync import sync_to_async
 from django.shortcuts import redirect
-from django.core.cache import cache
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.http import HttpResponseRedirect, JsonResponse
+from django.views import View
 from drf_spectacular.utils import (
     extend_schema,
     OpenApiExample,
@@ -12,13 +16,30 @@ from drf_spectacular.utils import (
     OpenApiParameter,
 )
 from rest_framework.permissions import IsAuthenticated
+from .pagination import KeysetPagination
 from .permissions import IsOwnerOrReadOnly
 
-from .serializers import ShortenUrlSerializer, URLDetailSerializer
+from .serializers import (
+    BulkShortenUrlSerializer,
+    ShortenUrlSerializer,
+    URLDetailSerializer,
+    URLListRowSerializer,
+)
 from shortener.services import UrlShortenerService
-from shortener.repositories import ORMUrlRepository
-from shortener.models import URL
-from shortener.tasks import fetch_url_preview_task, track_click_task
+from shortener.repositories import get_url_repository
+from shortener.models import URL, DailyClickRollup, HourlyClickRollup, User
+from shortener.click_buffer import ClickBuffer
+from shortener.click_counter import ClickCounter
+from shortener.code_filter import ShortCodeFilter
+from shortener.code_pool import ShortCodePool
+from shortener.preview_queue import PreviewQueue
+from shortener.redirect_cache import MISSING, redirect_cache
+from shortener.rollups import truncate_day, truncate_hour
+from shortener.tags import tag_cache
+
+logger = logging.getLogger(__name__)
+
+FREE_TIER_ACTIVE_URL_LIMIT = 10
 
 
 class ShortenUrlView(GenericAPIView):
@@ -28,12 +49,13 @@ class ShortenUrlView(GenericAPIView):
 
     serializer_class = ShortenUrlSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = PageNumberPagination
+    pagination_class = KeysetPagination
     throttle_scope = "url_create"
 
     def get_service(self):
-        repo = ORMUrlRepository()
-        return UrlShortenerService(repo)
+        repo = get_url_repository()
+        code_pool = ShortCodePool() if settings.SHORT_CODE_POOL_ENABLED else None
+        return UrlShortenerService(repo, code_pool=code_pool)
 
     @extend_schema(
         request=ShortenUrlSerializer,
@@ -79,11 +101,9 @@ class ShortenUrlView(GenericAPIView):
             custom_alias = serializer.validated_data.get("custom_alias")
 
             # Tiered Logic: Limit Free users to 10 URLs
+            # (denormalized counter, no scan of the user's URLs)
             if not user.is_premium:
-                active_url_count = URL.objects.filter(
-                    owner=user, is_active=True
-                ).count()
-                if active_url_count >= 10:
+                if user.active_url_count >= FREE_TIER_ACTIVE_URL_LIMIT:
                     return Response(
                         {
                             "error": "Free users are limited to 10 active URLs. Upgrade to Premium for unlimited access."
@@ -110,9 +130,8 @@ class ShortenUrlView(GenericAPIView):
                     expires_at=serializer.validated_data.get("expires_at"),
                 )
 
-                # Trigger Async Preview Fetch
-                url_obj = URL.objects.get(short_code=short_code)
-                fetch_url_preview_task.delay(url_obj.id, original_url)
+                # Queue for the batched async preview worker
+                PreviewQueue().add([short_code])
 
                 full_short_url = request.build_absolute_uri(f"/{short_code}/")
 
@@ -130,7 +149,7 @@ class ShortenUrlView(GenericAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @extend_schema(
-        description="List all shortened URLs owned by the authenticated user. Supports pagination and search by tag.",
+        description="List all shortened URLs owned by the authenticated user, newest first. Cursor-paginated: follow the next/previous links. Supports search by tag.",
         responses={200: URLDetailSerializer(many=True)},
         parameters=[
             OpenApiParameter(
@@ -142,21 +161,174 @@ class ShortenUrlView(GenericAPIView):
         ],
     )
     def get(self, request):
-        # Optimized query using the manager method we defined earlier
-        urls = URL.objects.filter(owner=request.user).with_details()
+        # Plain rows, owner name joined in; the (owner, created_at) index
+        # serves the keyset pagination
+        urls = URL.objects.filter(owner=request.user)
 
-        # Search by tag
+        # Search by tag: resolve the id once (cached), then filter the
+        # through table on its tag_id index instead of joining on the name
         tag_name = request.query_params.get("tag")
         if tag_name:
-            urls = urls.filter(tags__name__iexact=tag_name)
+            tag_id = tag_cache.lookup(tag_name)
+            if tag_id is None:
+                urls = urls.none()
+            else:
+                urls = urls.filter(
+                    id__in=URL.tags.through.objects.filter(tag_id=tag_id).values(
+                        "url_id"
+                    )
+                )
 
-        page = self.paginate_queryset(urls)
+        rows = URLListRowSerializer.values(urls)
+        page = self.paginate_queryset(rows)
         if page is not None:
-            serializer = URLDetailSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            return self.get_paginated_response(URLListRowSerializer(page).data)
+
+        rows = rows.order_by("-created_at", "-id")
+        return Response(URLListRowSerializer(rows).data, status=status.HTTP_200_OK)
+
+
+class BulkShortenUrlView(APIView):
+    """
+    API View to shorten many URLs in a single request.
+    """
+
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "url_bulk_create"
+
+    def get_service(self):
+        repo = get_url_repository()
+        code_pool = ShortCodePool() if settings.SHORT_CODE_POOL_ENABLED else None
+        return UrlShortenerService(repo, code_pool=code_pool)
+
+    @extend_schema(
+        request=BulkShortenUrlSerializer,
+        responses={
+            201: OpenApiResponse(
+                description="Per-item results, in request order.",
+                examples=[
+                    OpenApiExample(
+                        "Partial Success",
+                        value={
+                            "results": [
+                                {
+                                    "index": 0,
+                                    "short_code": "Ab123",
+                                    "short_url": "http://localhost:8000/Ab123/",
+                                },
+                                {"index": 1, "errors": {"url": ["Enter a valid URL."]}},
+                            ]
+                        },
+                    )
+                ],
+            ),
+            400: OpenApiResponse(description="No item in the batch was valid."),
+            403: OpenApiResponse(description="Batch exceeds the Free tier limit."),
+        },
+        description=f"Shorten up to {settings.BULK_SHORTEN_MAX_URLS} URLs at once. Each item accepts the same fields as the single-create endpoint; invalid items are reported individually.",
+    )
+    def post(self, request):
+        envelope = BulkShortenUrlSerializer(data=request.data)
+        if not envelope.is_valid():
+            return Response(envelope.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        results = []
+        entries = []
+        for index, item in enumerate(envelope.validated_data["urls"]):
+            serializer = ShortenUrlSerializer(data=item, context={"request": request})
+            if not serializer.is_valid():
+                results.append({"index": index, "errors": serializer.errors})
+                continue
+
+            custom_alias = serializer.validated_data.get("custom_alias")
+            if custom_alias and not user.is_premium:
+                results.append(
+                    {
+                        "index": index,
+                        "error": "Custom aliases are only available for Premium users.",
+                    }
+                )
+                continue
+
+            entries.append(
+                (
+                    index,
+                    {
+                        "original_url": serializer.validated_data["url"],
+                        "custom_alias": custom_alias,
+                        "tags": serializer.validated_data.get("tags"),
+                        "expires_at": serializer.validated_data.get("expires_at"),
+                    },
+                )
+            )
+
+        if not entries:
+            return Response({"results": results}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Tiered Logic: enforce the Free limit once for the whole batch
+        if not user.is_premium:
+            if user.active_url_count + len(entries) > FREE_TIER_ACTIVE_URL_LIMIT:
+                return Response(
+                    {
+                        "error": f"Free users are limited to {FREE_TIER_ACTIVE_URL_LIMIT} active URLs. This batch would exceed the limit."
+                    },
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+
+        service = self.get_service()
+        try:
+            outcomes = service.shorten_urls_bulk(
+                [entry for _, entry in entries], user=user
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        created_codes = []
+        for (index, _), outcome in zip(entries, outcomes):
+            if "short_code" in outcome:
+                short_code = outcome["short_code"]
+                created_codes.append(short_code)
+                outcome["short_url"] = request.build_absolute_uri(f"/{short_code}/")
+            results.append({"index": index, **outcome})
+
+        # Queue the whole batch for the async preview worker
+        PreviewQueue().add(created_codes)
+
+        results.sort(key=lambda result: result["index"])
+        return Response(
+            {"results": results},
+            status=(
+                status.HTTP_201_CREATED
+                if created_codes
+                else status.HTTP_400_BAD_REQUEST
+            ),
+        )
+
 
-        serializer = URLDetailSerializer(urls, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+def get_client_ip(request):
+    x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(",")[0]
+    else:
+        ip = request.META.get("REMOTE_ADDR")
+    return ip
+
+
+def build_click_data(request) -> dict:
+    """
+    Collect the click details buffered for analytics on each redirect.
+    Country and city are added by the ingestion worker (shortener.geoip).
+    """
+    return {
+        "ip_address": get_client_ip(request),
+        "user_agent": request.META.get("HTTP_USER_AGENT"),
+        "referrer": request.META.get("HTTP_REFERER"),
+    }
 
 
 class RedirectView(APIView):
@@ -165,93 +337,98 @@ class RedirectView(APIView):
     """
 
     def get_service(self):
-        repo = ORMUrlRepository()
-        return UrlShortenerService(repo)
+        repo = get_url_repository()
+        code_filter = ShortCodeFilter() if settings.SHORT_CODE_FILTER_ENABLED else None
+        return UrlShortenerService(repo, code_filter=code_filter)
 
     def get_client_ip(self, request):
-        x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(",")[0]
-        else:
-            ip = request.META.get("REMOTE_ADDR")
-        return ip
+        return get_client_ip(request)
 
     @extend_schema(
         description="Redirect to the original URL based on the short code.",
         responses={302: None, 404: dict, 410: dict},
     )
     def get(self, request, short_code):
-        from django.core.cache import cache
-
-        # Check Cache first
-        # We store the original_url directly in cache
-        cached_url = cache.get(f"url:{short_code}")
-
-        # Simple mock IP intelligence for demonstration
-        ip = self.get_client_ip(request)
-        country = (
-            "US"
-            if ip and ip.startswith("192.")
-            else "GH" if ip and ip.startswith("127.") else "UK"
+        def fill():
+            return self.get_service().get_redirect_record(short_code)
+
+        # In-process L1, then Redis; on a miss only one worker queries the DB
+        record = redirect_cache.get_or_fill(
+            short_code, fill, timeout=settings.REDIRECT_CACHE_TTL
         )
+        if record == MISSING:
+            return Response(
+                {"error": "Short code not found"}, status=status.HTTP_404_NOT_FOUND
+            )
 
-        click_data = {
-            "ip_address": ip,
-            "user_agent": request.META.get("HTTP_USER_AGENT"),
-            "referrer": request.META.get("HTTP_REFERER"),
-            "city": (
-                "Accra"
-                if country == "GH"
-                else "London" if country == "UK" else "New York"
-            ),
-            "country": country,
-        }
+        # Expiry and active status are enforced on cache hits too
+        try:
+            original_url = record.check()
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_410_GONE)
 
-        import logging
+        # Buffer the click for batched ingestion
+        try:
+            ClickBuffer().push(short_code, build_click_data(request))
+        except Exception as e:
+            logger.error(f"Failed to buffer click: {e}")
 
-        logger = logging.getLogger(__name__)
-        print(f"DEBUG: RedirectView hit for {short_code}")
+        return redirect(original_url)
 
-        if cached_url:
-            print(f"DEBUG: Cache HIT for {short_code}")
-            logger.info(f"Cache HIT for {short_code}")
-            # Trigger Async Analytics
-            try:
-                track_click_task.delay(short_code, click_data)
-            except Exception as e:
-                logger.error(f"Failed to trigger async task: {e}")
-            return redirect(cached_url)
 
-        # Cache Miss
-        service = self.get_service()
+class AsyncRedirectView(View):
+    """
+    Native async redirect view, routed instead of RedirectView when
+    REDIRECT_ASYNC_VIEW is on and the app is served over ASGI.
+    Skips the DRF stack: cache lookups and click buffering use an asyncio
+    Redis client, and only a cache miss runs the ORM via sync_to_async.
+    Under ASGI it is dispatched without the middleware stack (fast_path, see
+    core.handlers.FastPathASGIHandler).
+    """
+
+    fast_path = True
+
+    def get_service(self):
+        repo = get_url_repository()
+        code_filter = ShortCodeFilter() if settings.SHORT_CODE_FILTER_ENABLED else None
+        return UrlShortenerService(repo, code_filter=code_filter)
+
+    def resolve(self, short_code: str, recycle_connections: bool = False):
+        # The fast path skips the request signals that normally recycle
+        # database connections, so it asks for that around the lookup instead
+        if recycle_connections:
+            close_old_connections()
         try:
-            # log_click=False because we will trigger the async task
-            original_url = service.get_original_url(
-                short_code, click_data=None, log_click=False
+            return self.get_service().get_redirect_record(short_code)
+        finally:
+            if recycle_connections:
+                close_old_connections()
+
+    async def get(self, request, short_code):
+        async def fill():
+            return await sync_to_async(self.resolve)(
+                short_code, recycle_connections=getattr(request, "fast_path", False)
             )
-        except ValueError as e:
-            # Service raises ValueError for expired or inactive URLs
-            return Response({"error": str(e)}, status=status.HTTP_410_GONE)
 
-        if original_url:
-            logger.info(f"Cache MISS for {short_code}. Caching and redirecting.")
-            # Cache the result for 15 minutes
-            try:
-                cache.set(f"url:{short_code}", original_url, timeout=60 * 15)
-            except Exception as e:
-                logger.error(f"Failed to set cache: {e}")
+        record = await redirect_cache.aget_or_fill(
+            short_code, fill, timeout=settings.REDIRECT_CACHE_TTL
+        )
+        if record == MISSING:
+            return JsonResponse(
+                {"error": "Short code not found"}, status=status.HTTP_404_NOT_FOUND
+            )
 
-            # Trigger Async Analytics
-            try:
-                track_click_task.delay(short_code, click_data)
-            except Exception as e:
-                logger.error(f"Failed to trigger async task: {e}")
+        try:
+            original_url = record.check()
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_410_GONE)
 
-            return redirect(original_url)
+        try:
+            await ClickBuffer().apush(short_code, build_click_data(request))
+        except Exception as e:
+            logger.error(f"Failed to buffer click: {e}")
 
-        return Response(
-            {"error": "Short code not found"}, status=status.HTTP_404_NOT_FOUND
-        )
+        return HttpResponseRedirect(original_url)
 
 
 class UrlAnalyticsView(APIView):
@@ -262,7 +439,16 @@ class UrlAnalyticsView(APIView):
     permission_classes = [IsAuthenticated]
 
     @extend_schema(
-        description="Get detailed analytics for a shortened URL. Premium users get geo-location and time-series data.",
+        description="Get detailed analytics for a shortened URL. Premium users get geo-location and time-series data, read from pre-aggregated rollups.",
+        parameters=[
+            OpenApiParameter(
+                name="granularity",
+                type=str,
+                location=OpenApiParameter.QUERY,
+                enum=["day", "hour"],
+                description="Time-series bucket size: 'day' (last 30 days, default) or 'hour' (last 48 hours).",
+            ),
+        ],
         responses={
             200: OpenApiResponse(
                 description="Analytics data.",
@@ -308,13 +494,27 @@ class UrlAnalyticsView(APIView):
 
             response_data = {
                 "short_code": short_code,
-                "total_clicks": url_obj.click_count,
+                "total_clicks": url_obj.click_count
+                + ClickCounter().pending([url_obj.id])[url_obj.id],
             }
 
             # Tiered Logic: Access to detailed analytics restricted to Premium/Admin
+            # Reads are O(buckets) thanks to the rollups maintained on ingestion
             if request.user.tier != request.user.Tier.FREE:
-                response_data["geo_breakdown"] = url_obj.clicks_per_country()
-                response_data["time_series"] = url_obj.clicks_over_time()
+                from django.utils import timezone
+
+                now = timezone.now()
+                if request.query_params.get("granularity") == "hour":
+                    series = HourlyClickRollup.objects.filter(url=url_obj)
+                    since = truncate_hour(now - timezone.timedelta(hours=48))
+                else:
+                    series = DailyClickRollup.objects.filter(url=url_obj)
+                    since = truncate_day(now - timezone.timedelta(days=30))
+
+                response_data["geo_breakdown"] = DailyClickRollup.objects.filter(
+                    url=url_obj
+                ).clicks_per_country()
+                response_data["time_series"] = series.clicks_over_time(since)
 
             return Response(response_data, status=status.HTTP_200_OK)
         except URL.DoesNotExist:
@@ -393,12 +593,15 @@ class UrlDetailView(APIView):
             )
             if reset_clicks:
                 url_obj.click_count = 0
-                # Delete related clicks for detailed stats
+                ClickCounter().discard(url_obj.id)
+                # Delete related clicks and their rollups for detailed stats
                 url_obj.clicks.all().delete()
+                url_obj.hourly_rollups.all().delete()
+                url_obj.daily_rollups.all().delete()
 
             url_obj.save()
             # Invalidate cache
-            cache.delete(f"url:{short_code}")
+            redirect_cache.invalidate(short_code)
             return Response(URLDetailSerializer(url_obj).data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -430,7 +633,7 @@ class UrlDetailView(APIView):
 
             url_obj.save()
             # Invalidate cache
-            cache.delete(f"url:{short_code}")
+            redirect_cache.invalidate(short_code)
             return Response(URLDetailSerializer(url_obj).data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -454,13 +657,29 @@ class UrlDetailView(APIView):
             )
 
         permanent = request.query_params.get("permanent", "false").lower() == "true"
-        if permanent:
-            url_obj.delete()
-        else:
-            url_obj.is_active = False
-            url_obj.save()
+        if not permanent and settings.URL_REPOSITORY == "write_behind":
+            # Redirects stop now (Redis); the row and the owner's active count
+            # are updated when the write-behind queue drains
+            get_url_repository().set_active(short_code, False)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        with transaction.atomic():
+            # Lock the row so concurrent deactivations only decrement once
+            was_active = (
+                URL.objects.select_for_update()
+                .filter(pk=url_obj.pk)
+                .values_list("is_active", flat=True)
+                .first()
+            )
+            if permanent:
+                url_obj.delete()
+            else:
+                url_obj.is_active = False
+                url_obj.save()
+            if was_active:
+                User.objects.adjust_active_url_counts({url_obj.owner_id: -1})
 
         # Invalidate cache
-        cache.delete(f"url:{short_code}")
+        redirect_cache.invalidate(short_code)
 
         return Response(status=status.HTTP_204_NO_CONTENT)
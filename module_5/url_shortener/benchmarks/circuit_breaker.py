@@ -0,0 +1,104 @@
+"""
+Benchmark the preview client's circuit breaker.
+
+Compares the previous breaker (cache.get on every open-circuit check,
+cache.get + cache.set per failure) against CircuitBreaker (state cached
+in-process, one Lua script per failure), and counts failures lost when
+several threads fail at once. Uses the configured Redis.
+
+Run from the project directory, e.g.:
+    python benchmarks/circuit_breaker.py --checks 10000 --threads 8
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache import cache  # noqa: E402
+from shortener.circuit_breaker import CircuitBreaker  # noqa: E402
+
+FAILURE_THRESHOLD = 5
+COOLDOWN_SECONDS = 60
+
+
+class LegacyBreaker:
+    """
+    PreviewServiceClient's breaker before CircuitBreaker.
+    """
+
+    def allow(self, domain: str) -> bool:
+        return cache.get(f"cb:failures:{domain}", 0) < FAILURE_THRESHOLD
+
+    def record_failure(self, domain: str):
+        key = f"cb:failures:{domain}"
+        current = cache.get(key, 0)
+        cache.set(key, current + 1, timeout=COOLDOWN_SECONDS)
+
+    def failures(self, domain: str) -> int:
+        return cache.get(f"cb:failures:{domain}", 0)
+
+    def reset(self, *domains):
+        cache.delete_many([f"cb:failures:{domain}" for domain in domains])
+
+
+class AtomicBreaker(CircuitBreaker):
+    def failures(self, domain: str) -> int:
+        return int(self.client.hget(self.key(domain), "failures") or 0)
+
+    def reset(self, *domains):
+        self.client.delete(*(self.key(domain) for domain in domains))
+
+
+def measure(label: str, breaker, checks: int, threads: int, failures: int):
+    start = time.perf_counter()
+    for _ in range(checks):
+        breaker.allow("bench-check.com")
+    check_us = (time.perf_counter() - start) / checks * 1_000_000
+
+    def fail():
+        for _ in range(failures):
+            breaker.record_failure("bench-race.com")
+
+    workers = [threading.Thread(target=fail) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    failure_us = (time.perf_counter() - start) / (threads * failures) * 1_000_000
+
+    expected = threads * failures
+    print(
+        f"  {label:<8} check={check_us:8.2f}us failure={failure_us:8.2f}us "
+        f"failures_counted={breaker.failures('bench-race.com')}/{expected}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--checks", type=int, default=10000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--failures", type=int, default=200)
+    args = parser.parse_args()
+
+    for label, breaker in (
+        ("legacy", LegacyBreaker()),
+        # A threshold nobody reaches, so every failure is counted
+        ("atomic", AtomicBreaker("bench", failure_threshold=10**9)),
+    ):
+        breaker.reset("bench-check.com", "bench-race.com")
+        measure(label, breaker, args.checks, args.threads, args.failures)
+        breaker.reset("bench-check.com", "bench-race.com")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark short code allocation latency with a large existing URL table.
+
+Compares the legacy generate-and-check loop (exists() + INSERT) against popping
+a pre-generated code from the Redis pool (SPOP + INSERT).
+
+Run against a disposable database, e.g.:
+    python benchmarks/code_allocation.py --existing 10000000 --creates 2000
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from shortener.code_pool import ShortCodePool  # noqa: E402
+from shortener.models import URL  # noqa: E402
+from shortener.repositories import ORMUrlRepository  # noqa: E402
+from shortener.services import UrlShortenerService  # noqa: E402
+
+BENCHMARK_USERNAME = "benchmark-code-allocation"
+SEED_CHUNK_SIZE = 100_000
+
+
+def get_benchmark_user():
+    User = get_user_model()
+    user, _ = User.objects.get_or_create(
+        username=BENCHMARK_USERNAME,
+        defaults={"email": f"{BENCHMARK_USERNAME}@example.com"},
+    )
+    return user
+
+
+def seed_urls(user, target: int, service: UrlShortenerService):
+    """
+    Bulk-load random codes with COPY until the benchmark user owns target URLs.
+    """
+    existing = URL.objects.filter(owner=user).count()
+    print(f"Existing benchmark URLs: {existing:,}")
+
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        while existing < target:
+            chunk = min(SEED_CHUNK_SIZE, target - existing)
+            codes = {service._generate_random_code() for _ in range(chunk)}
+            buffer = io.StringIO()
+            for code in codes:
+                buffer.write(f"{code}\thttps://example.com/{code}\t{user.id}\n")
+            buffer.seek(0)
+
+            # Load into a temp table first so duplicate codes can be skipped
+            cursor.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS seed_urls "
+                "(short_code varchar(10), original_url varchar(2000), owner_id bigint)"
+            )
+            cursor.execute("TRUNCATE seed_urls")
+            cursor.copy_expert("COPY seed_urls FROM STDIN", buffer)
+            cursor.execute(f"""
+                INSERT INTO {URL._meta.db_table}
+                    (short_code, original_url, owner_id, is_active, click_count,
+                     created_at, updated_at)
+                SELECT short_code, original_url, owner_id, true, 0, now(), now()
+                FROM seed_urls
+                ON CONFLICT (short_code) DO NOTHING
+                """)
+            existing += cursor.rowcount
+            print(f"  seeded {existing:,}/{target:,}", end="\r")
+    print(f"\nSeeding took {time.perf_counter() - start:.1f}s")
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {URL._meta.db_table}")
+
+
+def run_creates(label: str, service: UrlShortenerService, user, creates: int):
+    latencies = []
+    with CaptureQueriesContext(connection) as queries:
+        for i in range(creates):
+            start = time.perf_counter()
+            service.shorten_url(f"https://bench.example.com/{label}/{i}", user=user)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    print(
+        f"{label:<10} mean={statistics.mean(latencies):.3f}ms "
+        f"p50={latencies[len(latencies) // 2]:.3f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1]:.3f}ms "
+        f"db_queries/create={len(queries) / creates:.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--existing", type=int, default=10_000_000)
+    parser.add_argument("--creates", type=int, default=2000)
+    parser.add_argument(
+        "--cleanup", action="store_true", help="Delete benchmark URLs afterwards"
+    )
+    args = parser.parse_args()
+
+    repo = ORMUrlRepository()
+    user = get_benchmark_user()
+    legacy_service = UrlShortenerService(repo)
+    seed_urls(user, args.existing, legacy_service)
+
+    pool = ShortCodePool(key="benchmark:shortcode:pool")
+    pool.client.delete(pool.key)
+    start = time.perf_counter()
+    pool.refill(repo, legacy_service._generate_random_code, target_size=args.creates)
+    print(
+        f"Pool refill of {args.creates:,} codes took "
+        f"{time.perf_counter() - start:.2f}s (off the request path)"
+    )
+
+    run_creates("legacy", legacy_service, user, args.creates)
+    run_creates("pool", UrlShortenerService(repo, code_pool=pool), user, args.creates)
+
+    pool.client.delete(pool.key)
+    if args.cleanup:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {URL._meta.db_table} WHERE owner_id = %s", [user.id]
+            )
+        print("Benchmark URLs deleted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Benchmark per-request connection overhead with and without pooling.
+
+For each backend, times one trivial round trip the way the code used to do it
+(a fresh connection per request) against the pooled setup:
+  - Postgres: connect + SELECT 1 + close vs. a persistent connection
+    (CONN_MAX_AGE)
+  - Redis: a new client and pool per instance (the old
+    RedisUrlRepository/WriteBehindQueue default) vs. the shared pool
+  - HTTP: a new httpx.Client per preview call vs. the keep-alive client,
+    against a local HTTP/1.1 stub standing in for the preview service
+
+With --asgi it also serves the app with uvicorn (as in production) and sends
+concurrent requests to the health check, which queries Postgres, with
+CONN_MAX_AGE=60 and CONN_MAX_AGE=0. It reports latency and the Postgres
+connections still open afterwards: under ASGI each request runs on its own
+thread, so persistent connections are not reused but left behind.
+
+Run with the project's database and Redis up, e.g.:
+    python benchmarks/connection_pooling.py --requests 500 --asgi
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(PROJECT_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import httpx  # noqa: E402
+import redis  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from shortener.connections import get_redis_client  # noqa: E402
+from shortener.preview_client import get_http_client  # noqa: E402
+
+
+class StubPreviewHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY the
+    # body waits on a delayed ACK and keep-alive requests look 40ms slow
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"title": None, "description": None, "favicon": None})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server() -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubPreviewHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/preview/fetch/"
+
+
+def measure(label: str, call, requests: int):
+    call()  # warm up: the pooled variants open their connection here
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(
+        f"  {label:<10} mean={statistics.mean(latencies):8.3f}ms "
+        f"p50={latencies[len(latencies) // 2]:8.3f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1]:8.3f}ms"
+    )
+
+
+def db_per_request():
+    connection.close()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def db_persistent():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def redis_per_request():
+    client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    client.ping()
+    client.close()
+    client.connection_pool.disconnect()
+
+
+def redis_pooled():
+    get_redis_client().ping()
+
+
+def open_connections() -> int:
+    """
+    Postgres connections to this database other than our own.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM pg_stat_activity "
+            "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+        )
+        return cursor.fetchone()[0]
+
+
+def start_asgi_server(conn_max_age: int):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "config.asgi:application",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=PROJECT_DIR,
+        env={**os.environ, "DB_CONN_MAX_AGE": str(conn_max_age)},
+    )
+    url = f"http://127.0.0.1:{port}/api/v1/health/"
+    for _ in range(100):
+        try:
+            httpx.get(url)
+            return server, url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+def measure_asgi(conn_max_age: int, requests: int, concurrency: int):
+    before = open_connections()
+    server, url = start_asgi_server(conn_max_age)
+    limits = httpx.Limits(max_connections=concurrency)
+    try:
+        with httpx.Client(limits=limits) as client:
+
+            def get(_):
+                start = time.perf_counter()
+                client.get(url).raise_for_status()
+                return (time.perf_counter() - start) * 1000
+
+            with ThreadPoolExecutor(concurrency) as pool:
+                latencies = sorted(pool.map(get, range(requests)))
+        left_open = open_connections() - before
+    finally:
+        server.terminate()
+        server.wait()
+    print(
+        f"  CONN_MAX_AGE={conn_max_age:<3} mean={statistics.mean(latencies):8.3f}ms "
+        f"p50={latencies[len(latencies) // 2]:8.3f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1]:8.3f}ms "
+        f"connections_left_open={left_open}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--asgi", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    print("Postgres")
+    measure("connect", db_per_request, args.requests)
+    measure("persistent", db_persistent, args.requests)
+
+    print("Redis")
+    measure("connect", redis_per_request, args.requests)
+    measure("pooled", redis_pooled, args.requests)
+
+    preview_url = start_stub_server()
+
+    def http_per_request():
+        with httpx.Client(timeout=settings.PREVIEW_HTTP_TIMEOUT) as client:
+            client.post(preview_url, json={"url": "https://example.com"})
+
+    def http_keep_alive():
+        get_http_client().post(preview_url, json={"url": "https://example.com"})
+
+    print("HTTP (preview service stub)")
+    measure("connect", http_per_request, args.requests)
+    measure("keep-alive", http_keep_alive, args.requests)
+
+    if args.asgi:
+        print(f"ASGI health check ({args.concurrency} concurrent clients)")
+        for conn_max_age in (60, 0):
+            measure_asgi(conn_max_age, args.requests, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
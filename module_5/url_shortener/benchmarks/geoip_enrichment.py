@@ -0,0 +1,106 @@
+"""
+Benchmark click geo enrichment in the ingestion worker.
+
+Builds a synthetic IP range database (--ranges contiguous IPv4 ranges), then
+measures opening it (mmap), single lookups (binary search over the mapped
+range starts) and GeoEnricher.enrich() on batches of buffered clicks, with a
+cold and a warm LRU. Redirects no longer do any of this work.
+
+Run from the project directory, e.g.:
+    python benchmarks/geoip_enrichment.py --ranges 3000000 --batch 500
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from ipaddress import IPv4Address
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from shortener.geoip import GeoEnricher, GeoIPDatabase, write_database  # noqa: E402
+
+COUNTRIES = ["GH", "US", "GB", "NG", "DE", "FR", "IN", "BR", "JP", "KE"]
+CITIES = ["Accra", "New York", "London", "Lagos", "Berlin", "Paris", None]
+
+
+def synthetic_ranges(count: int):
+    step = 2**32 // count
+    for n in range(count):
+        yield (
+            str(IPv4Address(n * step)),
+            str(IPv4Address(n * step + step - 1)),
+            COUNTRIES[n % len(COUNTRIES)],
+            CITIES[n % len(CITIES)],
+        )
+
+
+def measure(label: str, fn, repeats: int, per: int = 1):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<24} {elapsed / (repeats * per) * 1_000_000:10.2f}us per item")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ranges", type=int, default=3_000_000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--distinct-ips", type=int, default=5000)
+    parser.add_argument("--batches", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "geoip.bin")
+        start = time.perf_counter()
+        count = write_database(path, synthetic_ranges(args.ranges))
+        print(
+            f"Built {count:,} ranges ({os.path.getsize(path) / 1024 / 1024:.1f} MiB) "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+
+        start = time.perf_counter()
+        database = GeoIPDatabase(path)
+        print(
+            f"  open (mmap)              {(time.perf_counter() - start) * 1000:10.3f}ms"
+        )
+
+        ips = [
+            str(IPv4Address(random.getrandbits(32))) for _ in range(args.distinct_ips)
+        ]
+        measure(
+            "lookup (binary search)",
+            lambda: database.lookup(random.choice(ips)),
+            100_000,
+        )
+
+        def batch():
+            return [{"ip_address": random.choice(ips)} for _ in range(args.batch)]
+
+        batches = [batch() for _ in range(args.batches)]
+        enricher = GeoEnricher(path)
+        measure(
+            "enrich, cold LRU",
+            lambda: (enricher.clear(), enricher.enrich(batch())),
+            args.batches,
+            args.batch,
+        )
+        enricher.enrich([{"ip_address": ip} for ip in ips])
+        measure(
+            "enrich, warm LRU",
+            lambda: enricher.enrich([dict(click) for click in random.choice(batches)]),
+            args.batches,
+            args.batch,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Benchmark URL list pages deep into a large per-user result set.
+
+Compares the legacy PageNumberPagination path (COUNT(*) + OFFSET over
+with_details() and the nested URLDetailSerializer) against the keyset
+cursor path served by GET /api/v1/urls/ (one index range scan from the
+cursor and values-based rows). The keyset timings include the view itself
+(throttling off); the legacy ones only the query and serialization.
+
+Run against a disposable database, e.g.:
+    python benchmarks/list_pagination.py --urls 100000 --depths 1 100 1000 5000
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIRequestFactory, force_authenticate  # noqa: E402
+from api.pagination import KeysetPagination  # noqa: E402
+from api.serializers import URLDetailSerializer  # noqa: E402
+from api.views import ShortenUrlView  # noqa: E402
+from shortener.models import URL  # noqa: E402
+
+BENCHMARK_USERNAME = "benchmark-list-pagination"
+HOST = settings.ALLOWED_HOSTS[0]
+SEED_CHUNK_SIZE = 100_000
+
+
+def get_benchmark_user():
+    User = get_user_model()
+    user, _ = User.objects.get_or_create(
+        username=BENCHMARK_USERNAME,
+        defaults={"email": f"{BENCHMARK_USERNAME}@example.com", "is_premium": True},
+    )
+    return user
+
+
+def seed_urls(user, target: int):
+    """
+    Bulk-load URLs with COPY, one second apart, until the user owns target URLs.
+    """
+    existing = URL.objects.filter(owner=user).count()
+    print(f"Existing benchmark URLs: {existing:,}")
+
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        while existing < target:
+            chunk = min(SEED_CHUNK_SIZE, target - existing)
+            buffer = io.StringIO()
+            for n in range(existing, existing + chunk):
+                code = f"lp{n:08x}"
+                buffer.write(f"{code}\thttps://example.com/{code}\t{user.id}\t{n}\n")
+            buffer.seek(0)
+
+            cursor.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS seed_urls (short_code varchar(10), "
+                "original_url varchar(2000), owner_id bigint, n integer)"
+            )
+            cursor.execute("TRUNCATE seed_urls")
+            cursor.copy_expert("COPY seed_urls FROM STDIN", buffer)
+            cursor.execute(f"""
+                INSERT INTO {URL._meta.db_table}
+                    (short_code, original_url, owner_id, is_active, click_count,
+                     created_at, updated_at)
+                SELECT short_code, original_url, owner_id, true, 0,
+                       now() - n * interval '1 second', now()
+                FROM seed_urls
+                ON CONFLICT (short_code) DO NOTHING
+                """)
+            existing += cursor.rowcount
+            print(f"  seeded {existing:,}/{target:,}", end="\r")
+    print(f"\nSeeding took {time.perf_counter() - start:.1f}s")
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {URL._meta.db_table}")
+
+
+def legacy_page(user, page: int, page_size: int):
+    urls = URL.objects.filter(owner=user).with_details()
+    urls.count()
+    offset = (page - 1) * page_size
+    return URLDetailSerializer(urls[offset : offset + page_size], many=True).data
+
+
+def keyset_page_url(user, page: int, page_size: int) -> str:
+    """
+    The next link a client walking the list would hold when asking for page.
+    """
+    list_url = f"http://{HOST}{reverse('v1:url_list_create')}"
+    if page == 1:
+        return f"{list_url}?page_size={page_size}"
+    row = (
+        URL.objects.filter(owner=user)
+        .order_by("-created_at", "-id")
+        .values("created_at", "id")[(page - 1) * page_size - 1]
+    )
+    paginator = KeysetPagination()
+    paginator.base_url = f"{list_url}?page_size={page_size}"
+    return paginator.encode_cursor(row, reverse=False)
+
+
+def measure(label: str, fetch, repeats: int):
+    latencies = []
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fetch()
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(
+        f"  {label:<8} mean={statistics.mean(latencies):8.3f}ms "
+        f"p50={latencies[len(latencies) // 2]:8.3f}ms "
+        f"db_queries/page={len(queries) / repeats:.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--urls", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument(
+        "--depths", type=int, nargs="+", default=[1, 100, 1000, 5000, 9000]
+    )
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument(
+        "--cleanup", action="store_true", help="Delete benchmark URLs afterwards"
+    )
+    args = parser.parse_args()
+
+    user = get_benchmark_user()
+    seed_urls(user, args.urls)
+    factory = APIRequestFactory()
+    list_view = ShortenUrlView.as_view(throttle_classes=[])
+
+    def keyset_page(page_url: str):
+        request = factory.get(page_url, HTTP_HOST=HOST)
+        force_authenticate(request, user=user)
+        return list_view(request).data["results"]
+
+    max_page = args.urls // args.page_size
+
+    for page in args.depths:
+        if page > max_page:
+            print(f"Skipping page {page:,}: only {max_page:,} pages")
+            continue
+        print(f"Page {page:,} ({args.page_size} rows/page)")
+        measure(
+            "legacy",
+            lambda: legacy_page(user, page, args.page_size),
+            args.repeats,
+        )
+        page_url = keyset_page_url(user, page, args.page_size)
+        measure(
+            "keyset",
+            lambda: keyset_page(page_url),
+            args.repeats,
+        )
+
+    if args.cleanup:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {URL._meta.db_table} WHERE owner_id = %s", [user.id]
+            )
+        print("Benchmark URLs deleted")
+
+
+if __name__ == "__main__":
+    main()
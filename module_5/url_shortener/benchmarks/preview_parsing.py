@@ -0,0 +1,154 @@
+"""
+Benchmark preview extraction from large HTML pages.
+
+Compares the previous PreviewView approach (download the whole body with
+resp.text and build a BeautifulSoup tree with html.parser) against the
+streaming path now used by the preview service (parse chunks as they arrive
+and stop at </head>, capped at PREVIEW_MAX_BYTES). Pages are served by a
+local HTTP/1.1 stub; peak memory is measured with tracemalloc.
+
+Run from the project directory, e.g.:
+    python benchmarks/preview_parsing.py --sizes-kb 100 1000 5000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import httpx  # noqa: E402
+from bs4 import BeautifulSoup  # noqa: E402
+from preview_service.views import REQUEST_HEADERS, fetch_preview  # noqa: E402
+
+HEAD = b"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Benchmark page</title>
+<meta name="description" content="A large page for the preview benchmark">
+<link rel="stylesheet" href="/static/site.css">
+<link rel="icon" href="/static/favicon.png">
+</head>
+"""
+ROW = b'<div class="row"><a href="/item">Item</a><span>Some text here</span></div>\n'
+CHUNK_SIZE = 64 * 1024
+
+pages = {}
+
+
+def build_page(size_kb: int) -> bytes:
+    rows = ROW * (size_kb * 1024 // len(ROW) + 1)
+    return HEAD + b"<body>\n" + rows[: size_kb * 1024] + b"</body></html>"
+
+
+class StubPageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = pages[self.path]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            for start in range(0, len(body), CHUNK_SIZE):
+                self.wfile.write(body[start : start + CHUNK_SIZE])
+        except (BrokenPipeError, ConnectionResetError):
+            # The streaming client hangs up once it has the head
+            pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server() -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubPageHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def legacy_preview(client: httpx.Client, url: str) -> dict:
+    """
+    PreviewView.post before streaming: whole body, full soup.
+    """
+    resp = client.get(url, headers=REQUEST_HEADERS)
+    resp.raise_for_status()
+    soup = BeautifulSoup(resp.text, "html.parser")
+    title = soup.title.string.strip() if soup.title else None
+    desc_tag = soup.find("meta", attrs={"name": "description"}) or soup.find(
+        "meta", attrs={"property": "og:description"}
+    )
+    description = desc_tag["content"].strip() if desc_tag else None
+    icon_tag = soup.find("link", rel=lambda r: r and "icon" in r.lower())
+    href = icon_tag["href"] if icon_tag else "/favicon.ico"
+    return {"title": title, "description": description, "favicon": urljoin(url, href)}
+
+
+def measure(label: str, fetch, url: str, repeats: int):
+    # One client per approach, so the timings leave out client setup
+    client = httpx.Client(follow_redirects=True, timeout=60.0)
+    expected = fetch(client, url)
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fetch(client, url)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    fetch(client, url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    client.close()
+
+    latencies.sort()
+    print(
+        f"  {label:<10} mean={statistics.mean(latencies):9.3f}ms "
+        f"p50={latencies[len(latencies) // 2]:9.3f}ms "
+        f"peak_mem={peak / 1024 / 1024:8.2f}MiB"
+    )
+    return expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes-kb", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    base_url = start_stub_server()
+    for size_kb in args.sizes_kb:
+        pages[f"/{size_kb}"] = build_page(size_kb)
+
+    for size_kb in args.sizes_kb:
+        url = f"{base_url}/{size_kb}"
+        print(f"Page of {size_kb:,} KB")
+        legacy = measure("legacy", legacy_preview, url, args.repeats)
+        streaming = measure("streaming", fetch_preview, url, args.repeats)
+        # Streaming results also carry the page's ETag / Last-Modified
+        streaming = {key: streaming.get(key) for key in legacy}
+        if legacy != streaming:
+            print(f"  results differ: {legacy} vs {streaming}")
+
+
+if __name__ == "__main__":
+    main()
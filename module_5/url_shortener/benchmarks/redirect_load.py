@@ -0,0 +1,143 @@
+"""
+Load-test the redirect endpoint: sync DRF view under WSGI vs native async view under ASGI.
+
+Each mode starts its own gunicorn server (sync workers for RedirectView,
+uvicorn workers for AsyncRedirectView), warms the cache for one short code and
+fires requests from an asyncio client at a fixed concurrency. Reports p50/p99
+latency and requests per second.
+
+Run against a disposable database with Redis available, e.g.:
+    python benchmarks/redirect_load.py --requests 20000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(PROJECT_ROOT)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import httpx  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from shortener.models import URL  # noqa: E402
+
+BENCHMARK_USERNAME = "benchmark-redirect-load"
+SHORT_CODE = "benchredir"
+
+MODES = {
+    "sync": {
+        "args": ["config.wsgi:application", "--threads", "4"],
+        "env": {"REDIRECT_ASYNC_VIEW": "False"},
+    },
+    "async": {
+        "args": ["config.asgi:application", "-k", "uvicorn.workers.UvicornWorker"],
+        "env": {"REDIRECT_ASYNC_VIEW": "True"},
+    },
+}
+
+
+def seed_url():
+    User = get_user_model()
+    user, _ = User.objects.get_or_create(
+        username=BENCHMARK_USERNAME,
+        defaults={"email": f"{BENCHMARK_USERNAME}@example.com"},
+    )
+    URL.objects.update_or_create(
+        short_code=SHORT_CODE,
+        defaults={"original_url": "https://example.com/landing", "owner": user},
+    )
+
+
+def start_server(mode: str, port: int, workers: int) -> subprocess.Popen:
+    config = MODES[mode]
+    env = {**os.environ, **config["env"], "DEBUG": "False"}
+    server = subprocess.Popen(
+        ["gunicorn", *config["args"], "--workers", str(workers)]
+        + ["--bind", f"127.0.0.1:{port}", "--log-level", "warning"],
+        cwd=PROJECT_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/{SHORT_CODE}/", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"{mode} server did not start on port {port}")
+
+
+async def run_load(base_url: str, requests: int, concurrency: int):
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                start = time.perf_counter()
+                response = await client.get(f"/{SHORT_CODE}/")
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 302:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return sorted(latencies), errors, elapsed
+
+
+def report(mode: str, latencies: list, errors: int, elapsed: float):
+    print(
+        f"{mode:<6} rps={len(latencies) / elapsed:,.0f} "
+        f"mean={statistics.mean(latencies):.2f}ms "
+        f"p50={latencies[len(latencies) // 2]:.2f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1]:.2f}ms "
+        f"errors={errors}"
+    )
+
+
+def main():
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args()
+
+    seed_url()
+    for mode in args.modes:
+        server = start_server(mode, args.port, args.workers)
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            # Warm-up pass so every worker has the code cached
+            asyncio.run(run_load(base_url, args.concurrency * 10, args.concurrency))
+            report(
+                mode, *asyncio.run(run_load(base_url, args.requests, args.concurrency))
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
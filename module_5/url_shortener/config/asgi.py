@@ -9,8 +9,12 @@ https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup(set_prefix=False)
 
-application = get_asgi_application()
+from core.handlers import FastPathASGIHandler  # noqa: E402
+
+# Like get_asgi_application(), but fast-path views (the redirect) skip middleware
+application = FastPathASGIHandler()
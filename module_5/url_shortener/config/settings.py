@@ -15,7 +15,6 @@ from datetime import timedelta
 from decouple import config, Csv
 from celery.schedules import crontab
 
-
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -96,6 +95,17 @@ DATABASES = {
         "PASSWORD": config("DB_PASSWORD", default="shortener_password"),
         "HOST": config("DB_HOST", default="db"),
         "PORT": config("DB_PORT", default="5432"),
+        # The web app is served over ASGI, where every request runs its ORM
+        # calls on a thread of its own: persistent connections are never
+        # reused there, they pile up until max_connections. Connections are
+        # closed per request and pooled by PgBouncer in front of Postgres
+        # (see docker-compose.yml); Celery workers can keep theirs open.
+        "CONN_MAX_AGE": config("DB_CONN_MAX_AGE", default=0, cast=int),  # seconds
+        "CONN_HEALTH_CHECKS": True,
+        # Required behind PgBouncer in transaction pooling mode
+        "DISABLE_SERVER_SIDE_CURSORS": config(
+            "DB_DISABLE_SERVER_SIDE_CURSORS", default=False, cast=bool
+        ),
     }
 }
 
@@ -160,6 +170,7 @@ REST_FRAMEWORK = {
     "DEFAULT_THROTTLE_RATES": {
         "login": "5/min",
         "url_create": "10/min",
+        "url_bulk_create": "5/min",
     },
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
@@ -183,6 +194,24 @@ SPECTACULAR_SETTINGS = {
 
 # Redis Configuration
 REDIS_URL = config("REDIS_URL", default="redis://localhost:6379/0")
+# RedisUrlRepository: one hash per short code, kept this long past expires_at
+REDIS_URL_KEY_PREFIX = config("REDIS_URL_KEY_PREFIX", default="shorturl:")
+REDIS_URL_EXPIRED_RETENTION = config(
+    "REDIS_URL_EXPIRED_RETENTION", default=60 * 60 * 24 * 7, cast=int
+)  # seconds
+# Shared connection pools (shortener.connections), one per Redis database,
+# used by the repositories and by django-redis
+REDIS_MAX_CONNECTIONS = config("REDIS_MAX_CONNECTIONS", default=50, cast=int)
+REDIS_POOL_TIMEOUT = config(
+    "REDIS_POOL_TIMEOUT", default=2.0, cast=float
+)  # seconds to wait for a free connection
+REDIS_SOCKET_TIMEOUT = config("REDIS_SOCKET_TIMEOUT", default=5.0, cast=float)
+REDIS_SOCKET_CONNECT_TIMEOUT = config(
+    "REDIS_SOCKET_CONNECT_TIMEOUT", default=2.0, cast=float
+)
+REDIS_HEALTH_CHECK_INTERVAL = config(
+    "REDIS_HEALTH_CHECK_INTERVAL", default=30, cast=int
+)  # seconds
 
 # Celery Configuration
 CELERY_BROKER_URL = REDIS_URL
@@ -193,10 +222,174 @@ CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
 
 
+# Bulk Shortening
+BULK_SHORTEN_MAX_URLS = config("BULK_SHORTEN_MAX_URLS", default=1000, cast=int)
+
+# URL Listing
+# The list endpoint is keyset-paginated; ?page_size= is capped at this value
+URL_LIST_MAX_PAGE_SIZE = config("URL_LIST_MAX_PAGE_SIZE", default=100, cast=int)
+
+# Tags
+# Per-process cache of tag name -> id used by tag attachment and filtering
+TAG_CACHE_SIZE = config("TAG_CACHE_SIZE", default=5000, cast=int)
+TAG_CACHE_TTL = config("TAG_CACHE_TTL", default=300.0, cast=float)  # seconds
+
+# Click Ingestion
+# Redirects append to a Redis list which is drained in batches by Celery beat
+CLICK_BUFFER_KEY = "clicks:buffer"
+CLICK_BUFFER_BATCH_SIZE = config("CLICK_BUFFER_BATCH_SIZE", default=500, cast=int)
+CLICK_BUFFER_FLUSH_INTERVAL = config(
+    "CLICK_BUFFER_FLUSH_INTERVAL", default=5.0, cast=float
+)  # seconds
+CLICK_BUFFER_LOCK_TIMEOUT = config(
+    "CLICK_BUFFER_LOCK_TIMEOUT", default=60, cast=int
+)  # seconds
+# The drain task adds country/city from a local IP range database
+# (manage.py build_geoip_database), with an LRU of addresses already seen
+GEOIP_DATABASE_PATH = config(
+    "GEOIP_DATABASE_PATH", default=str(BASE_DIR / "data" / "geoip.bin")
+)
+GEOIP_CACHE_SIZE = config("GEOIP_CACHE_SIZE", default=100_000, cast=int)
+GEOIP_CACHE_TTL = config("GEOIP_CACHE_TTL", default=3600.0, cast=float)  # seconds
+# click_count increments are summed in a Redis hash and flushed with F() updates
+CLICK_COUNTER_KEY = "clicks:pending-counts"
+CLICK_COUNTER_FLUSH_INTERVAL = config(
+    "CLICK_COUNTER_FLUSH_INTERVAL", default=10.0, cast=float
+)  # seconds
+CLICK_COUNTER_LOCK_TIMEOUT = config(
+    "CLICK_COUNTER_LOCK_TIMEOUT", default=60, cast=int
+)  # seconds
+
+# URL Expiry
+# Expired URLs are deactivated in small batches, each in its own transaction
+ARCHIVE_EXPIRED_BATCH_SIZE = config(
+    "ARCHIVE_EXPIRED_BATCH_SIZE", default=1000, cast=int
+)
+ARCHIVE_EXPIRED_MAX_BATCHES = config(
+    "ARCHIVE_EXPIRED_MAX_BATCHES", default=50, cast=int
+)  # per run
+ARCHIVE_EXPIRED_INTERVAL = config(
+    "ARCHIVE_EXPIRED_INTERVAL", default=300.0, cast=float
+)  # seconds
+
+# Click Retention
+# On Postgres the Click table is partitioned by month; raw clicks older than
+# the retention window are dropped a partition at a time (rollups are kept)
+CLICK_PARTITIONS_AHEAD = config("CLICK_PARTITIONS_AHEAD", default=3, cast=int)
+CLICK_RETENTION_MONTHS = config("CLICK_RETENTION_MONTHS", default=13, cast=int)
+
+# Short Code Allocation
+# New URLs pop pre-generated codes from a Redis set refilled by Celery beat
+SHORT_CODE_POOL_ENABLED = config("SHORT_CODE_POOL_ENABLED", default=True, cast=bool)
+SHORT_CODE_POOL_KEY = "shortcode:pool"
+SHORT_CODE_POOL_SIZE = config("SHORT_CODE_POOL_SIZE", default=10000, cast=int)
+SHORT_CODE_POOL_REFILL_INTERVAL = config(
+    "SHORT_CODE_POOL_REFILL_INTERVAL", default=60.0, cast=float
+)  # seconds
+
+# Unknown Short Codes
+# Redirect lookups check a Redis Bloom filter of all codes before the database;
+# rebuild it with `manage.py rebuild_short_code_filter` (run on startup)
+SHORT_CODE_FILTER_ENABLED = config("SHORT_CODE_FILTER_ENABLED", default=True, cast=bool)
+SHORT_CODE_FILTER_KEY = "shortcode:filter"
+SHORT_CODE_FILTER_CAPACITY = config(
+    "SHORT_CODE_FILTER_CAPACITY", default=10_000_000, cast=int
+)
+SHORT_CODE_FILTER_ERROR_RATE = config(
+    "SHORT_CODE_FILTER_ERROR_RATE", default=0.01, cast=float
+)
+NEGATIVE_CACHE_TTL = config("NEGATIVE_CACHE_TTL", default=60, cast=int)  # seconds
+
+# URL Repository
+# "orm" serves redirects from Postgres; "write_behind" serves them from the Redis
+# hash repository and writes Postgres behind through a durable Redis queue
+URL_REPOSITORY = config("URL_REPOSITORY", default="orm")
+WRITE_BEHIND_QUEUE_KEY = "urls:write-behind"
+WRITE_BEHIND_BATCH_SIZE = config("WRITE_BEHIND_BATCH_SIZE", default=500, cast=int)
+WRITE_BEHIND_FLUSH_INTERVAL = config(
+    "WRITE_BEHIND_FLUSH_INTERVAL", default=2.0, cast=float
+)  # seconds
+WRITE_BEHIND_LOCK_TIMEOUT = config(
+    "WRITE_BEHIND_LOCK_TIMEOUT", default=300, cast=int
+)  # seconds
+
+# Link Previews
+# New URLs queue their code for the batched async preview worker (Celery beat)
+PREVIEW_QUEUE_KEY = "previews:pending"
+PREVIEW_BATCH_SIZE = config("PREVIEW_BATCH_SIZE", default=100, cast=int)
+PREVIEW_MAX_BATCHES = config("PREVIEW_MAX_BATCHES", default=10, cast=int)
+PREVIEW_FETCH_INTERVAL = config(
+    "PREVIEW_FETCH_INTERVAL", default=5.0, cast=float
+)  # seconds
+# Concurrent fetches per target domain within a batch
+PREVIEW_PER_DOMAIN_CONCURRENCY = config(
+    "PREVIEW_PER_DOMAIN_CONCURRENCY", default=2, cast=int
+)
+# Previews are cached per normalized URL: fresh for PREVIEW_CACHE_TTL, then
+# kept until PREVIEW_CACHE_REVALIDATE_TTL for conditional (ETag) refreshes
+PREVIEW_CACHE_TTL = config(
+    "PREVIEW_CACHE_TTL", default=60 * 60 * 24, cast=int
+)  # seconds
+PREVIEW_CACHE_REVALIDATE_TTL = config(
+    "PREVIEW_CACHE_REVALIDATE_TTL", default=60 * 60 * 24 * 7, cast=int
+)  # seconds
+PREVIEW_FAVICON_CACHE_TTL = config(
+    "PREVIEW_FAVICON_CACHE_TTL", default=60 * 60 * 24 * 30, cast=int
+)  # seconds, per domain
+
+# Circuit Breaker (per target domain of the preview client)
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = config(
+    "CIRCUIT_BREAKER_FAILURE_THRESHOLD", default=5, cast=int
+)
+CIRCUIT_BREAKER_FAILURE_WINDOW = config(
+    "CIRCUIT_BREAKER_FAILURE_WINDOW", default=60.0, cast=float
+)  # seconds
+CIRCUIT_BREAKER_COOLDOWN = config(
+    "CIRCUIT_BREAKER_COOLDOWN", default=60.0, cast=float
+)  # seconds open before a half-open trial
+CIRCUIT_BREAKER_TRIAL_TIMEOUT = config(
+    "CIRCUIT_BREAKER_TRIAL_TIMEOUT", default=30.0, cast=float
+)  # seconds
+# In-process state cache, so closed circuits are checked without Redis
+CIRCUIT_BREAKER_STATE_CACHE_TTL = config(
+    "CIRCUIT_BREAKER_STATE_CACHE_TTL", default=1.0, cast=float
+)  # seconds
+CIRCUIT_BREAKER_STATE_CACHE_SIZE = config(
+    "CIRCUIT_BREAKER_STATE_CACHE_SIZE", default=10_000, cast=int
+)
+
 CELERY_BEAT_SCHEDULE = {
-    "archive-expired-urls-every-night": {
+    "archive-expired-urls": {
         "task": "shortener.tasks.archive_expired_urls_task",
-        "schedule": crontab(hour=0, minute=0),  # Run daily at midnight
+        "schedule": ARCHIVE_EXPIRED_INTERVAL,
+    },
+    "flush-click-buffer": {
+        "task": "shortener.tasks.flush_click_buffer_task",
+        "schedule": CLICK_BUFFER_FLUSH_INTERVAL,
+    },
+    "flush-click-counts": {
+        "task": "shortener.tasks.flush_click_counts_task",
+        "schedule": CLICK_COUNTER_FLUSH_INTERVAL,
+    },
+    "refill-short-code-pool": {
+        "task": "shortener.tasks.refill_short_code_pool_task",
+        "schedule": SHORT_CODE_POOL_REFILL_INTERVAL,
+    },
+    "manage-click-partitions": {
+        "task": "shortener.tasks.manage_click_partitions_task",
+        "schedule": crontab(hour=1, minute=0),
+    },
+    "flush-write-behind-queue": {
+        "task": "shortener.tasks.flush_write_behind_task",
+        "schedule": WRITE_BEHIND_FLUSH_INTERVAL,
+    },
+    "reconcile-url-stores": {
+        "task": "shortener.tasks.reconcile_url_stores_task",
+        "schedule": crontab(minute=30),
+    },
+    "fetch-pending-previews": {
+        "task": "shortener.tasks.fetch_pending_previews_task",
+        "schedule": PREVIEW_FETCH_INTERVAL,
     },
 }
 
@@ -210,6 +403,44 @@ CACHES = {
         },
     }
 }
+DJANGO_REDIS_CONNECTION_FACTORY = "shortener.connections.SharedConnectionFactory"
+
+# Redirect Cache
+# In-process L1 in front of the Redis cache; invalidations go over pub/sub
+REDIRECT_L1_CACHE_SIZE = config("REDIRECT_L1_CACHE_SIZE", default=10000, cast=int)
+REDIRECT_L1_CACHE_TTL = config(
+    "REDIRECT_L1_CACHE_TTL", default=30.0, cast=float
+)  # seconds
+REDIRECT_CACHE_INVALIDATION_CHANNEL = "url:invalidate"
+# Entries carry expiry/active status and end when the link expires, so this can be long
+REDIRECT_CACHE_TTL = config("REDIRECT_CACHE_TTL", default=86400, cast=int)  # seconds
+# Single-flight fills: one worker per key refreshes, the rest wait up to FILL_WAIT
+REDIRECT_CACHE_FILL_LOCK_TIMEOUT = config(
+    "REDIRECT_CACHE_FILL_LOCK_TIMEOUT", default=5.0, cast=float
+)  # seconds
+REDIRECT_CACHE_FILL_WAIT = config(
+    "REDIRECT_CACHE_FILL_WAIT", default=1.0, cast=float
+)  # seconds
+# XFetch early refresh; higher values refresh earlier
+REDIRECT_CACHE_EARLY_REFRESH_BETA = config(
+    "REDIRECT_CACHE_EARLY_REFRESH_BETA", default=1.0, cast=float
+)
+# Warm-up of the top-N links after a deploy ("clicks" or "recent" ranking)
+REDIRECT_WARMUP_LIMIT = config("REDIRECT_WARMUP_LIMIT", default=10000, cast=int)
+REDIRECT_WARMUP_RANKING = config("REDIRECT_WARMUP_RANKING", default="clicks")
+REDIRECT_WARMUP_MIN_CLICKS = config("REDIRECT_WARMUP_MIN_CLICKS", default=1, cast=int)
+REDIRECT_WARMUP_RECENT_HOURS = config(
+    "REDIRECT_WARMUP_RECENT_HOURS", default=24, cast=int
+)
+REDIRECT_WARMUP_BATCH_SIZE = config("REDIRECT_WARMUP_BATCH_SIZE", default=500, cast=int)
+REDIRECT_WARMUP_BUDGET = config(
+    "REDIRECT_WARMUP_BUDGET", default=30.0, cast=float
+)  # seconds
+REDIRECT_WARMUP_ON_WORKER_START = config(
+    "REDIRECT_WARMUP_ON_WORKER_START", default=True, cast=bool
+)
+# Serve /<short_code>/ from the native async view (run under ASGI/uvicorn)
+REDIRECT_ASYNC_VIEW = config("REDIRECT_ASYNC_VIEW", default=True, cast=bool)
 
 LOGGING = {
     "version": 1,
@@ -256,6 +487,16 @@ LOGGING = {
     },
 }
 
+# Metrics
+# /metrics requires this bearer token when set; otherwise scrapes must come
+# from one of METRICS_ALLOWED_NETWORKS. Loopback only by default: behind
+# Docker's port publishing, outside clients arrive from the bridge gateway
+# (a private address), so add the Prometheus scraper's own network explicitly
+METRICS_AUTH_TOKEN = config("METRICS_AUTH_TOKEN", default="")
+METRICS_ALLOWED_NETWORKS = config(
+    "METRICS_ALLOWED_NETWORKS", default="127.0.0.0/8,::1/128", cast=Csv()
+)
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = config(
     "CORS_ALLOWED_ORIGINS",
@@ -265,6 +506,23 @@ CORS_ALLOWED_ORIGINS = config(
 CORS_ALLOW_CREDENTIALS = True
 
 # External Service Configuration
+# One keep-alive httpx client per process for calls to the preview service
+PREVIEW_HTTP_TIMEOUT = config("PREVIEW_HTTP_TIMEOUT", default=5.0, cast=float)
+PREVIEW_HTTP_MAX_CONNECTIONS = config(
+    "PREVIEW_HTTP_MAX_CONNECTIONS", default=20, cast=int
+)
+PREVIEW_HTTP_KEEPALIVE_EXPIRY = config(
+    "PREVIEW_HTTP_KEEPALIVE_EXPIRY", default=30.0, cast=float
+)  # seconds
 PREVIEW_SERVICE_URL = config(
     "PREVIEW_SERVICE_URL", default="http://localhost:8001/preview/fetch/"
 )
+
+# Preview Service (preview_service app)
+# Pages are parsed as they stream in and the download stops at </head>
+PREVIEW_MAX_BYTES = config("PREVIEW_MAX_BYTES", default=256 * 1024, cast=int)
+PREVIEW_FETCH_TIMEOUT = config(
+    "PREVIEW_FETCH_TIMEOUT", default=5.0, cast=float
+)  # seconds
+PREVIEW_BATCH_MAX_URLS = config("PREVIEW_BATCH_MAX_URLS", default=50, cast=int)
+PREVIEW_BATCH_CONCURRENCY = config("PREVIEW_BATCH_CONCURRENCY", default=10, cast=int)
@@ -2,10 +2,14 @@
 URL configuration for config project.
 """
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
-from api.views import RedirectView
+from api.metrics_views import MetricsView
+from api.views import AsyncRedirectView, RedirectView
+
+redirect_view = AsyncRedirectView if settings.REDIRECT_ASYNC_VIEW else RedirectView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -20,6 +24,7 @@ urlpatterns = [
         "preview/",
         include(("preview_service.urls", "preview_service"), namespace="preview"),
     ),
-    # Root redirect handled by API view now
-    path("<str:short_code>/", RedirectView.as_view(), name="redirect_url"),
+    path("metrics", MetricsView.as_view(), name="metrics"),
+    # Root redirect; the async view is the fast path under ASGI
+    path("<str:short_code>/", redirect_view.as_view(), name="redirect_url"),
 ]
@@ -0,0 +1,65 @@
+import io
+import time
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.exception import response_for_exception
+from django.urls import Resolver404, resolve
+from .metrics import observe_request
+
+
+class FastPathASGIHandler(ASGIHandler):
+    """
+    ASGI handler that serves GET requests for async views marked with
+    fast_path = True straight from the ASGI scope.
+    Those requests skip the middleware stack and the request_started/finished
+    signals: several middlewares and signal receivers are sync-only, and under
+    ASGI they cost a thread hop (and a new thread) on every request.
+    All other requests go through the normal Django handling.
+    Views see request.fast_path to know the request signals were skipped.
+    As in ASGIHandler, each request gets its own ThreadSensitiveContext, the
+    Host header is validated against ALLOWED_HOSTS and view errors become
+    Django error responses.
+    """
+
+    async def __call__(self, scope, receive, send):
+        match = self._match_fast_path(scope)
+        if match is None:
+            return await super().__call__(scope, receive, send)
+
+        # GET bodies are ignored, so the request never reads from receive()
+        start = time.perf_counter()
+        request = self.request_class(scope, io.BytesIO())
+        request.fast_path = True
+        # Without its own context, every thread-sensitive sync_to_async call
+        # (the ORM on a cache miss) would share one thread per process
+        async with ThreadSensitiveContext():
+            response = await self.get_fast_path_response(request, match)
+        await self.send_response(response, send)
+        # The middleware that times other requests is skipped here
+        observe_request(
+            match.view_name, "GET", response.status_code, time.perf_counter() - start
+        )
+
+    async def get_fast_path_response(self, request, match):
+        try:
+            # Normally triggered by CommonMiddleware, which is skipped here
+            request.get_host()
+            return await match.func(request, *match.args, **match.kwargs)
+        except Exception as exc:
+            # Logs, sends got_request_exception and builds the 4xx/500 response
+            return await sync_to_async(response_for_exception, thread_sensitive=False)(
+                request, exc
+            )
+
+    def _match_fast_path(self, scope):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return None
+
+        path = scope["path"].removeprefix(scope.get("root_path", ""))
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return None
+
+        view_class = getattr(match.func, "view_class", None)
+        return match if getattr(view_class, "fast_path", False) else None
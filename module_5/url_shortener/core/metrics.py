@@ -0,0 +1,152 @@
+import os
+import time
+from celery.signals import after_task_publish, before_task_publish
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# prometheus_client switches to its multiprocess mode when
+# PROMETHEUS_MULTIPROC_DIR is set: every gunicorn worker writes its samples to
+# memory-mapped files in that directory and /metrics merges them at scrape
+# time, so a scrape reflects all workers rather than whichever one answered.
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent serving a request, by view.",
+    ["view", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries run while serving a request, by view.",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+REDIRECT_CACHE_LOOKUPS = Counter(
+    "redirect_cache_lookups_total",
+    "Redirect cache lookups by tier (l1 in-process, redis) and result.",
+    ["tier", "result"],
+)
+CELERY_ENQUEUE_LATENCY = Histogram(
+    "celery_task_enqueue_duration_seconds",
+    "Time spent publishing a task to the broker, by task.",
+    ["task"],
+    buckets=LATENCY_BUCKETS,
+)
+CIRCUIT_BREAKER_TRANSITIONS = Counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker trips (to open) and resets (back to closed), by breaker.",
+    ["breaker", "event"],
+)
+
+# Label lookups resolved once, on first use: the redirect path then only does
+# an increment. Not at import, because in multiprocess mode creating a child
+# opens its file, and management commands import this module too.
+_cache_lookups = {}
+
+
+def record_cache_lookup(tier: str, hit: bool) -> None:
+    child = _cache_lookups.get((tier, hit))
+    if child is None:
+        child = REDIRECT_CACHE_LOOKUPS.labels(tier, "hit" if hit else "miss")
+        _cache_lookups[tier, hit] = child
+    child.inc()
+
+
+def record_breaker_event(breaker: str, event: str) -> None:
+    CIRCUIT_BREAKER_TRANSITIONS.labels(breaker, event).inc()
+
+
+def observe_request(
+    view: str, method: str, status: int, seconds: float, db_queries: int = None
+) -> None:
+    REQUEST_LATENCY.labels(view, method, str(status)).observe(seconds)
+    if db_queries is not None:
+        REQUEST_DB_QUERIES.labels(view).observe(db_queries)
+
+
+def view_name(request) -> str:
+    """
+    Route name for the metric labels; the raw path would give one series per
+    short code.
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match._func_path
+
+
+class QueryCounter:
+    """
+    connection.execute_wrapper() hook counting the queries of one request.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def render_latest() -> bytes:
+    """
+    Samples in the Prometheus text format, merged across worker processes in
+    multiprocess mode.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+# Publish timings, keyed by task id. Publishing is synchronous, so each id is
+# added and popped by the same thread. A publish that raises never sends
+# after_task_publish, so entries older than PUBLISH_TIMER_EXPIRY are dropped.
+_publish_started = {}
+PUBLISH_TIMER_EXPIRY = 60.0  # seconds
+PUBLISH_TIMER_PRUNE_SIZE = 100
+
+
+def _prune_publish_timers(now: float) -> None:
+    for task_id, started in list(_publish_started.items()):
+        if now - started > PUBLISH_TIMER_EXPIRY:
+            _publish_started.pop(task_id, None)
+
+
+@before_task_publish.connect(dispatch_uid="metrics_before_task_publish")
+def _start_publish_timer(sender=None, headers=None, **kwargs):
+    if headers and "id" in headers:
+        now = time.perf_counter()
+        if len(_publish_started) >= PUBLISH_TIMER_PRUNE_SIZE:
+            _prune_publish_timers(now)
+        _publish_started[headers["id"]] = now
+
+
+@after_task_publish.connect(dispatch_uid="metrics_after_task_publish")
+def _stop_publish_timer(sender=None, headers=None, **kwargs):
+    started = _publish_started.pop((headers or {}).get("id"), None)
+    if started is not None:
+        CELERY_ENQUEUE_LATENCY.labels(sender).observe(time.perf_counter() - started)
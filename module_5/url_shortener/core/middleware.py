@@ -1,5 +1,7 @@
 import logging
 import time
+from django.db import connection
+from .metrics import QueryCounter, observe_request, view_name
 
 logger = logging.getLogger("django.request")
 
@@ -9,12 +11,21 @@ class RequestLoggingMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        start_time = time.time()
+        start_time = time.perf_counter()
+        queries = QueryCounter()
 
         # Process request
-        response = self.get_response(request)
-
-        duration = time.time() - start_time
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+
+        duration = time.perf_counter() - start_time
+        observe_request(
+            view_name(request),
+            request.method,
+            response.status_code,
+            duration,
+            db_queries=queries.count,
+        )
 
         # Log request details
         log_data = {
@@ -22,6 +33,7 @@ class RequestLoggingMiddleware:
             "path": request.path,
             "status": response.status_code,
             "duration": f"{duration:.4f}s",
+            "db_queries": queries.count,
             "ip": self.get_client_ip(request),
         }
 
@@ -0,0 +1,23 @@
+"""
+Gunicorn hooks for the metrics multiprocess mode (core.metrics).
+Loaded automatically when gunicorn starts from this directory.
+"""
+
+import os
+import shutil
+
+
+def on_starting(server):
+    # Samples left by a previous run would otherwise be merged into this one
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Drop the dead worker's gauges; its counters and histograms are kept
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
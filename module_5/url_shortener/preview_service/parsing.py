@@ -0,0 +1,102 @@
+import codecs
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+# Network chunks are fed in slices this big, so a chunk holding </head> and a
+# lot of body stops being parsed soon after the head
+FEED_SIZE = 4096
+
+
+class HeadParser(HTMLParser):
+    """
+    Incremental parser for the preview metadata in a page's <head>: title,
+    meta description (og:description as a fallback) and icon link.
+    Sets done at </head>, or at the first <body> tag when </head> is omitted.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.description = None
+        self.og_description = None
+        self.icon = None
+        self.done = False
+        self._title_parts = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "body":
+            self.done = True
+        elif tag == "title" and self.title is None:
+            self._title_parts = []
+        elif tag == "meta":
+            attrs = dict(attrs)
+            content = attrs.get("content")
+            if content is None:
+                return
+            if (attrs.get("name") or "").lower() == "description":
+                self.description = self.description or content.strip()
+            elif (attrs.get("property") or "").lower() == "og:description":
+                self.og_description = self.og_description or content.strip()
+        elif tag == "link" and self.icon is None:
+            attrs = dict(attrs)
+            if "icon" in (attrs.get("rel") or "").lower() and attrs.get("href"):
+                self.icon = attrs["href"]
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._title_parts is not None:
+            self.title = "".join(self._title_parts).strip() or None
+            self._title_parts = None
+        elif tag == "head":
+            self.done = True
+
+
+class HeadReader:
+    """
+    Feeds a response body to HeadParser chunk by chunk. feed() returns True
+    once the head has been parsed or max_bytes have been read, so the caller
+    can stop downloading; only the current chunk is ever held in memory.
+    """
+
+    def __init__(self, encoding: str = None, max_bytes: int = None):
+        self.parser = HeadParser()
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        try:
+            decoder = codecs.getincrementaldecoder(encoding or "utf-8")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")
+        self._decoder = decoder(errors="replace")
+
+    def feed(self, chunk: bytes) -> bool:
+        if self.max_bytes is not None:
+            chunk = chunk[: self.max_bytes - self.bytes_read]
+        for start in range(0, len(chunk), FEED_SIZE):
+            piece = chunk[start : start + FEED_SIZE]
+            self.bytes_read += len(piece)
+            self.parser.feed(self._decoder.decode(piece))
+            if self.parser.done:
+                return True
+        return self.max_bytes is not None and self.bytes_read >= self.max_bytes
+
+    def preview(self, url: str) -> dict:
+        """
+        The preview payload, with the favicon resolved against url.
+        """
+        parser = self.parser
+        return {
+            "title": parser.title,
+            "description": parser.description or parser.og_description,
+            "favicon": resolve_favicon(url, parser.icon),
+        }
+
+
+def resolve_favicon(url: str, href: str = None) -> str:
+    if not href:
+        return urljoin(url, "/favicon.ico")
+    if href.startswith("//"):
+        return f"https:{href}"
+    return urljoin(url, href)
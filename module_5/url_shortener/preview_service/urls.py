@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import PreviewView
+from .views import PreviewBatchView, PreviewView
 
 urlpatterns = [
     path("fetch/", PreviewView.as_view(), name="preview_fetch"),
+    path("batch/", PreviewBatchView.as_view(), name="preview_batch"),
 ]
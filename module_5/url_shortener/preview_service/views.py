@@ -1,5 +1,7 @@
+import asyncio
+import logging
 import httpx
-from bs4 import BeautifulSoup
+from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -7,6 +9,105 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny
+from .parsing import HeadReader
+
+logger = logging.getLogger(__name__)
+
+REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+
+def fetch_preview(
+    client: httpx.Client, url: str, etag: str = None, last_modified: str = None
+) -> dict:
+    """
+    Stream the page and parse it up to </head> (or PREVIEW_MAX_BYTES);
+    the rest of the body is never downloaded.
+    With etag / last_modified from an earlier fetch the request is
+    conditional, and an unchanged page returns {"not_modified": True}.
+    """
+    try:
+        headers = conditional_headers(etag, last_modified)
+        with client.stream("GET", url, headers=headers) as resp:
+            if resp.status_code == 304:
+                return not_modified_preview(resp)
+            resp.raise_for_status()
+            reader = HeadReader(resp.charset_encoding, settings.PREVIEW_MAX_BYTES)
+            for chunk in resp.iter_bytes():
+                if reader.feed(chunk):
+                    break
+        return {**reader.preview(url), **validators(resp)}
+    except Exception as e:
+        return error_preview(e)
+
+
+async def afetch_preview(
+    client: httpx.AsyncClient, url: str, etag: str = None, last_modified: str = None
+) -> dict:
+    """
+    Async variant of fetch_preview().
+    """
+    try:
+        headers = conditional_headers(etag, last_modified)
+        async with client.stream("GET", url, headers=headers) as resp:
+            if resp.status_code == 304:
+                return not_modified_preview(resp)
+            resp.raise_for_status()
+            reader = HeadReader(resp.charset_encoding, settings.PREVIEW_MAX_BYTES)
+            async for chunk in resp.aiter_bytes():
+                if reader.feed(chunk):
+                    break
+        return {**reader.preview(url), **validators(resp)}
+    except Exception as e:
+        return error_preview(e)
+
+
+def conditional_headers(etag: str = None, last_modified: str = None) -> dict:
+    headers = dict(REQUEST_HEADERS)
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def validators(resp: httpx.Response) -> dict:
+    # Echoed back so the caller can make its next fetch conditional
+    return {
+        "etag": resp.headers.get("etag"),
+        "last_modified": resp.headers.get("last-modified"),
+    }
+
+
+def not_modified_preview(resp: httpx.Response) -> dict:
+    return {"not_modified": True, **validators(resp)}
+
+
+async def afetch_previews(urls: list) -> list:
+    """
+    Fetch previews for urls concurrently (PREVIEW_BATCH_CONCURRENCY at a
+    time) over one client, in input order.
+    """
+    limit = asyncio.Semaphore(settings.PREVIEW_BATCH_CONCURRENCY)
+    async with httpx.AsyncClient(
+        follow_redirects=True, timeout=settings.PREVIEW_FETCH_TIMEOUT
+    ) as client:
+
+        async def fetch(url):
+            async with limit:
+                return {"url": url, **await afetch_preview(client, url)}
+
+        return await asyncio.gather(*(fetch(url) for url in urls))
+
+
+def error_preview(error: Exception) -> dict:
+    # Failures are returned as 200 with nulls, as per plan
+    if isinstance(error, httpx.HTTPStatusError):
+        description = f"HTTP Error: {error.response.status_code}"
+    else:
+        description = str(error)
+    return {"title": None, "description": description, "favicon": None, "error": True}
 
 
 @method_decorator(csrf_exempt, name="dispatch")
@@ -14,6 +115,7 @@ class PreviewView(APIView):
     """
     Standalone microservice view to fetch metadata (title, description, favicon)
     from a target URL.
+    Optional etag / last_modified make the fetch conditional.
     """
 
     authentication_classes = []
@@ -21,83 +123,58 @@ class PreviewView(APIView):
     parser_classes = [JSONParser]
 
     def post(self, request):
-        print("DATA:", request.data)
-        print("CONTENT TYPE:", request.content_type)
-
         url = request.data.get("url")
 
         if not url:
-            import logging
-
-            logger = logging.getLogger(__name__)
             logger.error(f"PreviewView received unexpected data: {request.data}")
             return Response(
                 {"error": "URL is required"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            # Fetch the page
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            with httpx.Client(follow_redirects=True, timeout=5.0) as client:
-                resp = client.get(url, headers=headers)
-                resp.raise_for_status()
-
-            # Parse HTML
-            soup = BeautifulSoup(resp.text, "html.parser")
-
-            # 1. Title
-            title = soup.title.string.strip() if soup.title else None
-
-            # 2. Description
-            desc_tag = soup.find("meta", attrs={"name": "description"}) or soup.find(
-                "meta", attrs={"property": "og:description"}
-            )
-            description = (
-                desc_tag["content"].strip()
-                if desc_tag and desc_tag.has_attr("content")
-                else None
+        with httpx.Client(
+            follow_redirects=True, timeout=settings.PREVIEW_FETCH_TIMEOUT
+        ) as client:
+            preview = fetch_preview(
+                client,
+                url,
+                etag=request.data.get("etag"),
+                last_modified=request.data.get("last_modified"),
             )
+        return Response(preview, status=status.HTTP_200_OK)
 
-            # 3. Favicon
-            icon_tag = soup.find("link", rel=lambda r: r and "icon" in r.lower())
-            favicon = None
-            if icon_tag and icon_tag.has_attr("href"):
-                favicon = icon_tag["href"]
-                # Resolve relative URLs
-                if favicon.startswith("//"):
-                    favicon = f"https:{favicon}"
-                elif favicon.startswith("/"):
-                    from urllib.parse import urljoin
 
-                    favicon = urljoin(url, favicon)
-                elif not favicon.startswith("http"):
-                    from urllib.parse import urljoin
-
-                    favicon = urljoin(url, favicon)
+@method_decorator(csrf_exempt, name="dispatch")
+class PreviewBatchView(APIView):
+    """
+    Fetch metadata for up to PREVIEW_BATCH_MAX_URLS URLs concurrently.
+    Results come back in request order, each with its url.
+    For external callers: the shortener's AsyncPreviewFetcher calls
+    /preview/fetch/ per URL, since its per-domain limits, circuit breaker and
+    conditional revalidation all work per URL.
+    """
 
-            if not favicon:
-                from urllib.parse import urljoin
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    parser_classes = [JSONParser]
 
-                favicon = urljoin(url, "/favicon.ico")
+    def post(self, request):
+        urls = request.data.get("urls")
 
+        if (
+            not isinstance(urls, list)
+            or not urls
+            or not all(isinstance(url, str) and url for url in urls)
+        ):
             return Response(
-                {"title": title, "description": description, "favicon": favicon},
-                status=status.HTTP_200_OK,
+                {"error": "urls must be a non-empty list of URLs"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-
-        except httpx.HTTPStatusError as e:
-            return Response(
-                {
-                    "title": None,
-                    "description": f"HTTP Error: {e.response.status_code}",
-                    "favicon": None,
-                },
-                status=status.HTTP_200_OK,
-            )  # Return 200 with nulls as per plan
-        except Exception as e:
+        if len(urls) > settings.PREVIEW_BATCH_MAX_URLS:
             return Response(
-                {"title": None, "description": str(e), "favicon": None},
-                status=status.HTTP_200_OK,
+                {"error": f"At most {settings.PREVIEW_BATCH_MAX_URLS} URLs per batch"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
+
+        # Sync DRF view: the batch runs on its own event loop
+        results = asyncio.run(afetch_previews(urls))
+        return Response({"results": results}, status=status.HTTP_200_OK)
@@ -0,0 +1,20 @@
+import asyncio
+import weakref
+from django.conf import settings
+from redis import asyncio as aioredis
+
+# redis.asyncio connections are bound to the event loop that opened them
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_redis_connection() -> aioredis.Redis:
+    """
+    Return an asyncio Redis client for the default cache database.
+    One client (and connection pool) is kept per running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = aioredis.Redis.from_url(settings.CACHES["default"]["LOCATION"])
+        _clients[loop] = client
+    return client
@@ -0,0 +1,96 @@
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q, Sum
+from django.utils import timezone
+from .models import URL, HourlyClickRollup
+from .redirect_cache import RedirectRecord, redirect_cache
+
+logger = logging.getLogger(__name__)
+
+RANKINGS = ("clicks", "recent")
+
+# Columns needed to build a RedirectRecord
+RECORD_FIELDS = ("short_code", "original_url", "expires_at", "is_active", "owner__tier")
+
+
+def _live_urls():
+    now = timezone.now()
+    return (
+        URL.objects.active_urls()
+        .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+        .select_related("owner")
+        .only(*RECORD_FIELDS)
+    )
+
+
+def ranked_url_ids(limit: int, ranking: str, recent_hours: int = None) -> list:
+    """
+    Ids of the limit most-clicked live URLs, best first.
+    "clicks" ranks by the lifetime click_count (URLQuerySet.popular_urls);
+    "recent" ranks by clicks in the last recent_hours, read from the hourly
+    rollups.
+    """
+    if ranking == "clicks":
+        return list(
+            _live_urls()
+            .popular_urls(min_clicks=settings.REDIRECT_WARMUP_MIN_CLICKS)
+            .order_by("-click_count")
+            .values_list("id", flat=True)[:limit]
+        )
+    if ranking == "recent":
+        recent_hours = recent_hours or settings.REDIRECT_WARMUP_RECENT_HOURS
+        since = timezone.now() - timedelta(hours=recent_hours)
+        return list(
+            HourlyClickRollup.objects.filter(
+                bucket__gte=since, url__in=_live_urls().values("id")
+            )
+            .values("url")
+            .annotate(total=Sum("count"))
+            .order_by("-total")
+            .values_list("url", flat=True)[:limit]
+        )
+    raise ValueError(f"Unknown ranking '{ranking}', expected one of {RANKINGS}")
+
+
+def warm_redirect_cache(
+    limit: int = None,
+    ranking: str = None,
+    budget: float = None,
+    batch_size: int = None,
+    recent_hours: int = None,
+) -> dict:
+    """
+    Preload the redirect cache with the top-ranked links, one pipelined round
+    trip per batch. Stops early once budget seconds have been spent, so it is
+    safe to run on worker startup.
+    Returns counts of links considered and cached, and whether the budget ran out.
+    """
+    limit = limit or settings.REDIRECT_WARMUP_LIMIT
+    ranking = ranking or settings.REDIRECT_WARMUP_RANKING
+    budget = budget or settings.REDIRECT_WARMUP_BUDGET
+    batch_size = batch_size or settings.REDIRECT_WARMUP_BATCH_SIZE
+    deadline = time.monotonic() + budget
+
+    url_ids = ranked_url_ids(limit, ranking, recent_hours)
+    considered = cached = 0
+    for start in range(0, len(url_ids), batch_size):
+        if time.monotonic() >= deadline:
+            logger.warning(
+                f"Redirect cache warm-up stopped after {considered} of "
+                f"{len(url_ids)} links: budget of {budget}s spent"
+            )
+            return {"considered": considered, "cached": cached, "exhausted": True}
+
+        batch = _live_urls().filter(id__in=url_ids[start : start + batch_size])
+        records = {
+            url_obj.short_code: RedirectRecord.from_url(url_obj) for url_obj in batch
+        }
+        cached += redirect_cache.prime_many(
+            records, timeout=settings.REDIRECT_CACHE_TTL
+        )
+        considered += len(records)
+
+    logger.info(f"Redirect cache warmed with {cached} of {considered} links")
+    return {"considered": considered, "cached": cached, "exhausted": False}
@@ -0,0 +1,180 @@
+import logging
+from django.conf import settings
+from django_redis import get_redis_connection
+from core.metrics import record_breaker_event
+from .redirect_cache import LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Redis server time in milliseconds, so every worker shares one clock
+NOW_MS = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+"""
+
+# Returns 0 (closed), 1 (open) or 2 (half-open: the caller holds the single
+# trial request for ARGV[1] ms; other callers see the breaker as open)
+ACQUIRE_SCRIPT = NOW_MS + """
+local open_until = tonumber(redis.call('HGET', KEYS[1], 'open_until'))
+if not open_until then
+    return 0
+end
+if now < open_until then
+    return 1
+end
+local trial_until = tonumber(redis.call('HGET', KEYS[1], 'trial_until'))
+if trial_until and now < trial_until then
+    return 1
+end
+redis.call('HSET', KEYS[1], 'trial_until', now + tonumber(ARGV[1]))
+return 2
+"""
+
+# Counts a failure; ARGV: threshold, window ms, cooldown ms. Trips the breaker
+# at the threshold, or again when a half-open trial fails, and returns 1 if
+# this failure tripped it
+FAILURE_SCRIPT = NOW_MS + """
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+local open_until = tonumber(redis.call('HGET', KEYS[1], 'open_until'))
+if open_until then
+    if now < open_until then
+        return 0
+    end
+elseif failures < tonumber(ARGV[1]) then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 0
+end
+redis.call('HSET', KEYS[1], 'open_until', now + tonumber(ARGV[3]))
+redis.call('HDEL', KEYS[1], 'trial_until')
+redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[3]) + tonumber(ARGV[2]))
+return 1
+"""
+
+# Closes the breaker unless it is still cooling down (a request that started
+# before the trip); returns 1 if it was open or half-open
+SUCCESS_SCRIPT = NOW_MS + """
+local open_until = tonumber(redis.call('HGET', KEYS[1], 'open_until'))
+if open_until and now < open_until then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+if open_until then
+    return 1
+end
+return 0
+"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker shared by every worker, one circuit per target (domain).
+    closed: failure_threshold failures within failure_window seconds trip it.
+    open: calls are skipped for cooldown seconds.
+    half-open: once the cooldown ends, one worker gets a trial call (it has
+    trial_timeout seconds to report back); success closes the circuit,
+    failure reopens it.
+    Each transition is one Lua script over a Redis hash, so concurrent
+    workers never lose an update. Workers cache the state in-process for
+    state_cache_ttl seconds: a closed circuit is checked without a round
+    trip, and successes only touch Redis for circuits this worker saw fail.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        client=None,
+        failure_threshold: int = None,
+        failure_window: float = None,
+        cooldown: float = None,
+        trial_timeout: float = None,
+        state_cache_ttl: float = None,
+    ):
+        self.name = name
+        self.client = client or get_redis_connection("default")
+        self.failure_threshold = (
+            settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD
+            if failure_threshold is None
+            else failure_threshold
+        )
+        self.failure_window = (
+            settings.CIRCUIT_BREAKER_FAILURE_WINDOW
+            if failure_window is None
+            else failure_window
+        )
+        self.cooldown = (
+            settings.CIRCUIT_BREAKER_COOLDOWN if cooldown is None else cooldown
+        )
+        self.trial_timeout = (
+            settings.CIRCUIT_BREAKER_TRIAL_TIMEOUT
+            if trial_timeout is None
+            else trial_timeout
+        )
+        self.local = LocalLRUCache(
+            max_size=settings.CIRCUIT_BREAKER_STATE_CACHE_SIZE,
+            ttl=(
+                settings.CIRCUIT_BREAKER_STATE_CACHE_TTL
+                if state_cache_ttl is None
+                else state_cache_ttl
+            ),
+        )
+        # Targets with failures (or a trial) reported by this worker
+        self._suspect = set()
+        self._acquire = self.client.register_script(ACQUIRE_SCRIPT)
+        self._failure = self.client.register_script(FAILURE_SCRIPT)
+        self._success = self.client.register_script(SUCCESS_SCRIPT)
+
+    def key(self, target: str) -> str:
+        return f"cb:{self.name}:{target}"
+
+    def allow(self, target: str) -> bool:
+        """
+        Whether a call to target may go ahead. A round trip at most once per
+        state_cache_ttl per target.
+        """
+        state = self.local.get(target)
+        if state is None:
+            result = self._acquire(
+                keys=[self.key(target)], args=[int(self.trial_timeout * 1000)]
+            )
+            state = (CLOSED, OPEN, HALF_OPEN)[int(result)]
+            if state == HALF_OPEN:
+                self._suspect.add(target)
+                logger.info(f"Circuit {self.key(target)} half-open, sending a trial")
+            # While the trial runs, this worker's other calls wait for it
+            self.local.set(target, CLOSED if state == CLOSED else OPEN)
+        return state != OPEN
+
+    def record_failure(self, target: str) -> None:
+        self._suspect.add(target)
+        tripped = self._failure(
+            keys=[self.key(target)],
+            args=[
+                self.failure_threshold,
+                int(self.failure_window * 1000),
+                int(self.cooldown * 1000),
+            ],
+        )
+        if tripped:
+            self.local.set(target, OPEN)
+            record_breaker_event(self.name, "trip")
+            logger.warning(f"Circuit {self.key(target)} opened")
+
+    def record_success(self, target: str) -> None:
+        if target not in self._suspect:
+            return
+        self._suspect.discard(target)
+        if self._success(keys=[self.key(target)]):
+            self.local.set(target, CLOSED)
+            record_breaker_event(self.name, "reset")
+            logger.info(f"Circuit {self.key(target)} closed")
+
+    def clear_local(self) -> None:
+        self.local.clear()
+        self._suspect.clear()
+
+
+preview_breaker = CircuitBreaker("preview")
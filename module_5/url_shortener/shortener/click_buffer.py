@@ -0,0 +1,90 @@
+import json
+import logging
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+from .async_redis import get_async_redis_connection
+from .write_behind import CLAIM_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+
+class ClickBuffer:
+    """
+    Redis list that buffers click events between the redirect path and the
+    periodic drain task.
+    Redirects RPUSH one JSON payload each; the drain task claims them in
+    batches into an in-flight list and only removes them (ack()) once they
+    are committed, so a failed or crashed drain never loses clicks.
+    Events that fail on their own are parked on a dead-letter list.
+    """
+
+    def __init__(self, client=None, key: str = None):
+        self._client = client
+        self.key = key or settings.CLICK_BUFFER_KEY
+        self.in_flight_key = f"{self.key}:in-flight"
+        self.dead_letter_key = f"{self.key}:dead"
+        self._claim = None
+
+    @property
+    def client(self):
+        # Resolved lazily so apush() never builds a sync connection
+        if self._client is None:
+            self._client = get_redis_connection("default")
+        return self._client
+
+    def push(self, short_code: str, click_data: dict) -> None:
+        """
+        Append a click event to the buffer.
+        The redirect timestamp is captured here so that delayed flushes
+        do not skew the analytics time series.
+        """
+        self.client.rpush(self.key, self._encode(short_code, click_data))
+
+    async def apush(self, short_code: str, click_data: dict) -> None:
+        """
+        Async variant of push() for the ASGI redirect view.
+        """
+        client = get_async_redis_connection()
+        await client.rpush(self.key, self._encode(short_code, click_data))
+
+    def _encode(self, short_code: str, click_data: dict) -> str:
+        payload = {
+            "short_code": short_code,
+            "clicked_at": timezone.now().isoformat(),
+            "data": click_data,
+        }
+        return json.dumps(payload)
+
+    def claim(self, batch_size: int) -> list:
+        """
+        Move up to batch_size events to the in-flight list and return them.
+        """
+        if self._claim is None:
+            self._claim = self.client.register_script(CLAIM_SCRIPT)
+        raw_events = self._claim(keys=[self.key, self.in_flight_key], args=[batch_size])
+        return self._decode(raw_events)
+
+    def in_flight(self) -> list:
+        """
+        Events claimed by a drain that never acknowledged them.
+        """
+        return self._decode(self.client.lrange(self.in_flight_key, 0, -1))
+
+    def ack(self) -> None:
+        self.client.delete(self.in_flight_key)
+
+    def dead_letter(self, event: dict) -> None:
+        self.client.rpush(self.dead_letter_key, json.dumps(event))
+
+    def _decode(self, raw_events) -> list:
+        events = []
+        for raw in raw_events or []:
+            try:
+                events.append(json.loads(raw))
+            except ValueError:
+                logger.warning(f"Dropping malformed click event: {raw!r}")
+        return events
+
+    def __len__(self) -> int:
+        return self.client.llen(self.key)
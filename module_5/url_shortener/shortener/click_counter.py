@@ -0,0 +1,88 @@
+import logging
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Hands the pending counts to a flush: the hash is renamed so new clicks start
+# a fresh one. Counts left by a flush that died before finishing are returned
+# again instead, so they are not lost.
+CLAIM_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+
+class ClickCounter:
+    """
+    Pending click_count increments per URL id, kept in a Redis hash and
+    bumped with HINCRBY (atomic, no row lock per click).
+    A periodic flush applies them to Postgres with one F("click_count") + delta
+    UPDATE per distinct delta. Reads add pending() to the stored click_count.
+    """
+
+    def __init__(self, client=None, key: str = None):
+        self.client = client or get_redis_connection("default")
+        self.key = key or settings.CLICK_COUNTER_KEY
+        self.flushing_key = f"{self.key}:flushing"
+        self._claim = self.client.register_script(CLAIM_SCRIPT)
+
+    def add(self, deltas: dict) -> None:
+        """
+        Add increments keyed by URL id in one pipelined round trip.
+        """
+        if not deltas:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for url_id, delta in deltas.items():
+            pipe.hincrby(self.key, url_id, delta)
+        pipe.execute()
+
+    def pending(self, url_ids) -> dict:
+        """
+        Clicks not yet flushed to Postgres, keyed by URL id (0 if none).
+        """
+        url_ids = list(url_ids)
+        if not url_ids:
+            return {}
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hmget(self.key, url_ids)
+        pipe.hmget(self.flushing_key, url_ids)
+        queued, flushing = pipe.execute()
+        return {
+            url_id: int(a or 0) + int(b or 0)
+            for url_id, a, b in zip(url_ids, queued, flushing)
+        }
+
+    def discard(self, url_id) -> None:
+        """
+        Drop pending increments, e.g. when a URL's clicks are reset.
+        """
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hdel(self.key, url_id)
+        pipe.hdel(self.flushing_key, url_id)
+        pipe.execute()
+
+    def flush(self, apply) -> int:
+        """
+        Claim the pending increments and pass them to apply() as
+        {url_id: delta}. They are only dropped from Redis once apply() returns,
+        so a failed flush is retried by the next one; apply() must therefore
+        commit all of the increments or none of them.
+        Returns the number of clicks flushed.
+        """
+        values = self._claim(keys=[self.key, self.flushing_key])
+        deltas = {
+            int(url_id): int(delta)
+            for url_id, delta in zip(values[::2], values[1::2])
+            if int(delta)
+        }
+        if deltas:
+            apply(deltas)
+        self.client.delete(self.flushing_key)
+        return sum(deltas.values())
@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import math
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Unbuilt filters answer "maybe" so a missing key never hides a real code
+MIGHT_CONTAIN_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 1
+end
+for _, offset in ipairs(ARGV) do
+    if redis.call('GETBIT', KEYS[1], offset) == 0 then
+        redis.call('HINCRBY', KEYS[2], 'rejected', 1)
+        return 0
+    end
+end
+return 1
+"""
+
+# Bits are only set on a built filter; a partial bitmap would reject real codes
+ADD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for _, offset in ipairs(ARGV) do
+    redis.call('SETBIT', KEYS[1], offset, 1)
+end
+return 1
+"""
+
+RECORD_FALSE_POSITIVE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HINCRBY', KEYS[2], 'false_positives', 1)
+end
+return 0
+"""
+
+
+class ShortCodeFilter:
+    """
+    Bloom filter of every existing short code, stored as a Redis bitmap so all
+    workers share it. might_contain() never answers False for a code that
+    exists, so a negative answer lets a redirect 404 without a database query.
+    The bitmap size and hash count are part of the key, so changing the
+    capacity settings points at a fresh (unbuilt) filter instead of a
+    mismatched one.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        key: str = None,
+        capacity: int = None,
+        error_rate: float = None,
+    ):
+        self.client = client or get_redis_connection("default")
+        capacity = capacity or settings.SHORT_CODE_FILTER_CAPACITY
+        error_rate = error_rate or settings.SHORT_CODE_FILTER_ERROR_RATE
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        base_key = key or settings.SHORT_CODE_FILTER_KEY
+        self.key = f"{base_key}:{self.size}:{self.hashes}"
+        self.stats_key = f"{self.key}:stats"
+        self._might_contain = self.client.register_script(MIGHT_CONTAIN_SCRIPT)
+        self._add = self.client.register_script(ADD_SCRIPT)
+        self._record_false_positive = self.client.register_script(
+            RECORD_FALSE_POSITIVE_SCRIPT
+        )
+
+    def offsets(self, short_code: str) -> list:
+        """
+        Bit positions for a code, using double hashing over one blake2b digest.
+        """
+        digest = hashlib.blake2b(short_code.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def might_contain(self, short_code: str) -> bool:
+        """
+        False means the code definitely does not exist.
+        Rejections are counted for the false-positive metric.
+        """
+        return bool(
+            self._might_contain(
+                keys=[self.key, self.stats_key], args=self.offsets(short_code)
+            )
+        )
+
+    def add(self, *short_codes: str) -> None:
+        """
+        Add newly created codes. A no-op until the filter has been built.
+        """
+        offsets = [offset for code in short_codes for offset in self.offsets(code)]
+        if offsets:
+            self._add(keys=[self.key], args=offsets)
+
+    def record_false_positive(self) -> None:
+        """
+        Count a code that passed the filter but was not in the database.
+        """
+        self._record_false_positive(keys=[self.key, self.stats_key])
+
+    def rebuild(self, short_codes) -> int:
+        """
+        Build the bitmap in memory from an iterable of all existing codes and
+        swap it in atomically with RENAME. Codes created while the rebuild
+        runs must be add()ed again afterwards.
+        Returns the number of codes added.
+        """
+        bits = bytearray(math.ceil(self.size / 8))
+        count = 0
+        for code in short_codes:
+            for offset in self.offsets(code):
+                # Redis bitmaps are big-endian within each byte
+                bits[offset >> 3] |= 0x80 >> (offset & 7)
+            count += 1
+
+        staging_key = f"{self.key}:staging"
+        self.client.set(staging_key, bytes(bits))
+        pipe = self.client.pipeline()
+        pipe.rename(staging_key, self.key)
+        pipe.delete(self.stats_key)
+        pipe.execute()
+        logger.info(f"Short code filter rebuilt with {count} codes")
+        return count
+
+    def stats(self) -> dict:
+        """
+        Fill ratio, the false-positive rate it implies, and the observed rate
+        (false positives over all lookups for codes that do not exist).
+        """
+        pipe = self.client.pipeline(transaction=False)
+        pipe.exists(self.key)
+        pipe.bitcount(self.key)
+        pipe.hgetall(self.stats_key)
+        ready, bits_set, counters = pipe.execute()
+
+        rejected = int(counters.get(b"rejected", 0))
+        false_positives = int(counters.get(b"false_positives", 0))
+        fill_ratio = bits_set / self.size
+        absent_lookups = rejected + false_positives
+        return {
+            "ready": bool(ready),
+            "size_bits": self.size,
+            "hashes": self.hashes,
+            "fill_ratio": round(fill_ratio, 6),
+            "estimated_false_positive_rate": round(fill_ratio**self.hashes, 6),
+            "rejected": rejected,
+            "false_positives": false_positives,
+            "false_positive_rate": (
+                round(false_positives / absent_lookups, 6) if absent_lookups else 0.0
+            ),
+        }
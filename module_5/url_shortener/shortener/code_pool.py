@@ -0,0 +1,79 @@
+import logging
+from typing import Callable, Optional
+from django.conf import settings
+from django_redis import get_redis_connection
+from .interfaces import IUrlRepository
+
+logger = logging.getLogger(__name__)
+
+
+class ShortCodePool:
+    """
+    Redis set of pre-generated short codes that are known to be unused.
+    Creating a URL pops one code with SPOP (O(1), atomic across workers)
+    instead of probing the repository with exists() in a loop.
+    """
+
+    def __init__(self, client=None, key: str = None):
+        self.client = client or get_redis_connection("default")
+        self.key = key or settings.SHORT_CODE_POOL_KEY
+
+    def pop(self) -> Optional[str]:
+        """
+        Reserve a single code. Returns None if the pool is exhausted.
+        """
+        code = self.client.spop(self.key)
+        return code.decode() if code else None
+
+    def pop_many(self, count: int) -> list:
+        """
+        Reserve up to count codes in one round trip.
+        """
+        if count <= 0:
+            return []
+        return [code.decode() for code in self.client.spop(self.key, count)]
+
+    def discard(self, *codes: str) -> None:
+        """
+        Remove codes claimed by other means (e.g. custom aliases) from the pool.
+        """
+        if codes:
+            self.client.srem(self.key, *codes)
+
+    def size(self) -> int:
+        return self.client.scard(self.key)
+
+    def refill(
+        self,
+        repository: IUrlRepository,
+        generate_code: Callable[[], str],
+        target_size: int = None,
+        batch_size: int = 1000,
+    ) -> int:
+        """
+        Top the pool up to target_size with codes not present in the repository.
+        Candidates are checked in batches with one repository query each, and
+        SADD drops codes already in the pool, so every pooled code is unique.
+        A Redis lock keeps concurrent refills from racing each other.
+        Returns the number of codes added.
+        """
+        target_size = target_size or settings.SHORT_CODE_POOL_SIZE
+        lock = self.client.lock(f"{self.key}:refill", timeout=300, blocking=False)
+        if not lock.acquire():
+            return 0
+
+        added = 0
+        try:
+            missing = target_size - self.size()
+            while missing > 0:
+                candidates = {generate_code() for _ in range(min(missing, batch_size))}
+                fresh = candidates - repository.existing_codes(candidates)
+                if fresh:
+                    new = self.client.sadd(self.key, *fresh)
+                    added += new
+                    missing -= new
+        finally:
+            lock.release()
+
+        logger.info(f"Short code pool refilled with {added} codes")
+        return added
@@ -0,0 +1,58 @@
+import threading
+import redis
+from django.conf import settings
+from django_redis.pool import ConnectionFactory
+
+# Process-wide Redis connection pools keyed by (url, decode_responses).
+# redis-py pools reset themselves in a forked child, so gunicorn and Celery
+# prefork workers never share sockets with their parent.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(
+    url: str = None, decode_responses: bool = False
+) -> redis.ConnectionPool:
+    """
+    Return the shared pool for url, creating it on first use.
+    Callers block for up to REDIS_POOL_TIMEOUT when every connection is busy
+    instead of opening more than REDIS_MAX_CONNECTIONS.
+    """
+    url = url or settings.REDIS_URL
+    key = (url, decode_responses)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = redis.BlockingConnectionPool.from_url(
+                    url,
+                    decode_responses=decode_responses,
+                    max_connections=settings.REDIS_MAX_CONNECTIONS,
+                    timeout=settings.REDIS_POOL_TIMEOUT,
+                    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                    socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+                    socket_keepalive=True,
+                    health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+                )
+                _pools[key] = pool
+    return pool
+
+
+def get_redis_client(url: str = None, decode_responses: bool = True) -> redis.Redis:
+    """
+    Redis client on the shared pool for url (REDIS_URL by default).
+    Clients are cheap; the pool behind them holds the connections.
+    """
+    return redis.Redis(connection_pool=get_connection_pool(url, decode_responses))
+
+
+class SharedConnectionFactory(ConnectionFactory):
+    """
+    django-redis connection factory drawing from the shared pools, so the
+    cache, the repositories and the helpers built on get_redis_connection()
+    are all bounded by the same REDIS_* pool settings.
+    """
+
+    def get_or_create_connection_pool(self, params: dict):
+        return get_connection_pool(params["url"])
@@ -0,0 +1,259 @@
+import ipaddress
+import logging
+import mmap
+import os
+import socket
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+from django.conf import settings
+from .redirect_cache import LocalLRUCache
+
+logger = logging.getLogger(__name__)
+
+# File layout (little-endian): header, then one column per field so the
+# range starts can be binary-searched in place:
+#   magic, range count, city count
+#   starts  uint32[count]   first address of each range, ascending
+#   ends    uint32[count]   last address of each range (inclusive)
+#   country char[2][count]  ISO 3166 code, "  " if unknown
+#   city    uint16[count]   index into the city names, 0 for none
+#   city names, UTF-8, newline-separated (index 0 is "")
+MAGIC = b"GEO1"
+HEADER = struct.Struct("<4sII")
+UNKNOWN = (None, None)
+NOT_LOADED = object()
+
+
+def ip_to_int(ip: str):
+    """
+    IPv4 address as an integer, or None for IPv6 and invalid addresses.
+    """
+    try:
+        # inet_pton is ~10x faster than ipaddress for the common case
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, ip.strip()), "big")
+    except (AttributeError, OSError):
+        pass
+    try:
+        address = ipaddress.ip_address(ip.strip())
+    except (AttributeError, ValueError):
+        return None
+    if address.version == 6:
+        address = address.ipv4_mapped
+    return int(address) if address is not None else None
+
+
+def write_database(path: str, ranges) -> int:
+    """
+    Write (start_ip, end_ip, country, city) rows as a database file.
+    Rows are sorted by start; overlapping ranges keep the first. The file is
+    replaced atomically, so running workers keep reading the old one until
+    they notice the change. Returns the number of ranges written.
+    """
+    rows = []
+    for start, end, country, city in ranges:
+        start, end = ip_to_int(start), ip_to_int(end)
+        if start is not None and end is not None and start <= end:
+            rows.append((start, end, (country or "").upper()[:2], city or ""))
+    rows.sort()
+
+    starts, ends = array("I"), array("I")
+    countries = bytearray()
+    city_ids = array("H")
+    cities = {"": 0}
+    for start, end, country, city in rows:
+        if ends and start <= ends[-1]:
+            continue
+        starts.append(start)
+        ends.append(end)
+        countries += country.encode("ascii", "replace").ljust(2)
+        if city not in cities and len(cities) < 2**16:
+            cities[city] = len(cities)
+        city_ids.append(cities.get(city, 0))
+    if sys.byteorder == "big":
+        for column in (starts, ends, city_ids):
+            column.byteswap()
+
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(starts), len(cities)))
+        for column in (starts, ends, countries, city_ids):
+            f.write(column if isinstance(column, bytearray) else column.tobytes())
+        f.write("\n".join(cities).encode())
+    os.replace(tmp_path, path)
+    return len(starts)
+
+
+class GeoIPDatabase:
+    """
+    Read-only IP range database mapped into memory. Lookups binary-search the
+    sorted range starts directly in the mapping, so opening the file costs
+    nothing per range and worker processes share the pages.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, city_count = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a GeoIP range database")
+
+        view = memoryview(self._mmap)
+        offset = HEADER.size
+        self.starts = view[offset : offset + 4 * count]
+        offset += 4 * count
+        self.ends = view[offset : offset + 4 * count]
+        offset += 4 * count
+        self.countries = view[offset : offset + 2 * count]
+        offset += 2 * count
+        self.city_ids = view[offset : offset + 2 * count]
+        offset += 2 * count
+        self.cities = bytes(view[offset:]).decode().split("\n")[:city_count]
+
+        if sys.byteorder == "big":
+            # Columns are little-endian on disk: keep swapped copies instead
+            self.starts, self.ends, self.city_ids = (
+                self._swapped(column, code)
+                for column, code in (
+                    (self.starts, "I"),
+                    (self.ends, "I"),
+                    (self.city_ids, "H"),
+                )
+            )
+        else:
+            self.starts = self.starts.cast("I")
+            self.ends = self.ends.cast("I")
+            self.city_ids = self.city_ids.cast("H")
+
+    @staticmethod
+    def _swapped(column, code: str):
+        values = array(code)
+        values.frombytes(column)
+        values.byteswap()
+        return values
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def lookup(self, ip: str) -> tuple:
+        """
+        (country, city) for an address, (None, None) if it is not covered.
+        """
+        address = ip_to_int(ip)
+        if address is None:
+            return UNKNOWN
+        index = bisect_right(self.starts, address) - 1
+        if index < 0 or address > self.ends[index]:
+            return UNKNOWN
+        country = bytes(self.countries[2 * index : 2 * index + 2]).decode().strip()
+        city = self.cities[self.city_ids[index]] if self.city_ids[index] else None
+        return country or None, city
+
+
+class GeoEnricher:
+    """
+    Adds country and city to buffered click data in the ingestion worker, so
+    redirects only record the client IP.
+    Addresses are resolved against the GEOIP_DATABASE_PATH file, with an
+    in-process LRU (GEOIP_CACHE_SIZE, GEOIP_CACHE_TTL) for addresses already
+    seen. The file is remapped when it changes on disk; without one, clicks
+    are stored without a location.
+    """
+
+    def __init__(self, path: str = None, cache_size: int = None, ttl: float = None):
+        self.path = path or settings.GEOIP_DATABASE_PATH
+        self.local = LocalLRUCache(
+            max_size=settings.GEOIP_CACHE_SIZE if cache_size is None else cache_size,
+            ttl=settings.GEOIP_CACHE_TTL if ttl is None else ttl,
+        )
+        self._database = None
+        self._signature = NOT_LOADED
+        self._lock = threading.Lock()
+
+    def database(self):
+        """
+        The mapped database, reopened if the file was replaced; None if there
+        is no usable file. Costs one stat() per call.
+        """
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            signature = None
+        if signature == self._signature:
+            return self._database
+
+        with self._lock:
+            if signature != self._signature:
+                database = None
+                if signature is not None:
+                    try:
+                        database = GeoIPDatabase(self.path)
+                        logger.info(
+                            f"Loaded GeoIP database {self.path} "
+                            f"({len(database)} ranges)"
+                        )
+                    except (OSError, ValueError, struct.error) as e:
+                        logger.error(f"Cannot load GeoIP database {self.path}: {e}")
+                else:
+                    logger.warning(
+                        f"GeoIP database {self.path} not found, "
+                        "clicks are stored without a location"
+                    )
+                # The old mapping is left to the garbage collector: another
+                # thread may still be reading it
+                self._database = database
+                self._signature = signature
+                self.local.clear()
+        return self._database
+
+    def lookup_many(self, ips) -> dict:
+        """
+        (country, city) keyed by address.
+        """
+        database = self.database()
+        if database is None:
+            return {ip: UNKNOWN for ip in ips}
+
+        locations = {}
+        for ip in set(ips):
+            location = self.local.get(ip)
+            if location is None:
+                location = database.lookup(ip)
+                self.local.set(ip, location)
+            locations[ip] = location
+        return locations
+
+    def enrich(self, click_data: list) -> int:
+        """
+        Fill in country and city on click data dicts (in place) from their
+        ip_address. Dicts that already carry a country are left alone.
+        Returns the number of clicks located.
+        """
+        pending = [
+            data
+            for data in click_data
+            if data.get("ip_address") and not data.get("country")
+        ]
+        if not pending:
+            return 0
+
+        locations = self.lookup_many(data["ip_address"] for data in pending)
+        located = 0
+        for data in pending:
+            country, city = locations[data["ip_address"]]
+            if country or city:
+                data["country"] = country
+                data["city"] = city
+                located += 1
+        return located
+
+    def clear(self) -> None:
+        self.local.clear()
+
+
+geo_enricher = GeoEnricher()
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Iterable, Optional
+from .redirect_cache import RedirectRecord
 
 
 class IUrlRepository(ABC):
@@ -19,6 +20,21 @@ class IUrlRepository(ABC):
         """
         pass
 
+    def save_many(self, mappings: list, user=None) -> None:
+        """
+        Save a batch of mappings. Each mapping is a dict with "short_code",
+        "original_url" and optional metadata keys.
+        Implementations should override this with a single batched write.
+        """
+        for mapping in mappings:
+            mapping = dict(mapping)
+            self.save_mapping(
+                mapping.pop("short_code"),
+                mapping.pop("original_url"),
+                user=user,
+                **mapping,
+            )
+
     @abstractmethod
     def get_original_url(self, short_code: str) -> Optional[str]:
         """
@@ -27,6 +43,29 @@ class IUrlRepository(ABC):
         """
         pass
 
+    def get_redirect_record(self, short_code: str) -> Optional[RedirectRecord]:
+        """
+        Retrieve what a redirect needs to enforce the active/expiry rules.
+        Returns None if not found. Stores without that metadata report every
+        URL as active and never expiring.
+        """
+        original_url = self.get_original_url(short_code)
+        if not original_url:
+            return None
+        return RedirectRecord(original_url, None, True, None)
+
+    def get_many(self, short_codes: Iterable[str]) -> dict:
+        """
+        Return short_code -> RedirectRecord for the codes that exist.
+        Implementations should override this with a single batched lookup.
+        """
+        records = {}
+        for code in short_codes:
+            record = self.get_redirect_record(code)
+            if record is not None:
+                records[code] = record
+        return records
+
     @abstractmethod
     def exists(self, short_code: str) -> bool:
         """
@@ -34,6 +73,13 @@ class IUrlRepository(ABC):
         """
         pass
 
+    def existing_codes(self, short_codes: Iterable[str]) -> set:
+        """
+        Return the subset of short_codes that already exist.
+        Implementations should override this with a single batched lookup.
+        """
+        return {code for code in short_codes if self.exists(code)}
+
     @abstractmethod
     def log_click(self, short_code: str, click_data: dict) -> None:
         """
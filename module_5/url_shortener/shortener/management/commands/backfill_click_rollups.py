@@ -0,0 +1,66 @@
+from datetime import datetime, time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from shortener.models import URL
+from shortener.rollups import rebuild_click_rollups, truncate_day
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the hourly and daily click rollups from the raw Click table. "
+        "Buckets in the range are replaced, so the command is safe to re-run. "
+        "By default it starts at the oldest raw clicks still kept (the "
+        "retention cutoff) and stops at the start of today, which the live "
+        "ingestion path is still writing to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            help=(
+                "First day to rebuild (YYYY-MM-DD). Defaults to the retention "
+                "cutoff; earlier days are refused."
+            ),
+        )
+        parser.add_argument(
+            "--until",
+            help="Day to stop before (YYYY-MM-DD). Defaults to today.",
+        )
+        parser.add_argument(
+            "--short-code",
+            action="append",
+            dest="short_codes",
+            help="Only rebuild rollups for this short code. Can be repeated.",
+        )
+
+    def handle(self, *args, **options):
+        since = self._parse_day(options["since"]) if options["since"] else None
+        until = (
+            self._parse_day(options["until"])
+            if options["until"]
+            else truncate_day(timezone.now())
+        )
+
+        url_ids = None
+        if options["short_codes"]:
+            url_ids = list(
+                URL.objects.filter(short_code__in=options["short_codes"]).values_list(
+                    "id", flat=True
+                )
+            )
+            if not url_ids:
+                raise CommandError("None of the given short codes exist.")
+
+        try:
+            written = rebuild_click_rollups(since=since, until=until, url_ids=url_ids)
+        except ValueError as e:
+            raise CommandError(str(e))
+        for model_name, count in written.items():
+            self.stdout.write(self.style.SUCCESS(f"{model_name}: {count} rows written"))
+
+    def _parse_day(self, value):
+        day = parse_date(value)
+        if not day:
+            raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+        return timezone.make_aware(datetime.combine(day, time.min))
@@ -0,0 +1,39 @@
+import csv
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from shortener.geoip import write_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the IP range database used to geo-locate clicks from a CSV of "
+        "start_ip,end_ip,country[,city] rows (e.g. an IP-to-city lite export "
+        "trimmed to those columns). IPv6 ranges are skipped. Running workers "
+        "pick up the new file on their next batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path", help="Source CSV file.")
+        parser.add_argument(
+            "--output",
+            default=settings.GEOIP_DATABASE_PATH,
+            help="Database file to write (defaults to GEOIP_DATABASE_PATH).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["csv_path"], newline="", encoding="utf-8") as f:
+                rows = (
+                    (row[0], row[1], row[2], row[3] if len(row) > 3 else None)
+                    for row in csv.reader(f)
+                    if len(row) >= 3
+                )
+                count = write_database(options["output"], rows)
+        except OSError as e:
+            raise CommandError(f"Cannot build GeoIP database: {e}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"GeoIP database written to {options['output']} with {count} ranges"
+            )
+        )
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from shortener import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly Click partitions for the coming months and drop "
+        "partitions older than the retention window. Raw clicks are dropped "
+        "with the partition; hourly and daily rollups are kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.CLICK_PARTITIONS_AHEAD,
+            help="Number of future months to create partitions for.",
+        )
+        parser.add_argument(
+            "--retention-months",
+            type=int,
+            default=settings.CLICK_RETENTION_MONTHS,
+            help="Number of past months of raw clicks to keep.",
+        )
+        parser.add_argument(
+            "--no-drop",
+            action="store_true",
+            help="Only create partitions, never drop old ones.",
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            raise CommandError(
+                "The Click table is not partitioned (requires PostgreSQL)."
+            )
+        if options["months_ahead"] < 0 or options["retention_months"] < 1:
+            raise CommandError(
+                "--months-ahead must be >= 0 and --retention-months must be >= 1."
+            )
+
+        now = timezone.now()
+        for name in partitions.ensure_click_partitions(now, options["months_ahead"]):
+            self.stdout.write(self.style.SUCCESS(f"Created {name}"))
+
+        if not options["no_drop"]:
+            for name in partitions.drop_expired_click_partitions(
+                now, options["retention_months"]
+            ):
+                self.stdout.write(self.style.WARNING(f"Dropped {name}"))
+
+        existing = partitions.list_click_partitions()
+        self.stdout.write(f"{len(existing)} monthly partitions: {', '.join(existing)}")
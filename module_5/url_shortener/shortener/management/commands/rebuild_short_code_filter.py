@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from shortener.code_filter import ShortCodeFilter
+from shortener.models import URL
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the Redis Bloom filter of existing short codes used to reject "
+        "unknown codes on the redirect path. Run on startup and after bulk "
+        "imports that bypass the ORM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10000,
+            help="Rows fetched per database round trip.",
+        )
+
+    def handle(self, *args, **options):
+        code_filter = ShortCodeFilter()
+        started_at = timezone.now()
+        codes = URL.objects.values_list("short_code", flat=True).iterator(
+            chunk_size=options["chunk_size"]
+        )
+        count = code_filter.rebuild(codes)
+
+        # Codes created while the bitmap was being built
+        late_codes = list(
+            URL.objects.filter(created_at__gte=started_at).values_list(
+                "short_code", flat=True
+            )
+        )
+        code_filter.add(*late_codes)
+
+        stats = code_filter.stats()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Short code filter rebuilt with {count + len(late_codes)} codes "
+                f"({stats['size_bits']} bits, {stats['hashes']} hashes, "
+                f"estimated false-positive rate "
+                f"{stats['estimated_false_positive_rate']:.4%})"
+            )
+        )
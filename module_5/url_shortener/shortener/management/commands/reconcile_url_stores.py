@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from shortener.repositories import RedisUrlRepository
+from shortener.write_behind import WriteBehindQueue, reconcile_url_stores
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the Redis URL repository with Postgres and repair drift: "
+        "rewrite missing or stale Redis hashes from Postgres and remove Redis "
+        "codes that no longer exist and have no pending write-behind operation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="URLs compared per database query and Redis pipeline.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report drift, do not repair it.",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be >= 1.")
+
+        redis_repo = RedisUrlRepository()
+        stats = reconcile_url_stores(
+            redis_repo,
+            WriteBehindQueue(client=redis_repo.client),
+            chunk_size=options["chunk_size"],
+            repair=not options["dry_run"],
+        )
+        drift = (
+            stats["missing_in_redis"] + stats["stale_in_redis"] + stats["missing_in_db"]
+        )
+        message = (
+            f"Checked {stats['checked']} URLs: "
+            f"{stats['missing_in_redis']} missing in Redis, "
+            f"{stats['stale_in_redis']} stale in Redis, "
+            f"{stats['missing_in_db']} only in Redis"
+        )
+        if not drift:
+            self.stdout.write(self.style.SUCCESS(message))
+        elif options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"{message} (not repaired)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{message} (repaired)"))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from shortener.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute each user's denormalized active_url_count from the URL "
+        "table, repairing counters that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            action="append",
+            dest="usernames",
+            help="Only recount this user (repeatable). Defaults to all users.",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options["usernames"]:
+            usernames = set(options["usernames"])
+            found = dict(
+                User.objects.filter(username__in=usernames).values_list(
+                    "username", "id"
+                )
+            )
+            missing = usernames - found.keys()
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+            user_ids = list(found.values())
+
+        repaired = User.objects.recount_active_urls(user_ids)
+        if repaired:
+            self.stdout.write(
+                self.style.WARNING(f"Repaired active URL count for {repaired} users")
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS("All active URL counts are correct"))
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from shortener.cache_warmup import RANKINGS, warm_redirect_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Preload the redirect cache with the most-clicked links so a deploy "
+        "or Redis flush does not send the full redirect load to Postgres."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=settings.REDIRECT_WARMUP_LIMIT,
+            help="Number of top links to preload.",
+        )
+        parser.add_argument(
+            "--ranking",
+            choices=RANKINGS,
+            default=settings.REDIRECT_WARMUP_RANKING,
+            help="Rank by lifetime click_count or by recent click volume.",
+        )
+        parser.add_argument(
+            "--recent-hours",
+            type=int,
+            default=settings.REDIRECT_WARMUP_RECENT_HOURS,
+            help="Window for the 'recent' ranking.",
+        )
+        parser.add_argument(
+            "--budget",
+            type=float,
+            default=settings.REDIRECT_WARMUP_BUDGET,
+            help="Seconds to spend before stopping.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.REDIRECT_WARMUP_BATCH_SIZE,
+            help="Links written per pipelined Redis round trip.",
+        )
+
+    def handle(self, *args, **options):
+        if options["limit"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--limit and --batch-size must be >= 1.")
+
+        result = warm_redirect_cache(
+            limit=options["limit"],
+            ranking=options["ranking"],
+            budget=options["budget"],
+            batch_size=options["batch_size"],
+            recent_hours=options["recent_hours"],
+        )
+        message = (
+            f"Cached {result['cached']} of {result['considered']} links "
+            f"(ranked by {options['ranking']}); the rest were already cached"
+        )
+        if result["exhausted"]:
+            self.stdout.write(self.style.WARNING(f"{message}; budget exhausted"))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shortener", "0002_seed_tags"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="click",
+            name="clicked_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 6.0.1 on 2026-10-17 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shortener", "0003_click_clicked_at_default"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyClickRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("country", models.CharField(blank=True, default="", max_length=100)),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "url",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_rollups",
+                        to="shortener.url",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Daily Click Rollup",
+                "verbose_name_plural": "Daily Click Rollups",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("url", "bucket", "country"), name="daily_rollup_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="HourlyClickRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("country", models.CharField(blank=True, default="", max_length=100)),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "url",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="hourly_rollups",
+                        to="shortener.url",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Hourly Click Rollup",
+                "verbose_name_plural": "Hourly Click Rollups",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("url", "bucket", "country"), name="hourly_rollup_unique"
+                    )
+                ],
+            },
+        ),
+    ]
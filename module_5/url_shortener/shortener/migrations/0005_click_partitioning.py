@@ -0,0 +1,114 @@
+# Generated by Django 6.0.1 on 2026-10-17 11:20
+
+from datetime import datetime, timezone
+from django.conf import settings
+from django.db import migrations, models
+
+TABLE = "shortener_click"
+LEGACY_TABLE = "shortener_click_legacy"
+
+
+def _month_start(dt, offset=0):
+    month_index = dt.year * 12 + (dt.month - 1) + offset
+    return datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _rebuild_click_table(schema_editor, partitioned):
+    """
+    Recreate shortener_click as a (non-)partitioned table and copy the rows over.
+    Secondary indexes and the foreign key are captured from the old table and
+    recreated under the same names.
+    """
+    qn = schema_editor.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s "
+            "AND indexname <> %s",
+            [TABLE, f"{TABLE}_pkey"],
+        )
+        index_defs = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT min(clicked_at) FROM {qn(TABLE)}")
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {qn(TABLE)} RENAME TO {qn(LEGACY_TABLE)}")
+        if partitioned:
+            cursor.execute(
+                f"CREATE TABLE {qn(TABLE)} (LIKE {qn(LEGACY_TABLE)} INCLUDING DEFAULTS) "
+                f"PARTITION BY RANGE (clicked_at)"
+            )
+            now = datetime.now(timezone.utc)
+            start = _month_start(oldest or now)
+            end = _month_start(now, settings.CLICK_PARTITIONS_AHEAD + 1)
+            while start < end:
+                cursor.execute(
+                    f"CREATE TABLE {qn(f'{TABLE}_p{start:%Y%m}')} PARTITION OF "
+                    f"{qn(TABLE)} FOR VALUES FROM (%s) TO (%s)",
+                    [start, _month_start(start, 1)],
+                )
+                start = _month_start(start, 1)
+            cursor.execute(
+                f"CREATE TABLE {qn(f'{TABLE}_default')} PARTITION OF {qn(TABLE)} DEFAULT"
+            )
+        else:
+            cursor.execute(
+                f"CREATE TABLE {qn(TABLE)} (LIKE {qn(LEGACY_TABLE)} INCLUDING DEFAULTS)"
+            )
+
+        cursor.execute(f"INSERT INTO {qn(TABLE)} SELECT * FROM {qn(LEGACY_TABLE)}")
+        cursor.execute(f"DROP TABLE {qn(LEGACY_TABLE)}")
+
+        # Postgres requires the partition key in every unique constraint
+        pk_columns = "id, clicked_at" if partitioned else "id"
+        cursor.execute(
+            f"ALTER TABLE {qn(TABLE)} ADD CONSTRAINT {qn(f'{TABLE}_pkey')} "
+            f"PRIMARY KEY ({pk_columns})"
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(TABLE)} ALTER COLUMN id "
+            f"ADD GENERATED BY DEFAULT AS IDENTITY"
+        )
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+            f"coalesce(max(id), 0) + 1, false) FROM {qn(TABLE)}",
+            [TABLE],
+        )
+        for name, definition in foreign_keys:
+            cursor.execute(
+                f"ALTER TABLE {qn(TABLE)} ADD CONSTRAINT {qn(name)} {definition}"
+            )
+        for index_def in index_defs:
+            cursor.execute(index_def)
+
+
+def partition_click_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    _rebuild_click_table(schema_editor, partitioned=True)
+
+
+def unpartition_click_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    _rebuild_click_table(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shortener", "0004_click_rollups"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="click",
+            index=models.Index(
+                fields=["url", "clicked_at"], name="click_url_clicked_at_idx"
+            ),
+        ),
+        migrations.RunPython(partition_click_table, unpartition_click_table),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-17 11:20
+
+import shortener.models
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_active_urls(apps, schema_editor):
+    User = apps.get_model("shortener", "User")
+    URL = apps.get_model("shortener", "URL")
+    active = (
+        URL.objects.filter(owner=OuterRef("pk"), is_active=True)
+        .order_by()
+        .values("owner")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    User.objects.update(active_url_count=Coalesce(Subquery(active), Value(0)))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shortener", "0005_click_partitioning"),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name="user",
+            managers=[
+                ("objects", shortener.models.UserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="active_url_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_active_urls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-17 11:45
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking writes to the URL table
+    atomic = False
+
+    dependencies = [
+        ("shortener", "0006_user_active_url_count"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="url",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["expires_at"],
+                name="url_expires_active_idx",
+            ),
+        ),
+    ]
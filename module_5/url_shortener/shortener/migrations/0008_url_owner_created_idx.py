@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:10
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking writes to the URL table
+    atomic = False
+
+    dependencies = [
+        ("shortener", "0007_url_expires_active_idx"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="url",
+            index=models.Index(
+                fields=["owner", "created_at", "id"], name="url_owner_created_idx"
+            ),
+        ),
+    ]
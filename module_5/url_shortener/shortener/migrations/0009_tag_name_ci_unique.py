@@ -0,0 +1,49 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:40
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def merge_case_duplicates(apps, schema_editor):
+    """
+    Normalize whitespace in tag names and fold tags that only differ in case
+    (or spacing) into the oldest one, moving their URLs over.
+    """
+    Tag = apps.get_model("shortener", "Tag")
+    Through = apps.get_model("shortener", "URL").tags.through
+
+    groups = {}
+    for tag in Tag.objects.order_by("id"):
+        groups.setdefault(" ".join(tag.name.split()).lower(), []).append(tag)
+
+    for tags in groups.values():
+        keeper, duplicates = tags[0], tags[1:]
+        for tag in duplicates:
+            url_ids = Through.objects.filter(tag_id=tag.id).values_list(
+                "url_id", flat=True
+            )
+            Through.objects.bulk_create(
+                [Through(url_id=url_id, tag_id=keeper.id) for url_id in url_ids],
+                ignore_conflicts=True,
+            )
+            tag.delete()
+        name = " ".join(keeper.name.split())
+        if name != keeper.name:
+            keeper.name = name
+            keeper.save(update_fields=["name"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shortener", "0008_url_owner_created_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_case_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="tag",
+            constraint=models.UniqueConstraint(
+                django.db.models.functions.text.Lower("name"), name="tag_name_ci_unique"
+            ),
+        ),
+    ]
@@ -1,11 +1,53 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
-from django.db.models import Count
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Lower
+from django.utils import timezone
 from core.models import TimeStampedModel
 
 
+class UserManager(BaseUserManager):
+    """
+    Manager for the custom User model, maintaining the denormalized
+    active_url_count used by the Free tier limit.
+    """
+
+    def adjust_active_url_counts(self, deltas: dict) -> None:
+        """
+        Apply active URL count changes keyed by user id, one UPDATE per
+        distinct delta. Call inside the transaction that changes the URLs.
+        """
+        by_delta = {}
+        for user_id, delta in deltas.items():
+            if delta:
+                by_delta.setdefault(delta, []).append(user_id)
+        for delta, user_ids in by_delta.items():
+            # Never below zero, even if the counter has drifted
+            self.filter(id__in=user_ids).update(
+                active_url_count=Greatest(F("active_url_count") + delta, 0)
+            )
+
+    def recount_active_urls(self, user_ids=None) -> int:
+        """
+        Recompute active_url_count from the URL table.
+        Returns the number of users whose counter was wrong.
+        """
+        active = (
+            URL.objects.filter(owner=OuterRef("pk"), is_active=True)
+            .order_by()
+            .values("owner")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        users = self.all() if user_ids is None else self.filter(id__in=user_ids)
+        users = users.annotate(actual=Coalesce(Subquery(active), Value(0)))
+        return users.exclude(active_url_count=F("actual")).update(
+            active_url_count=Coalesce(Subquery(active), Value(0))
+        )
+
+
 class User(AbstractUser):
     """
     Custom User model extending AbstractUser.
@@ -26,6 +68,10 @@ class User(AbstractUser):
         choices=Tier.choices,
         default=Tier.FREE,
     )
+    # Kept in step by URL writes; rebuilt by `manage.py recount_active_urls`
+    active_url_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = UserManager()
 
     REQUIRED_FIELDS = ["email", "tier"]
 
@@ -40,9 +86,27 @@ class Tag(models.Model):
 
     name = models.CharField(max_length=50, unique=True)
 
+    class Meta:
+        constraints = [
+            # Lookups go through LOWER(name) so "News" and "news" are one tag
+            models.UniqueConstraint(Lower("name"), name="tag_name_ci_unique"),
+        ]
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def normalize(cls, name: str) -> str:
+        """
+        Stored form of a tag name: whitespace trimmed and collapsed, casing
+        kept (the first spelling stored wins).
+        """
+        return " ".join(str(name).split())[: cls._meta.get_field("name").max_length]
+
+    def save(self, *args, **kwargs):
+        self.name = self.normalize(self.name)
+        super().save(*args, **kwargs)
+
 
 class URLQuerySet(models.QuerySet):
     """
@@ -98,6 +162,18 @@ class URL(TimeStampedModel):
         verbose_name = _("URL")
         verbose_name_plural = _("URLs")
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination of a user's URLs on (created_at, id)
+            models.Index(
+                fields=["owner", "created_at", "id"], name="url_owner_created_idx"
+            ),
+            # Expiry sweeps only ever look at active URLs
+            models.Index(
+                fields=["expires_at"],
+                condition=models.Q(is_active=True),
+                name="url_expires_active_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.short_code} -> {self.original_url}"
@@ -151,7 +227,8 @@ class Click(models.Model):
     """
 
     url = models.ForeignKey(URL, on_delete=models.CASCADE, related_name="clicks")
-    clicked_at = models.DateTimeField(auto_now_add=True)
+    # Set from the redirect timestamp so buffered clicks keep their real time
+    clicked_at = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     city = models.CharField(max_length=100, null=True, blank=True)
     country = models.CharField(max_length=100, null=True, blank=True)
@@ -162,6 +239,92 @@ class Click(models.Model):
         verbose_name = _("Click")
         verbose_name_plural = _("Clicks")
         ordering = ["-clicked_at"]
+        indexes = [
+            # Per-URL time-series reads; on Postgres the table is also
+            # range-partitioned by clicked_at (see shortener/partitions.py)
+            models.Index(fields=["url", "clicked_at"], name="click_url_clicked_at_idx"),
+        ]
 
     def __str__(self):
         return f"Click on {self.url.short_code} at {self.clicked_at}"
+
+
+class ClickRollupQuerySet(models.QuerySet):
+    """
+    Custom QuerySet for reading pre-aggregated click counts.
+    Unknown countries are stored as "" and reported as None.
+    """
+
+    def clicks_per_country(self):
+        """
+        Returns a list of dicts with country and total clicks.
+        Example: [{'country': 'US', 'total_clicks': 10}, ...]
+        """
+        rows = (
+            self.values("country")
+            .annotate(total_clicks=Sum("count"))
+            .order_by("-total_clicks")
+        )
+        return [
+            {"country": row["country"] or None, "total_clicks": row["total_clicks"]}
+            for row in rows
+        ]
+
+    def clicks_over_time(self, since):
+        """
+        Returns a list of dicts with bucket start and total clicks since a datetime.
+        Example: [{'date': '2023-10-01', 'total_clicks': 5}, ...]
+        """
+        return list(
+            self.filter(bucket__gte=since)
+            .values(date=F("bucket"))
+            .annotate(total_clicks=Sum("count"))
+            .order_by("date")
+        )
+
+
+class ClickRollup(models.Model):
+    """
+    Abstract base for click counts pre-aggregated per URL, time bucket and country.
+    Maintained incrementally by the click ingestion path.
+    """
+
+    bucket = models.DateTimeField()
+    country = models.CharField(max_length=100, blank=True, default="")
+    count = models.PositiveIntegerField(default=0)
+
+    objects = ClickRollupQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.url_id} @ {self.bucket} ({self.country or '-'}): {self.count}"
+
+
+class HourlyClickRollup(ClickRollup):
+    url = models.ForeignKey(
+        URL, on_delete=models.CASCADE, related_name="hourly_rollups"
+    )
+
+    class Meta:
+        verbose_name = _("Hourly Click Rollup")
+        verbose_name_plural = _("Hourly Click Rollups")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["url", "bucket", "country"], name="hourly_rollup_unique"
+            )
+        ]
+
+
+class DailyClickRollup(ClickRollup):
+    url = models.ForeignKey(URL, on_delete=models.CASCADE, related_name="daily_rollups")
+
+    class Meta:
+        verbose_name = _("Daily Click Rollup")
+        verbose_name_plural = _("Daily Click Rollups")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["url", "bucket", "country"], name="daily_rollup_unique"
+            )
+        ]
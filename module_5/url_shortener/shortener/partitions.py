@@ -0,0 +1,148 @@
+import logging
+import re
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection, transaction
+from .models import Click
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME_RE = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def month_start(dt: datetime, offset: int = 0) -> datetime:
+    """
+    Return the first instant (UTC) of the month containing dt, shifted by offset months.
+    """
+    month_index = dt.year * 12 + (dt.month - 1) + offset
+    return datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(start: datetime) -> str:
+    return f"{Click._meta.db_table}_p{start:%Y%m}"
+
+
+def partition_start(name: str) -> datetime:
+    year, month = PARTITION_NAME_RE.search(name).groups()
+    return datetime(int(year), int(month), 1, tzinfo=dt_timezone.utc)
+
+
+def is_partitioned() -> bool:
+    """
+    Check whether the Click table is a partitioned table on this database.
+    """
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s",
+            [Click._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_click_partitions() -> list:
+    """
+    Return the names of the monthly Click partitions, oldest first.
+    The DEFAULT partition is not included.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s",
+            [Click._meta.db_table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return sorted(name for name in names if PARTITION_NAME_RE.search(name))
+
+
+def create_click_partition(start: datetime) -> bool:
+    """
+    Create the monthly partition starting at start if it does not exist.
+    Rows that already landed in the DEFAULT partition for that month are
+    moved into the new partition before it is attached.
+    Returns True if a partition was created.
+    """
+    name = partition_name(start)
+    if name in list_click_partitions():
+        return False
+
+    table = Click._meta.db_table
+    end = month_start(start, 1)
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE {qn(name)} "
+            f"(LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {qn(table + '_default')} "
+            f"WHERE clicked_at >= %s AND clicked_at < %s RETURNING *) "
+            f"INSERT INTO {qn(name)} SELECT * FROM moved",
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+    logger.info(f"Created click partition {name}")
+    return True
+
+
+def ensure_click_partitions(now: datetime, months_ahead: int) -> list:
+    """
+    Make sure partitions exist for the current month and the next months_ahead.
+    Returns the names of the partitions created.
+    """
+    created = []
+    for offset in range(months_ahead + 1):
+        start = month_start(now, offset)
+        if create_click_partition(start):
+            created.append(partition_name(start))
+    return created
+
+
+def drop_expired_click_partitions(now: datetime, retention_months: int) -> list:
+    """
+    Detach and drop monthly partitions that end before the retention cutoff.
+    Dropping a whole partition avoids row-level DELETEs and table bloat; only
+    stray rows in the DEFAULT partition are deleted one by one.
+    Returns the names of the partitions dropped.
+    """
+    cutoff = month_start(now, -retention_months)
+    table = Click._meta.db_table
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {qn(table + '_default')} WHERE clicked_at < %s", [cutoff]
+        )
+
+    dropped = []
+    for name in list_click_partitions():
+        if month_start(partition_start(name), 1) > cutoff:
+            continue
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Fire deferred FK checks first; DROP fails while they are pending
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+            cursor.execute(f"DROP TABLE {qn(name)}")
+        logger.info(f"Dropped expired click partition {name}")
+        dropped.append(name)
+    return dropped
+
+
+def raw_clicks_cutoff(now: datetime, retention_months: int):
+    """
+    Earliest instant from which raw clicks are still kept: the retention
+    cutoff, or the start of the oldest partition if it has not been dropped
+    yet. None when the Click table is not partitioned (nothing is dropped).
+    """
+    if not is_partitioned():
+        return None
+    cutoff = month_start(now, -retention_months)
+    names = list_click_partitions()
+    return min(cutoff, partition_start(names[0])) if names else cutoff
@@ -0,0 +1,138 @@
+import hashlib
+import time
+from typing import NamedTuple, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Query parameters that never change the page content
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid")
+
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form used as the cache identity of a page: lowercase scheme and
+    host, no default port, no fragment, tracking parameters dropped and the
+    rest of the query sorted. "https://Example.com:443/?b=2&a=1#top" and
+    "https://example.com/?a=1&b=2&utm_source=x" are the same page.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    try:
+        port = parts.port
+    except ValueError:
+        # Out-of-range or non-numeric port: keep the authority as given
+        host, port = parts.netloc.lower(), None
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    query = urlencode(
+        sorted(
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not key.lower().startswith(TRACKING_PARAMS)
+        )
+    )
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def url_domain(url: str) -> str:
+    return (urlsplit(url.strip()).hostname or "").lower()
+
+
+class CachedPreview(NamedTuple):
+    """
+    A stored preview plus the validators the page was served with.
+    """
+
+    preview: dict
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.fetched_at < ttl
+
+    def validators(self) -> dict:
+        validators = {"etag": self.etag, "last_modified": self.last_modified}
+        return {name: value for name, value in validators.items() if value}
+
+
+class PreviewCache:
+    """
+    Preview results in the Redis cache, keyed by normalized URL, so links to
+    the same page share one fetch.
+    Entries are fresh for PREVIEW_CACHE_TTL and then kept until
+    PREVIEW_CACHE_REVALIDATE_TTL so a refresh can be a conditional request
+    (If-None-Match / If-Modified-Since) answered with 304.
+    Favicons are also cached per domain (PREVIEW_FAVICON_CACHE_TTL) and fill in
+    previews that came back without one.
+    """
+
+    def __init__(self, ttl: int = None, revalidate_ttl: int = None):
+        self.ttl = settings.PREVIEW_CACHE_TTL if ttl is None else ttl
+        self.revalidate_ttl = (
+            settings.PREVIEW_CACHE_REVALIDATE_TTL
+            if revalidate_ttl is None
+            else revalidate_ttl
+        )
+
+    @staticmethod
+    def page_key(url: str) -> str:
+        digest = hashlib.sha1(normalize_url(url).encode()).hexdigest()
+        return f"preview:page:{digest}"
+
+    @staticmethod
+    def favicon_key(domain: str) -> str:
+        return f"preview:favicon:{domain}"
+
+    def get_many(self, urls) -> dict:
+        """
+        Cached entries keyed by URL (fresh or not), in one round trip.
+        """
+        keys = {url: self.page_key(url) for url in urls}
+        found = cache.get_many(list(set(keys.values())))
+        return {
+            url: CachedPreview(*found[key]) for url, key in keys.items() if key in found
+        }
+
+    def get(self, url: str) -> Optional[CachedPreview]:
+        return self.get_many([url]).get(url)
+
+    def set_many(self, entries: dict) -> None:
+        """
+        Store {url: (preview, etag, last_modified)}, along with each
+        preview's favicon under its domain.
+        """
+        now = time.time()
+        pages = {}
+        favicons = {}
+        for url, (preview, etag, last_modified) in entries.items():
+            pages[self.page_key(url)] = (preview, etag, last_modified, now)
+            if preview.get("favicon"):
+                favicons[self.favicon_key(url_domain(url))] = preview["favicon"]
+        if pages:
+            cache.set_many(pages, timeout=self.revalidate_ttl)
+        if favicons:
+            cache.set_many(favicons, timeout=settings.PREVIEW_FAVICON_CACHE_TTL)
+
+    def set(self, url: str, preview: dict, etag=None, last_modified=None) -> None:
+        self.set_many({url: (preview, etag, last_modified)})
+
+    def fill_favicons(self, previews: dict) -> dict:
+        """
+        Give previews without a favicon ({url: preview}) their domain's cached
+        one. Returns previews.
+        """
+        missing = {
+            url: self.favicon_key(url_domain(url))
+            for url, preview in previews.items()
+            if not preview.get("favicon")
+        }
+        if missing:
+            favicons = cache.get_many(list(set(missing.values())))
+            for url, key in missing.items():
+                if key in favicons:
+                    previews[url] = {**previews[url], "favicon": favicons[key]}
+        return previews
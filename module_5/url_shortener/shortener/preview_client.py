@@ -1,8 +1,13 @@
+import asyncio
 import httpx
 import logging
+import os
+import threading
+from collections import defaultdict
 from django.conf import settings
-from django.core.cache import cache
 from urllib.parse import urlparse
+from .circuit_breaker import CircuitBreaker, preview_breaker
+from .preview_cache import PreviewCache
 from tenacity import (
     retry,
     stop_after_attempt,
@@ -12,49 +17,144 @@ from tenacity import (
 
 logger = logging.getLogger(__name__)
 
+# Shared by the sync client and the async batch fetcher
+service_retry = retry(
+    retry=retry_if_exception_type((httpx.RequestError, httpx.HTTPStatusError)),
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=2, max=10),
+    reraise=True,
+)
+
+_http_client = None
+_http_client_pid = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Process-wide httpx client for the preview service. Keeps connections
+    alive between calls instead of paying a TCP (and TLS) handshake each time.
+    Recreated after a fork so workers never share a parent's sockets.
+    """
+    global _http_client, _http_client_pid
+    pid = os.getpid()
+    if _http_client is None or _http_client_pid != pid:
+        with _http_client_lock:
+            if _http_client is None or _http_client_pid != pid:
+                _http_client = httpx.Client(
+                    timeout=settings.PREVIEW_HTTP_TIMEOUT,
+                    limits=httpx.Limits(
+                        max_connections=settings.PREVIEW_HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=settings.PREVIEW_HTTP_MAX_CONNECTIONS,
+                        keepalive_expiry=settings.PREVIEW_HTTP_KEEPALIVE_EXPIRY,
+                    ),
+                )
+                _http_client_pid = pid
+    return _http_client
+
 
 class PreviewServiceClient:
     """
     Client for interacting with the external Preview Service.
-    Includes retry logic (exponential backoff) and a circuit breaker.
+    Includes retry logic (exponential backoff) and a per-domain circuit
+    breaker (see CircuitBreaker).
+    Results are cached per normalized URL (see PreviewCache): fresh entries
+    skip the service, stale ones are refreshed with a conditional request,
+    and a cached preview is served instead of a failure.
     """
 
-    FAILURE_THRESHOLD = 5
-    COOLDOWN_SECONDS = 60
+    PREVIEW_FIELDS = ("title", "description", "favicon")
+
+    def __init__(
+        self, preview_cache: PreviewCache = None, breaker: CircuitBreaker = None
+    ):
+        self.preview_cache = preview_cache or PreviewCache()
+        self.breaker = breaker or preview_breaker
 
     def fetch_preview(self, url: str) -> dict:
+        cached = self.preview_cache.get(url)
+        if cached and cached.is_fresh(self.preview_cache.ttl):
+            return cached.preview
+
         domain = self._get_domain(url)
 
         if self._is_circuit_open(domain):
             logger.warning(
                 f"Circuit open for domain: {domain}. Skipping preview fetch."
             )
-            return {"title": None, "description": "Circuit Open", "favicon": None}
+            return self._fallback_preview(url, cached, self._circuit_open_preview())
 
         try:
-            preview = self._call_service_with_retry(url)
+            result = self._call_service_with_retry(
+                url, **(cached.validators() if cached else {})
+            )
             self._record_success(domain)
-            return preview
         except Exception as e:
-            logger.error(f"Failed to fetch preview for {url} after retries: {str(e)}")
-            self._record_failure(domain)
-            return {
-                "title": None,
-                "description": f"Fetch failed: {str(e)}",
-                "favicon": None,
-            }
-
-    @retry(
-        retry=retry_if_exception_type((httpx.RequestError, httpx.HTTPStatusError)),
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-        reraise=True,
-    )
-    def _call_service_with_retry(self, url: str) -> dict:
-        with httpx.Client(timeout=5.0) as client:
-            response = client.post(settings.PREVIEW_SERVICE_URL, json={"url": url})
-            response.raise_for_status()
-            return response.json()
+            failed = self._failed_preview(url, domain, e)
+            return self._fallback_preview(url, cached, failed)
+
+        preview, entry = self._from_response(url, cached, result)
+        if entry:
+            self.preview_cache.set_many({url: entry})
+        return preview
+
+    @service_retry
+    def _call_service_with_retry(
+        self, url: str, etag: str = None, last_modified: str = None
+    ) -> dict:
+        response = get_http_client().post(
+            settings.PREVIEW_SERVICE_URL,
+            json=self._request_body(url, etag, last_modified),
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _request_body(self, url: str, etag: str = None, last_modified: str = None):
+        body = {"url": url}
+        if etag:
+            body["etag"] = etag
+        if last_modified:
+            body["last_modified"] = last_modified
+        return body
+
+    def _from_response(self, url: str, cached, result: dict):
+        """
+        The preview for a service response, and the cache entry
+        (preview, etag, last_modified) to store for it, if any.
+        A 304 keeps the cached preview; failed fetches are not cached.
+        """
+        if result.get("not_modified") and cached:
+            preview = cached.preview
+        else:
+            preview = {field: result.get(field) for field in self.PREVIEW_FIELDS}
+            if result.get("error"):
+                return self._fallback_preview(url, cached, preview), None
+        etag = result.get("etag") or (cached.etag if cached else None)
+        last_modified = result.get("last_modified") or (
+            cached.last_modified if cached else None
+        )
+        return preview, (preview, etag, last_modified)
+
+    def _fallback_preview(self, url: str, cached, preview: dict) -> dict:
+        """
+        The cached preview, however old, instead of a failed one; otherwise
+        the failed preview with the domain's cached favicon.
+        """
+        if cached:
+            return cached.preview
+        return self.preview_cache.fill_favicons({url: preview})[url]
+
+    def _circuit_open_preview(self) -> dict:
+        return {"title": None, "description": "Circuit Open", "favicon": None}
+
+    def _failed_preview(self, url: str, domain: str, error: Exception) -> dict:
+        logger.error(f"Failed to fetch preview for {url} after retries: {str(error)}")
+        self._record_failure(domain)
+        return {
+            "title": None,
+            "description": f"Fetch failed: {str(error)}",
+            "favicon": None,
+        }
 
     def _get_domain(self, url: str) -> str:
         try:
@@ -63,13 +163,104 @@ class PreviewServiceClient:
             return "unknown"
 
     def _is_circuit_open(self, domain: str) -> bool:
-        failures = cache.get(f"cb:failures:{domain}", 0)
-        return failures >= self.FAILURE_THRESHOLD
+        return not self.breaker.allow(domain)
 
     def _record_failure(self, domain: str):
-        key = f"cb:failures:{domain}"
-        current = cache.get(key, 0)
-        cache.set(key, current + 1, timeout=self.COOLDOWN_SECONDS)
+        self.breaker.record_failure(domain)
 
     def _record_success(self, domain: str):
-        cache.delete(f"cb:failures:{domain}")
+        self.breaker.record_success(domain)
+
+
+class AsyncPreviewFetcher:
+    """
+    Fetches previews for many URLs concurrently over one pooled
+    httpx.AsyncClient, so retry backoff on one URL no longer holds up the
+    rest. At most per_domain_limit fetches per target domain are in flight at
+    once; the pool size bounds the total.
+    Cache lookups, circuit breaker checks and bookkeeping run before and
+    after the event loop, through the same PreviewServiceClient methods as
+    single fetches; the cache is read and written in one round trip each.
+    """
+
+    def __init__(self, client: PreviewServiceClient = None, per_domain_limit=None):
+        self.client = client or PreviewServiceClient()
+        self.per_domain_limit = (
+            per_domain_limit or settings.PREVIEW_PER_DOMAIN_CONCURRENCY
+        )
+
+    def fetch_many(self, urls) -> dict:
+        """
+        Previews keyed by URL, in the same shape as fetch_preview() results.
+        """
+        client = self.client
+        urls = set(urls)
+        cached = client.preview_cache.get_many(urls)
+        previews = {}
+        pending = []
+        for url in urls:
+            entry = cached.get(url)
+            if entry and entry.is_fresh(client.preview_cache.ttl):
+                previews[url] = entry.preview
+            elif client._is_circuit_open(client._get_domain(url)):
+                previews[url] = client._fallback_preview(
+                    url, entry, client._circuit_open_preview()
+                )
+            else:
+                pending.append(url)
+        if not pending:
+            return previews
+
+        entries = {}
+        outcomes = asyncio.run(self._fetch_all(pending, cached))
+        for url, outcome in outcomes.items():
+            domain = client._get_domain(url)
+            if isinstance(outcome, Exception):
+                failed = client._failed_preview(url, domain, outcome)
+                previews[url] = client._fallback_preview(url, cached.get(url), failed)
+            else:
+                client._record_success(domain)
+                previews[url], entry = client._from_response(
+                    url, cached.get(url), outcome
+                )
+                if entry:
+                    entries[url] = entry
+        client.preview_cache.set_many(entries)
+        return previews
+
+    async def _fetch_all(self, urls: list, cached: dict) -> dict:
+        domain_limits = defaultdict(lambda: asyncio.Semaphore(self.per_domain_limit))
+        limits = httpx.Limits(
+            max_connections=settings.PREVIEW_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.PREVIEW_HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=settings.PREVIEW_HTTP_KEEPALIVE_EXPIRY,
+        )
+
+        async with httpx.AsyncClient(
+            timeout=settings.PREVIEW_HTTP_TIMEOUT, limits=limits
+        ) as http:
+
+            async def fetch(url):
+                async with domain_limits[self.client._get_domain(url)]:
+                    try:
+                        validators = cached[url].validators() if url in cached else {}
+                        return url, await self._call_service(http, url, **validators)
+                    except Exception as e:
+                        return url, e
+
+            return dict(await asyncio.gather(*(fetch(url) for url in urls)))
+
+    @service_retry
+    async def _call_service(
+        self,
+        http: httpx.AsyncClient,
+        url: str,
+        etag: str = None,
+        last_modified: str = None,
+    ) -> dict:
+        response = await http.post(
+            settings.PREVIEW_SERVICE_URL,
+            json=self.client._request_body(url, etag, last_modified),
+        )
+        response.raise_for_status()
+        return response.json()
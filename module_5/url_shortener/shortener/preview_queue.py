@@ -0,0 +1,28 @@
+from django.conf import settings
+from django_redis import get_redis_connection
+
+
+class PreviewQueue:
+    """
+    Short codes of URLs waiting for a link preview, kept in a Redis set.
+    Creating a URL only adds its code; the preview worker claims codes in
+    batches with SPOP, so concurrent workers never fetch the same URL.
+    A batch claimed by a worker that dies is lost: those URLs simply keep no
+    preview.
+    """
+
+    def __init__(self, client=None, key: str = None):
+        self.client = client or get_redis_connection("default")
+        self.key = key or settings.PREVIEW_QUEUE_KEY
+
+    def add(self, short_codes) -> None:
+        short_codes = list(short_codes)
+        if short_codes:
+            self.client.sadd(self.key, *short_codes)
+
+    def claim(self, batch_size: int) -> list:
+        codes = self.client.spop(self.key, batch_size) or []
+        return [code.decode() for code in codes]
+
+    def __len__(self) -> int:
+        return self.client.scard(self.key)
@@ -0,0 +1,497 @@
+import asyncio
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils.functional import cached_property
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
+from core.metrics import record_cache_lookup
+from .async_redis import get_async_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Cached in place of a URL for short codes known not to exist
+MISSING = ""
+
+# Seconds between checks while waiting for another worker's cache fill
+FILL_POLL_INTERVAL = 0.02
+# Starting estimate of a fill's duration, in seconds, before any are measured
+INITIAL_FILL_TIME = 0.05
+
+
+class RedirectRecord(NamedTuple):
+    """
+    What a redirect needs from a URL, cached so the active/expiry rules can
+    be enforced on cache hits. expires_at is a Unix timestamp; in Redis the
+    record is stored as a plain tuple to keep entries small.
+    """
+
+    original_url: str
+    expires_at: Optional[float]
+    is_active: bool
+    owner_tier: Optional[str]
+
+    @classmethod
+    def from_url(cls, url_obj) -> "RedirectRecord":
+        return cls(
+            original_url=url_obj.original_url,
+            expires_at=url_obj.expires_at.timestamp() if url_obj.expires_at else None,
+            is_active=url_obj.is_active,
+            owner_tier=url_obj.owner.tier if url_obj.owner_id else None,
+        )
+
+    def check(self) -> str:
+        """
+        Return the original URL, or raise ValueError if the URL is inactive
+        or expired (same rules as UrlShortenerService.get_original_url).
+        """
+        if not self.is_active:
+            raise ValueError("URL is inactive")
+        if self.expires_at is not None and self.expires_at < time.time():
+            raise ValueError("URL has expired")
+        return self.original_url
+
+    def cache_timeout(self, max_timeout: int) -> int:
+        """
+        Cache lifetime capped at max_timeout. Live links expire from the cache
+        when the link itself expires; past that the record answers 410.
+        """
+        if not self.is_active or self.expires_at is None:
+            return max_timeout
+        remaining = math.ceil(self.expires_at - time.time())
+        return min(max_timeout, remaining) if remaining > 0 else max_timeout
+
+
+class LocalLRUCache:
+    """
+    Bounded in-process LRU cache with a per-entry TTL and hit/miss counters.
+    A max_size of 0 disables the cache.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value) -> None:
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class RedirectCache:
+    """
+    Two-tier cache for short_code -> RedirectRecord lookups on the redirect path.
+    L1 is a per-process LRU, L2 is the shared Django Redis cache (url:{short_code}).
+    Invalidations are broadcast over Redis pub/sub so every worker drops its
+    L1 entry; the L1 TTL bounds staleness if a message is ever missed.
+    Unknown codes are cached as MISSING with a short TTL (negative caching).
+    """
+
+    def __init__(self, local_cache: LocalLRUCache = None, channel: str = None):
+        self.local = local_cache or LocalLRUCache(
+            settings.REDIRECT_L1_CACHE_SIZE, settings.REDIRECT_L1_CACHE_TTL
+        )
+        self.channel = channel or settings.REDIRECT_CACHE_INVALIDATION_CHANNEL
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+        self._fill_time = INITIAL_FILL_TIME
+
+    @staticmethod
+    def cache_key(short_code: str) -> str:
+        return f"url:{short_code}"
+
+    def get(self, short_code: str):
+        """
+        Return the cached RedirectRecord, checking L1 before Redis.
+        Returns MISSING for a negative entry and None on a miss in both tiers.
+        """
+        self._ensure_listener()
+
+        record = self.local.get(short_code)
+        record_cache_lookup("l1", record is not None)
+        if record is not None:
+            return record
+
+        record = self._load(cache.get(self.cache_key(short_code)))
+        record_cache_lookup("redis", record is not None)
+        if record is not None:
+            self.local.set(short_code, record)
+        return record
+
+    def set(self, short_code: str, record, timeout: int) -> None:
+        """
+        Cache a RedirectRecord (or MISSING). A record's timeout is shortened
+        to end when the link expires.
+        """
+        self._ensure_listener()
+        timeout, value = self._dump(record, timeout)
+        cache.set(self.cache_key(short_code), value, timeout=timeout)
+        self.local.set(short_code, record)
+
+    def set_missing(self, short_code: str) -> None:
+        self.set(short_code, MISSING, timeout=settings.NEGATIVE_CACHE_TTL)
+
+    def prime_many(self, records: dict, timeout: int) -> int:
+        """
+        Write short_code -> RedirectRecord entries to Redis in one pipelined
+        round trip, skipping codes that are already cached so fresher entries
+        are never overwritten. L1 is left alone (it belongs to the caller's
+        process only). Returns the number of entries written.
+        """
+        if not records:
+            return 0
+        pipe = get_redis_connection("default").pipeline(transaction=False)
+        for short_code, record in records.items():
+            record_timeout, value = self._dump(record, timeout)
+            pipe.set(
+                self._codec.make_key(self.cache_key(short_code)),
+                self._codec.client.encode(value),
+                ex=record_timeout,
+                nx=True,
+            )
+        return sum(1 for written in pipe.execute() if written)
+
+    @cached_property
+    def _codec(self):
+        """
+        Cache backend used only to build keys and (de)serialize values for raw
+        Redis access. The `cache` proxy is recreated for every asyncio task.
+        """
+        return caches.create_connection("default")
+
+    async def aget(self, short_code: str):
+        """
+        Async variant of get() that reads Redis with the asyncio client.
+        Values are decoded with the django-redis serializer, so both variants
+        share the same cache entries.
+        """
+        self._ensure_listener()
+
+        record = self.local.get(short_code)
+        record_cache_lookup("l1", record is not None)
+        if record is not None:
+            return record
+
+        client = get_async_redis_connection()
+        raw = await client.get(self._codec.make_key(self.cache_key(short_code)))
+        record = self._decode(raw)
+        record_cache_lookup("redis", record is not None)
+        if record is not None:
+            self.local.set(short_code, record)
+        return record
+
+    async def aset(self, short_code: str, record, timeout: int) -> None:
+        self._ensure_listener()
+        timeout, value = self._dump(record, timeout)
+        client = get_async_redis_connection()
+        await client.set(
+            self._codec.make_key(self.cache_key(short_code)),
+            self._codec.client.encode(value),
+            ex=timeout,
+        )
+        self.local.set(short_code, record)
+
+    async def aset_missing(self, short_code: str) -> None:
+        await self.aset(short_code, MISSING, timeout=settings.NEGATIVE_CACHE_TTL)
+
+    def get_or_fill(self, short_code: str, fill, timeout: int):
+        """
+        Return the cached RedirectRecord or MISSING, calling fill() on a miss.
+        fill() returns a RedirectRecord, or None for an unknown code (cached
+        as MISSING); exceptions propagate and nothing is cached.
+        Only one caller per key runs fill() at a time across all workers
+        (single-flight Redis lock). The others serve the stale value if there
+        is one, or wait for the winner. Entries are refreshed early with a
+        probability that rises as they near expiry (XFetch), so hot keys are
+        usually refreshed before they expire.
+        """
+        self._ensure_listener()
+        value = self.local.get(short_code)
+        record_cache_lookup("l1", value is not None)
+        if value is not None:
+            return value
+
+        client = get_redis_connection("default")
+        key = self._codec.make_key(self.cache_key(short_code))
+        pipe = client.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.pttl(key)
+        raw, ttl_ms = pipe.execute()
+        value = self._decode(raw)
+        record_cache_lookup("redis", value is not None)
+        if value is not None and not self._should_refresh_early(ttl_ms):
+            self.local.set(short_code, value)
+            return value
+
+        lock = client.lock(
+            f"{key}:fill", timeout=settings.REDIRECT_CACHE_FILL_LOCK_TIMEOUT
+        )
+        if not lock.acquire(blocking=False):
+            if value is not None:
+                # Another worker is already refreshing this entry
+                return value
+            value = self._wait_for_fill(client, key, lock.name)
+            if value is not None:
+                self.local.set(short_code, value)
+                return value
+            # The winner failed or is too slow, so fill without the lock
+            return self._fill(short_code, fill, timeout)
+
+        try:
+            return self._fill(short_code, fill, timeout)
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                # Expired while filling; another worker may hold it now
+                pass
+
+    async def aget_or_fill(self, short_code: str, fill, timeout: int):
+        """
+        Async variant of get_or_fill(); fill is awaited.
+        """
+        self._ensure_listener()
+        value = self.local.get(short_code)
+        record_cache_lookup("l1", value is not None)
+        if value is not None:
+            return value
+
+        client = get_async_redis_connection()
+        key = self._codec.make_key(self.cache_key(short_code))
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.pttl(key)
+            raw, ttl_ms = await pipe.execute()
+        value = self._decode(raw)
+        record_cache_lookup("redis", value is not None)
+        if value is not None and not self._should_refresh_early(ttl_ms):
+            self.local.set(short_code, value)
+            return value
+
+        lock = client.lock(
+            f"{key}:fill", timeout=settings.REDIRECT_CACHE_FILL_LOCK_TIMEOUT
+        )
+        if not await lock.acquire(blocking=False):
+            if value is not None:
+                return value
+            value = await self._await_fill(client, key, lock.name)
+            if value is not None:
+                self.local.set(short_code, value)
+                return value
+            return await self._afill(short_code, fill, timeout)
+
+        try:
+            return await self._afill(short_code, fill, timeout)
+        finally:
+            try:
+                await lock.release()
+            except LockError:
+                pass
+
+    def _fill(self, short_code: str, fill, timeout: int):
+        start = time.monotonic()
+        record = fill()
+        self._record_fill_time(time.monotonic() - start)
+        if record:
+            self.set(short_code, record, timeout=timeout)
+            return record
+        self.set_missing(short_code)
+        return MISSING
+
+    async def _afill(self, short_code: str, fill, timeout: int):
+        start = time.monotonic()
+        record = await fill()
+        self._record_fill_time(time.monotonic() - start)
+        if record:
+            await self.aset(short_code, record, timeout=timeout)
+            return record
+        await self.aset_missing(short_code)
+        return MISSING
+
+    @staticmethod
+    def _dump(record, timeout: int):
+        if isinstance(record, RedirectRecord):
+            return record.cache_timeout(timeout), tuple(record)
+        return timeout, record
+
+    @staticmethod
+    def _load(value):
+        if value is None or value == MISSING:
+            return value
+        if isinstance(value, tuple):
+            return RedirectRecord(*value)
+        # Bare URL left by an older release: treat as a miss so it is refilled
+        return None
+
+    def _decode(self, raw):
+        return self._load(self._codec.client.decode(raw)) if raw is not None else None
+
+    def _wait_for_fill(self, client, key: str, lock_name: str):
+        """
+        Poll until the lock holder has cached a value or released the lock.
+        """
+        deadline = time.monotonic() + settings.REDIRECT_CACHE_FILL_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(FILL_POLL_INTERVAL)
+            pipe = client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.exists(lock_name)
+            raw, locked = pipe.execute()
+            if raw is not None:
+                return self._decode(raw)
+            if not locked:
+                return None
+        return None
+
+    async def _await_fill(self, client, key: str, lock_name: str):
+        deadline = time.monotonic() + settings.REDIRECT_CACHE_FILL_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(FILL_POLL_INTERVAL)
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.exists(lock_name)
+                raw, locked = await pipe.execute()
+            if raw is not None:
+                return self._decode(raw)
+            if not locked:
+                return None
+        return None
+
+    def _record_fill_time(self, seconds: float) -> None:
+        # Moving average of how long a fill takes, the "delta" of XFetch
+        self._fill_time += (seconds - self._fill_time) * 0.1
+
+    def _should_refresh_early(self, ttl_ms: int) -> bool:
+        """
+        XFetch: refresh when delta * beta * -ln(U) reaches the remaining TTL.
+        """
+        if ttl_ms < 0:
+            # No expiry (-1) or the key vanished between GET and PTTL (-2)
+            return False
+        beta = settings.REDIRECT_CACHE_EARLY_REFRESH_BETA
+        jitter = -math.log(1.0 - random.random())
+        return self._fill_time * beta * jitter * 1000 >= ttl_ms
+
+    def invalidate(self, short_code: str) -> None:
+        """
+        Drop the entry from Redis and from the L1 cache of every worker.
+        """
+        cache.delete(self.cache_key(short_code))
+        self.local.delete(short_code)
+        self._publish(short_code)
+
+    def invalidate_many(self, short_codes: list) -> None:
+        """
+        Batched invalidate(): one DEL and one pipelined round of PUBLISHes.
+        """
+        if not short_codes:
+            return
+        cache.delete_many([self.cache_key(code) for code in short_codes])
+        for code in short_codes:
+            self.local.delete(code)
+        try:
+            pipe = get_redis_connection("default").pipeline(transaction=False)
+            for code in short_codes:
+                pipe.publish(self.channel, code)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to broadcast cache invalidation: {e}")
+
+    def clear_local(self) -> None:
+        self.local.clear()
+
+    def stats(self) -> dict:
+        return {"l1": self.local.stats()}
+
+    def _publish(self, message: str) -> None:
+        try:
+            get_redis_connection("default").publish(self.channel, message)
+        except Exception as e:
+            logger.error(f"Failed to broadcast cache invalidation: {e}")
+
+    def _ensure_listener(self) -> None:
+        """
+        Start the pub/sub listener thread once per process.
+        Checked against the pid so forked workers start their own listener.
+        """
+        if self.local.max_size <= 0 or self._listener_pid == os.getpid():
+            return
+
+        with self._listener_lock:
+            if self._listener_pid == os.getpid():
+                return
+            if self._listener_pid is not None:
+                # Forked from a worker whose entries may have gone stale
+                self.local.clear()
+            thread = threading.Thread(
+                target=self._listen, name="redirect-cache-invalidation", daemon=True
+            )
+            thread.start()
+            self._listener_pid = os.getpid()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = get_redis_connection("default").pubsub(
+                    ignore_subscribe_messages=True
+                )
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self.local.delete(message["data"].decode())
+            except Exception as e:
+                logger.error(f"Cache invalidation listener error: {e}")
+                # Invalidations may have been missed while disconnected
+                self.local.clear()
+                time.sleep(1)
+
+
+redirect_cache = RedirectCache()
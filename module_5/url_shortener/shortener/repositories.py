@@ -1,50 +1,247 @@
-import redis
+from collections import Counter, defaultdict
+from datetime import timedelta
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from .interfaces import IUrlRepository
 from typing import Optional
 
 
-from .models import URL, Click, Tag
+from .click_counter import ClickCounter
+from .connections import get_redis_client
+from .models import URL, Click, User
+from .redirect_cache import RedirectRecord, redirect_cache
+from .rollups import apply_click_rollups
+from .signals import urls_bulk_created
+from .tags import tag_cache, tag_key
+from .write_behind import WriteBehindQueue
+
+# Hash fields read to build a RedirectRecord, in constructor order
+RECORD_HASH_FIELDS = ("url", "expires_at", "is_active", "tier")
+
+# Increments the counter only for codes that exist, so a click on a deleted
+# code does not leave behind a hash holding nothing but "clicks"
+INCREMENT_CLICKS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+return redis.call('HINCRBY', KEYS[1], 'clicks', ARGV[1])
+"""
+
+SET_FIELD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+return 1
+"""
 
 
 class RedisUrlRepository(IUrlRepository):
     """
     Redis-backed implementation of the URL repository.
+    Each short code is a hash at {key_prefix}{short_code} holding the URL,
+    owner, expiry, active flag and click counter. URLs with an expiry get a
+    native TTL so Redis drops them on its own, kept a little past expires_at
+    (REDIS_URL_EXPIRED_RETENTION) so expired links still answer 410 for a
+    while instead of 404.
     """
 
-    def __init__(self):
-        # Establish connection using the REDIS_URL from settings
-        # decode_responses=True ensures we get strings back instead of bytes
-        self.client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    def __init__(self, client=None, key_prefix: str = None):
+        # Shared REDIS_URL pool; decode_responses=True returns strings, not bytes
+        self.client = client or get_redis_client()
+        self.key_prefix = key_prefix or settings.REDIS_URL_KEY_PREFIX
+        self._increment_clicks = self.client.register_script(INCREMENT_CLICKS_SCRIPT)
+        self._set_field = self.client.register_script(SET_FIELD_SCRIPT)
+
+    def key(self, short_code: str) -> str:
+        return f"{self.key_prefix}{short_code}"
 
     def save_mapping(
         self, short_code: str, original_url: str, user=None, **kwargs
     ) -> None:
         """
-        Save the mapping to Redis.
-        Key: short_code, Value: original_url
+        Save the mapping as a hash, with a TTL derived from expires_at.
+        """
+        pipe = self.client.pipeline()
+        self._queue_save(pipe, short_code, original_url, user, kwargs.get("expires_at"))
+        pipe.execute()
+
+    def save_many(self, mappings: list, user=None) -> None:
+        """
+        Save a batch of mappings in one MULTI/EXEC round trip.
+        """
+        pipe = self.client.pipeline()
+        for mapping in mappings:
+            self._queue_save(
+                pipe,
+                mapping["short_code"],
+                mapping["original_url"],
+                user,
+                mapping.get("expires_at"),
+            )
+        pipe.execute()
+
+    def _queue_save(self, pipe, short_code, original_url, user, expires_at) -> None:
+        key = self.key(short_code)
+        pipe.delete(key)
+        pipe.hset(
+            key,
+            mapping={
+                "url": original_url,
+                "owner": user.pk if user else "",
+                "tier": getattr(user, "tier", None) or "",
+                "expires_at": expires_at.timestamp() if expires_at else "",
+                "is_active": 1,
+                "clicks": 0,
+            },
+        )
+        self._queue_expiry(pipe, key, expires_at)
+
+    @staticmethod
+    def _queue_expiry(pipe, key: str, expires_at) -> None:
+        if expires_at:
+            retention = timedelta(seconds=settings.REDIS_URL_EXPIRED_RETENTION)
+            pipe.expireat(key, expires_at + retention)
+        else:
+            pipe.persist(key)
+
+    def sync_urls(self, url_objs) -> None:
+        """
+        Overwrite the hashes of existing URL objects with their current state,
+        in one pipelined round trip. Redis click counters are kept; hashes
+        created here start from the database click_count.
+        """
+        pipe = self.client.pipeline(transaction=False)
+        for url_obj in url_objs:
+            key = self.key(url_obj.short_code)
+            record = RedirectRecord.from_url(url_obj)
+            pipe.hset(
+                key,
+                mapping={
+                    "url": record.original_url,
+                    "owner": url_obj.owner_id or "",
+                    "tier": record.owner_tier or "",
+                    "expires_at": record.expires_at or "",
+                    "is_active": int(record.is_active),
+                },
+            )
+            pipe.hsetnx(key, "clicks", url_obj.click_count)
+            self._queue_expiry(pipe, key, url_obj.expires_at)
+        pipe.execute()
+
+    def delete_many(self, short_codes) -> None:
+        keys = [self.key(code) for code in short_codes]
+        if keys:
+            self.client.delete(*keys)
+
+    def iter_codes(self, batch_size: int = 1000):
+        """
+        Yield lists of up to batch_size stored short codes (SCAN, non-blocking).
         """
-        # Redis doesn't store user/ownership in this simple key-value implementation
-        self.client.set(short_code, original_url)
+        batch = []
+        for key in self.client.scan_iter(f"{self.key_prefix}*", count=batch_size):
+            batch.append(key[len(self.key_prefix) :])
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
     def get_original_url(self, short_code: str) -> Optional[str]:
         """
         Retrieve original URL from Redis.
         """
-        return self.client.get(short_code)
+        return self.client.hget(self.key(short_code), "url")
+
+    def get_redirect_record(self, short_code: str) -> Optional[RedirectRecord]:
+        """
+        Retrieve the URL with its active flag and expiry in one HMGET.
+        """
+        return self._to_record(
+            self.client.hmget(self.key(short_code), *RECORD_HASH_FIELDS)
+        )
+
+    def get_many(self, short_codes) -> dict:
+        """
+        Pipelined get_redirect_record() for a batch of codes.
+        """
+        short_codes = list(short_codes)
+        pipe = self.client.pipeline(transaction=False)
+        for code in short_codes:
+            pipe.hmget(self.key(code), *RECORD_HASH_FIELDS)
+
+        records = {}
+        for code, values in zip(short_codes, pipe.execute()):
+            record = self._to_record(values)
+            if record is not None:
+                records[code] = record
+        return records
+
+    @staticmethod
+    def _to_record(values) -> Optional[RedirectRecord]:
+        original_url, expires_at, is_active, tier = values
+        if original_url is None:
+            return None
+        return RedirectRecord(
+            original_url=original_url,
+            expires_at=float(expires_at) if expires_at else None,
+            is_active=is_active == "1",
+            owner_tier=tier or None,
+        )
+
+    def set_active(self, short_code: str, is_active: bool) -> bool:
+        """
+        Activate or deactivate a URL. Returns False if the code does not exist.
+        """
+        return bool(
+            self._set_field(
+                keys=[self.key(short_code)], args=["is_active", int(is_active)]
+            )
+        )
 
     def exists(self, short_code: str) -> bool:
         """
         Check if the short code exists in Redis.
         """
-        return bool(self.client.exists(short_code))
+        return bool(self.client.exists(self.key(short_code)))
+
+    def existing_codes(self, short_codes) -> set:
+        """
+        Pipelined EXISTS for a batch of codes.
+        """
+        short_codes = list(short_codes)
+        pipe = self.client.pipeline(transaction=False)
+        for code in short_codes:
+            pipe.exists(self.key(code))
+        return {code for code, found in zip(short_codes, pipe.execute()) if found}
 
     def log_click(self, short_code: str, click_data: dict) -> None:
         """
-        Log click in Redis (Simple counter impl or pass).
+        Count the click with HINCRBY. Per-click details are not stored in Redis.
+        """
+        self._increment_clicks(keys=[self.key(short_code)], args=[1])
+
+    def log_clicks(self, events: list) -> int:
         """
-        # For this lab, we focus on ORM analytics.
-        pass
+        Count a batch of buffered click events with one pipelined HINCRBY per code.
+        Returns the number of clicks counted.
+        """
+        deltas = Counter(event["short_code"] for event in events)
+        pipe = self.client.pipeline(transaction=False)
+        for code, delta in deltas.items():
+            self._increment_clicks(keys=[self.key(code)], args=[delta], client=pipe)
+        results = pipe.execute()
+        return sum(
+            delta
+            for delta, result in zip(deltas.values(), results)
+            if result is not None
+        )
+
+    def get_click_count(self, short_code: str) -> int:
+        return int(self.client.hget(self.key(short_code), "clicks") or 0)
 
 
 class ORMUrlRepository(IUrlRepository):
@@ -56,25 +253,178 @@ class ORMUrlRepository(IUrlRepository):
         self, short_code: str, original_url: str, user=None, **kwargs
     ) -> None:
         """
-        Save the mapping to the Database.
+        Save the mapping to the Database and count it against the owner's
+        active URLs in the same transaction.
         """
-        url_obj = URL.objects.create(
-            short_code=short_code,
-            original_url=original_url,
-            owner=user,
-            title=kwargs.get("title"),
-            description=kwargs.get("description"),
-            favicon=kwargs.get("favicon"),
-            expires_at=kwargs.get("expires_at"),
-            custom_alias=kwargs.get("custom_alias"),
+        with transaction.atomic():
+            url_obj = URL.objects.create(
+                short_code=short_code,
+                original_url=original_url,
+                owner=user,
+                title=kwargs.get("title"),
+                description=kwargs.get("description"),
+                favicon=kwargs.get("favicon"),
+                expires_at=kwargs.get("expires_at"),
+                custom_alias=kwargs.get("custom_alias"),
+            )
+            User.objects.adjust_active_url_counts({url_obj.owner_id: 1})
+            self._attach_tags([(url_obj, kwargs.get("tags") or [])])
+
+    def save_many(self, mappings: list, user=None) -> None:
+        """
+        Save a batch of mappings with one bulk_create for the URLs and one
+        for the tag through-table, inside a single transaction.
+        """
+        url_objs = [
+            URL(
+                short_code=mapping["short_code"],
+                original_url=mapping["original_url"],
+                owner=user,
+                title=mapping.get("title"),
+                description=mapping.get("description"),
+                favicon=mapping.get("favicon"),
+                expires_at=mapping.get("expires_at"),
+                custom_alias=mapping.get("custom_alias"),
+            )
+            for mapping in mappings
+        ]
+
+        with transaction.atomic():
+            URL.objects.bulk_create(url_objs)
+            if user is not None:
+                User.objects.adjust_active_url_counts({user.id: len(url_objs)})
+            self._attach_tags(
+                [
+                    (url_obj, mapping.get("tags") or [])
+                    for url_obj, mapping in zip(url_objs, mappings)
+                ]
+            )
+        urls_bulk_created.send(
+            sender=URL, short_codes=[url_obj.short_code for url_obj in url_objs]
+        )
+
+    def upsert_many(self, mappings: list) -> None:
+        """
+        Insert or update a batch of mappings by short_code with a single
+        INSERT ... ON CONFLICT. Each mapping carries its owner as "owner_id"
+        and expires_at as an ISO string, as queued by the write-behind repository.
+        """
+        url_objs = [
+            URL(
+                short_code=mapping["short_code"],
+                original_url=mapping["original_url"],
+                owner_id=mapping["owner_id"],
+                expires_at=(
+                    parse_datetime(mapping["expires_at"])
+                    if mapping.get("expires_at")
+                    else None
+                ),
+                custom_alias=mapping.get("custom_alias"),
+                title=mapping.get("title"),
+                description=mapping.get("description"),
+            )
+            for mapping in mappings
+        ]
+        with transaction.atomic():
+            # Only newly inserted URLs add to their owner's active count
+            existing = self.existing_codes(url_obj.short_code for url_obj in url_objs)
+            new_per_owner = Counter(
+                url_obj.owner_id
+                for url_obj in url_objs
+                if url_obj.short_code not in existing
+            )
+            URL.objects.bulk_create(
+                url_objs,
+                update_conflicts=True,
+                unique_fields=["short_code"],
+                update_fields=[
+                    "original_url",
+                    "expires_at",
+                    "custom_alias",
+                    "title",
+                    "description",
+                ],
+            )
+            User.objects.adjust_active_url_counts(new_per_owner)
+            self._attach_tags(
+                [
+                    (url_obj, mapping.get("tags") or [])
+                    for url_obj, mapping in zip(url_objs, mappings)
+                ]
+            )
+
+    def set_active_many(self, short_codes, is_active: bool) -> int:
+        """
+        Set is_active on a batch of URLs by short code.
+        Returns the number of URLs changed.
+        """
+        urls = URL.objects.filter(
+            short_code__in=list(short_codes), is_active=not is_active
         )
+        return len(self._set_active(urls, is_active))
 
-        # Handle tags
-        tags = kwargs.get("tags", [])
-        if tags:
-            for tag_name in tags:
-                tag, _ = Tag.objects.get_or_create(name=tag_name)
-                url_obj.tags.add(tag)
+    def deactivate_expired(self, limit: int) -> list:
+        """
+        Deactivate up to limit active URLs whose expires_at has passed, oldest
+        first, in one short transaction. Rows locked by a concurrent run are
+        skipped. The query is served by the partial url_expires_active_idx.
+        Returns the short codes deactivated.
+        """
+        expired = URL.objects.filter(
+            is_active=True, expires_at__lt=timezone.now()
+        ).order_by("expires_at")[:limit]
+        return self._set_active(expired, is_active=False, skip_locked=True)
+
+    def _set_active(self, urls, is_active: bool, skip_locked: bool = False) -> list:
+        """
+        Lock the given URLs, flip is_active with one UPDATE and adjust their
+        owners' active URL counts in the same transaction. The codes are
+        evicted from the redirect cache once the transaction commits.
+        Returns the short codes changed.
+        """
+        with transaction.atomic():
+            changing = list(
+                urls.select_for_update(skip_locked=skip_locked).values_list(
+                    "id", "owner_id", "short_code"
+                )
+            )
+            if not changing:
+                return []
+            URL.objects.filter(id__in=[url_id for url_id, _, _ in changing]).update(
+                is_active=is_active
+            )
+            step = 1 if is_active else -1
+            per_owner = Counter(owner_id for _, owner_id, _ in changing)
+            User.objects.adjust_active_url_counts(
+                {owner_id: step * n for owner_id, n in per_owner.items()}
+            )
+            short_codes = [short_code for _, _, short_code in changing]
+            transaction.on_commit(lambda: redirect_cache.invalidate_many(short_codes))
+        return short_codes
+
+    def _attach_tags(self, url_tags: list) -> None:
+        """
+        Attach tags to saved URLs given (url_obj, tag_names) pairs.
+        Names are resolved to ids through the in-process tag cache (missing
+        tags are created in bulk) and the through-table is written with a
+        single bulk_create.
+        """
+        tag_ids = tag_cache.resolve(
+            name for _, tag_names in url_tags for name in tag_names
+        )
+        if not tag_ids:
+            return
+
+        Through = URL.tags.through
+        Through.objects.bulk_create(
+            [
+                Through(url_id=url_obj.id, tag_id=tag_id)
+                for url_obj, tag_names in url_tags
+                for tag_id in {tag_ids.get(tag_key(name)) for name in tag_names}
+                if tag_id is not None
+            ],
+            ignore_conflicts=True,
+        )
 
     def get_original_url(self, short_code: str) -> Optional[str]:
         """
@@ -91,34 +441,275 @@ class ORMUrlRepository(IUrlRepository):
         Retrieve URL object from Database.
         """
         try:
-            return URL.objects.get(short_code=short_code)
+            return URL.objects.select_related("owner").get(short_code=short_code)
         except URL.DoesNotExist:
             return None
 
+    def get_redirect_record(self, short_code: str) -> Optional[RedirectRecord]:
+        url_obj = self.get_url_by_code(short_code)
+        return RedirectRecord.from_url(url_obj) if url_obj else None
+
+    def get_many(self, short_codes) -> dict:
+        """
+        Fetch redirect records for a batch of codes in one query.
+        """
+        url_objs = URL.objects.filter(short_code__in=list(short_codes)).select_related(
+            "owner"
+        )
+        return {
+            url_obj.short_code: RedirectRecord.from_url(url_obj) for url_obj in url_objs
+        }
+
     def exists(self, short_code: str) -> bool:
         """
         Check if the short code exists in Database.
         """
         return URL.objects.filter(short_code=short_code).exists()
 
+    def existing_codes(self, short_codes) -> set:
+        """
+        Return the subset of short_codes already present in the Database.
+        """
+        return set(
+            URL.objects.filter(short_code__in=list(short_codes)).values_list(
+                "short_code", flat=True
+            )
+        )
+
     def log_click(self, short_code: str, click_data: dict) -> None:
         """
         Log a click in the database.
+        click_count is not touched here: the increment goes to the Redis
+        ClickCounter and reaches the row with the next counter flush.
         """
-        try:
-            url_obj = URL.objects.get(short_code=short_code)
-            # Increment counter
-            url_obj.click_count += 1
-            url_obj.save(update_fields=["click_count"])
+        url_id = (
+            URL.objects.filter(short_code=short_code)
+            .values_list("id", flat=True)
+            .first()
+        )
+        if url_id is None:
+            return
 
-            # Create detailed click record
-            Click.objects.create(
-                url=url_obj,
+        # Create detailed click record and roll it up atomically
+        with transaction.atomic():
+            click = Click.objects.create(
+                url_id=url_id,
                 ip_address=click_data.get("ip_address"),
                 city=click_data.get("city"),
                 country=click_data.get("country"),
                 user_agent=click_data.get("user_agent"),
                 referrer=click_data.get("referrer"),
             )
-        except URL.DoesNotExist:
-            pass
+            apply_click_rollups([click])
+            self.count_clicks({url_id: 1})
+
+    def log_clicks(self, events: list) -> int:
+        """
+        Log a batch of buffered click events in a single transaction.
+        Click rows are bulk-inserted, the hourly/daily rollups are updated
+        incrementally and the click_count increments go to the ClickCounter.
+        Returns the number of clicks written.
+        """
+        short_codes = {event["short_code"] for event in events}
+        url_ids = dict(
+            URL.objects.filter(short_code__in=short_codes).values_list(
+                "short_code", "id"
+            )
+        )
+
+        clicks = []
+        deltas = Counter()
+        for event in events:
+            url_id = url_ids.get(event["short_code"])
+            if url_id is None:
+                # URL was deleted after the redirect was served
+                continue
+
+            click_data = event.get("data") or {}
+            clicks.append(
+                Click(
+                    url_id=url_id,
+                    clicked_at=parse_datetime(event["clicked_at"]),
+                    ip_address=click_data.get("ip_address"),
+                    city=click_data.get("city"),
+                    country=click_data.get("country"),
+                    user_agent=click_data.get("user_agent"),
+                    referrer=click_data.get("referrer"),
+                )
+            )
+            deltas[url_id] += 1
+
+        with transaction.atomic():
+            Click.objects.bulk_create(clicks)
+            apply_click_rollups(clicks)
+            self.count_clicks(deltas)
+
+        return len(clicks)
+
+    @staticmethod
+    def count_clicks(deltas: dict) -> None:
+        """
+        Add click_count increments to the Redis ClickCounter once the current
+        transaction commits, so rolled-back clicks are never counted.
+        """
+        if deltas:
+            transaction.on_commit(lambda: ClickCounter().add(deltas))
+
+    def increment_click_counts(self, deltas: dict) -> None:
+        """
+        Apply aggregated click_count increments keyed by URL id.
+        URLs sharing the same delta are updated together with one F() UPDATE,
+        all in one transaction: a claim that fails half-way is retried whole,
+        so no URL may keep its share from the failed attempt.
+        """
+        ids_by_delta = defaultdict(list)
+        for url_id, delta in deltas.items():
+            ids_by_delta[delta].append(url_id)
+
+        with transaction.atomic():
+            for delta, url_ids in ids_by_delta.items():
+                URL.objects.filter(id__in=url_ids).update(
+                    click_count=F("click_count") + delta
+                )
+
+
+class WriteBehindUrlRepository(IUrlRepository):
+    """
+    Composite repository: RedisUrlRepository is written synchronously and
+    serves reads, Postgres is written behind through a WriteBehindQueue that
+    flush_write_behind_task drains in batches.
+    Reads that miss Redis fall back to Postgres and repair the Redis hash,
+    so URLs created or changed through the ORM are still served.
+    """
+
+    def __init__(self, redis_repo=None, orm_repo=None, queue=None):
+        self.redis = redis_repo or RedisUrlRepository()
+        self.orm = orm_repo or ORMUrlRepository()
+        # An empty queue is falsy (__len__), so test for None explicitly
+        self.queue = (
+            queue if queue is not None else WriteBehindQueue(client=self.redis.client)
+        )
+
+    def save_mapping(
+        self, short_code: str, original_url: str, user=None, **kwargs
+    ) -> None:
+        self.save_many(
+            [{"short_code": short_code, "original_url": original_url, **kwargs}],
+            user=user,
+        )
+
+    def save_many(self, mappings: list, user=None) -> None:
+        """
+        Write the Redis hashes and queue the Postgres upserts in one MULTI/EXEC.
+        """
+        pipe = self.redis.client.pipeline()
+        operations = []
+        for mapping in mappings:
+            expires_at = mapping.get("expires_at")
+            self.redis._queue_save(
+                pipe,
+                mapping["short_code"],
+                mapping["original_url"],
+                user,
+                expires_at,
+            )
+            operations.append(
+                {
+                    "op": "save",
+                    "short_code": mapping["short_code"],
+                    "original_url": mapping["original_url"],
+                    "owner_id": user.pk if user else None,
+                    "expires_at": expires_at.isoformat() if expires_at else None,
+                    "custom_alias": mapping.get("custom_alias"),
+                    "title": mapping.get("title"),
+                    "description": mapping.get("description"),
+                    "tags": list(mapping.get("tags") or []),
+                }
+            )
+        self.queue.push(*operations, pipe=pipe)
+        pipe.execute()
+        # The codes are live in Redis now, not once Postgres catches up
+        urls_bulk_created.send(
+            sender=URL, short_codes=[mapping["short_code"] for mapping in mappings]
+        )
+
+    def get_original_url(self, short_code: str) -> Optional[str]:
+        record = self.get_redirect_record(short_code)
+        return record.original_url if record else None
+
+    def get_redirect_record(self, short_code: str) -> Optional[RedirectRecord]:
+        return self.get_many([short_code]).get(short_code)
+
+    def get_many(self, short_codes) -> dict:
+        """
+        Pipelined Redis lookup; misses are read from Postgres in one query
+        and written back to Redis.
+        """
+        short_codes = list(short_codes)
+        records = self.redis.get_many(short_codes)
+        missing = [code for code in short_codes if code not in records]
+        if missing:
+            url_objs = list(
+                URL.objects.filter(short_code__in=missing).select_related("owner")
+            )
+            if url_objs:
+                self.redis.sync_urls(url_objs)
+            records.update(
+                (url_obj.short_code, RedirectRecord.from_url(url_obj))
+                for url_obj in url_objs
+            )
+        return records
+
+    def exists(self, short_code: str) -> bool:
+        return bool(self.existing_codes([short_code]))
+
+    def existing_codes(self, short_codes) -> set:
+        """
+        Codes in Redis (including writes not yet in Postgres) or in Postgres.
+        """
+        short_codes = list(short_codes)
+        found = self.redis.existing_codes(short_codes)
+        return found | self.orm.existing_codes(
+            code for code in short_codes if code not in found
+        )
+
+    def set_active(self, short_code: str, is_active: bool) -> bool:
+        found = self.redis.set_active(short_code, is_active)
+        # Redis is the source of truth for reads, so evict right away rather
+        # than when the queued write reaches Postgres
+        redirect_cache.invalidate(short_code)
+        self.queue.push(
+            {"op": "set_active", "short_code": short_code, "is_active": is_active}
+        )
+        return found
+
+    def log_click(self, short_code: str, click_data: dict) -> None:
+        self.log_clicks(
+            [
+                {
+                    "short_code": short_code,
+                    "clicked_at": timezone.now().isoformat(),
+                    "data": click_data,
+                }
+            ]
+        )
+
+    def log_clicks(self, events: list) -> int:
+        """
+        Count the clicks in Redis now and queue the Click rows for Postgres.
+        Events use the ClickBuffer format.
+        """
+        counted = self.redis.log_clicks(events)
+        self.queue.push(*({"op": "click", **event} for event in events))
+        return counted
+
+
+def get_url_repository() -> IUrlRepository:
+    """
+    Repository for redirects, URL creation, deactivation and click ingestion,
+    selected by the URL_REPOSITORY setting. Reads and edits made by the
+    management API stay on the ORM; signals keep Redis in step with them.
+    """
+    if settings.URL_REPOSITORY == "write_behind":
+        return WriteBehindUrlRepository()
+    return ORMUrlRepository()
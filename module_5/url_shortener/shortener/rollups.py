@@ -0,0 +1,127 @@
+from collections import Counter
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce, TruncDay, TruncHour
+from django.utils import timezone
+from . import partitions
+from .models import Click, DailyClickRollup, HourlyClickRollup
+
+UPSERT_CHUNK_SIZE = 1000
+
+
+def truncate_hour(dt):
+    return timezone.localtime(dt).replace(minute=0, second=0, microsecond=0)
+
+
+def truncate_day(dt):
+    return timezone.localtime(dt).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# Rollup model -> (Python bucket function, matching database truncation)
+ROLLUPS = {
+    HourlyClickRollup: (truncate_hour, TruncHour),
+    DailyClickRollup: (truncate_day, TruncDay),
+}
+
+
+def apply_click_rollups(clicks) -> None:
+    """
+    Add a batch of Click rows to the hourly and daily rollups.
+    Counts are aggregated in Python first, then applied with one
+    INSERT ... ON CONFLICT DO UPDATE per chunk so concurrent drains add up
+    instead of overwriting each other. Must run inside the same transaction
+    as the Click inserts.
+    """
+    for model, (truncate, _) in ROLLUPS.items():
+        counts = Counter(
+            (click.url_id, truncate(click.clicked_at), click.country or "")
+            for click in clicks
+        )
+        _upsert_increments(model, counts)
+
+
+def _upsert_increments(model, counts: Counter) -> None:
+    table = connection.ops.quote_name(model._meta.db_table)
+    # Sorted so concurrent upserts lock rows in the same order
+    rows = sorted(counts.items())
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = rows[start : start + UPSERT_CHUNK_SIZE]
+        placeholders = ", ".join(["(%s, %s, %s, %s)"] * len(chunk))
+        params = []
+        for (url_id, bucket, country), count in chunk:
+            params.extend([url_id, bucket, country, count])
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (url_id, bucket, country, count)
+                VALUES {placeholders}
+                ON CONFLICT (url_id, bucket, country)
+                DO UPDATE SET count = {table}.count + EXCLUDED.count
+                """,
+                params,
+            )
+
+
+def rebuild_click_rollups(since=None, until=None, url_ids=None) -> dict:
+    """
+    Recompute rollups from the raw Click table for buckets in [since, until).
+    Existing rollup rows in the range are replaced, so the rebuild is idempotent.
+    Raw clicks older than the retention window are dropped while their rollups
+    are kept, so since defaults to partitions.raw_clicks_cutoff() and an
+    earlier since raises ValueError instead of wiping that history.
+    Returns the number of rollup rows written per model.
+    """
+    cutoff = partitions.raw_clicks_cutoff(
+        timezone.now(), settings.CLICK_RETENTION_MONTHS
+    )
+    if since is None:
+        since = cutoff
+    elif cutoff and since < cutoff:
+        raise ValueError(
+            f"Raw clicks before {cutoff:%Y-%m-%d} are no longer kept; "
+            "rebuilding from there would delete their rollups"
+        )
+
+    written = {}
+    with transaction.atomic():
+        for model, (truncate, trunc_func) in ROLLUPS.items():
+            clicks = Click.objects.all()
+            rollups = model.objects.all()
+            if since:
+                since_bucket = truncate(since)
+                clicks = clicks.filter(clicked_at__gte=since_bucket)
+                rollups = rollups.filter(bucket__gte=since_bucket)
+            if until:
+                until_bucket = truncate(until)
+                clicks = clicks.filter(clicked_at__lt=until_bucket)
+                rollups = rollups.filter(bucket__lt=until_bucket)
+            if url_ids is not None:
+                clicks = clicks.filter(url_id__in=url_ids)
+                rollups = rollups.filter(url_id__in=url_ids)
+
+            rollups.delete()
+            aggregated = (
+                clicks.annotate(
+                    bucket=trunc_func("clicked_at"),
+                    country_key=Coalesce("country", Value("")),
+                )
+                .values("url_id", "bucket", "country_key")
+                .annotate(total=Count("id"))
+                .order_by()
+            )
+            created = model.objects.bulk_create(
+                (
+                    model(
+                        url_id=row["url_id"],
+                        bucket=row["bucket"],
+                        country=row["country_key"],
+                        count=row["total"],
+                    )
+                    for row in aggregated.iterator()
+                ),
+                batch_size=UPSERT_CHUNK_SIZE,
+            )
+            written[model._meta.model_name] = len(created)
+    return written
@@ -1,6 +1,11 @@
+import logging
 import secrets
 import string
+from typing import Optional
 from .interfaces import IUrlRepository
+from .redirect_cache import RedirectRecord
+
+logger = logging.getLogger(__name__)
 
 # from .exceptions import InvalidUrlException # Not used
 
@@ -10,11 +15,14 @@ from .interfaces import IUrlRepository
 class UrlShortenerService:
     """
     Service layer containing business logic for URL shortening.
-    Uses dependency injection for the repository.
+    Uses dependency injection for the repository and the optional code pool
+    and short code filter.
     """
 
-    def __init__(self, repository: IUrlRepository):
+    def __init__(self, repository: IUrlRepository, code_pool=None, code_filter=None):
         self.repository = repository
+        self.code_pool = code_pool
+        self.code_filter = code_filter
         # Use a slightly longer set or just ascii
         self.CODE_LENGTH = 6
         self.CHAR_SET = string.ascii_letters + string.digits
@@ -32,18 +40,76 @@ class UrlShortenerService:
             if self.repository.exists(custom_alias):
                 raise ValueError(f"Custom alias '{custom_alias}' is already taken.")
             short_code = custom_alias
+            if self.code_pool:
+                # The alias may have been pre-generated into the pool
+                self.code_pool.discard(custom_alias)
         else:
-            # Logic to generate unique code
-            short_code = self._generate_random_code()
-            # Ensure uniqueness (simple retry mechanism)
-            while self.repository.exists(short_code):
-                short_code = self._generate_random_code()
+            short_code = self._allocate_code()
 
         self.repository.save_mapping(
             short_code, original_url, user=user, custom_alias=custom_alias, **kwargs
         )
         return short_code
 
+    def shorten_urls_bulk(self, entries: list, user=None) -> list:
+        """
+        Shortens a batch of URLs with batched code allocation and a single save.
+        Each entry is a dict with "original_url" and the optional "custom_alias",
+        "tags" and "expires_at" keys.
+        Returns one result per entry, in order: {"short_code": ...} on success
+        or {"error": ...} if the entry was rejected.
+        """
+        results = [None] * len(entries)
+        aliases = [
+            entry["custom_alias"] for entry in entries if entry.get("custom_alias")
+        ]
+        taken = self.repository.existing_codes(aliases)
+
+        claimed_aliases = set()
+        codes_by_index = {}
+        pending = []
+        for index, entry in enumerate(entries):
+            custom_alias = entry.get("custom_alias")
+            if not custom_alias:
+                pending.append(index)
+            elif custom_alias in taken or custom_alias in claimed_aliases:
+                results[index] = {
+                    "error": f"Custom alias '{custom_alias}' is already taken."
+                }
+            else:
+                claimed_aliases.add(custom_alias)
+                codes_by_index[index] = custom_alias
+
+        if self.code_pool and claimed_aliases:
+            self.code_pool.discard(*claimed_aliases)
+
+        generated = self._allocate_codes(len(pending), reserved=claimed_aliases)
+        codes_by_index.update(zip(pending, generated))
+
+        mappings = []
+        for index in sorted(codes_by_index):
+            entry = entries[index]
+            mappings.append({**entry, "short_code": codes_by_index[index]})
+            results[index] = {"short_code": codes_by_index[index]}
+
+        self.repository.save_many(mappings, user=user)
+        return results
+
+    def get_redirect_record(self, short_code: str) -> Optional[RedirectRecord]:
+        """
+        Retrieves the cacheable redirect record for a short code, without
+        enforcing the active/expiry rules (callers run record.check()).
+        Returns None if not found.
+        """
+        # Unknown codes (e.g. scanners) are rejected without a repository lookup
+        if self.code_filter and not self.code_filter.might_contain(short_code):
+            return None
+
+        record = self.repository.get_redirect_record(short_code)
+        if record is None and self.code_filter:
+            self.code_filter.record_false_positive()
+        return record
+
     def get_original_url(
         self, short_code: str, click_data: dict = None, log_click: bool = True
     ) -> str:
@@ -52,30 +118,51 @@ class UrlShortenerService:
         Returns None if not found.
         Raises ValueError if URL is expired or inactive.
         """
-        # We need the full object to check business rules
-        # ORM repository must implement get_url_by_code
-        if hasattr(self.repository, "get_url_by_code"):
-            url_obj = self.repository.get_url_by_code(short_code)
-        else:
-            # Fallback for Redis or other simple repos that haven't implemented this yet
-            # This logic assumes simple key-value store where we can't check expiry easily
-            return self.repository.get_original_url(short_code)
-
-        if not url_obj:
+        record = self.get_redirect_record(short_code)
+        if record is None:
             return None
 
         # Business Logic: Check Expiry and Active Status
-        if not url_obj.is_active:
-            raise ValueError("URL is inactive")
-
-        if url_obj.is_expired:
-            raise ValueError("URL has expired")
+        original_url = record.check()
 
         # Log Click
         if click_data and log_click:
             self.repository.log_click(short_code, click_data)
 
-        return url_obj.original_url
+        return original_url
+
+    def _allocate_code(self) -> str:
+        """
+        Reserve a unique short code, preferring the pre-generated pool.
+        Falls back to generate-and-check when the pool is disabled or empty.
+        """
+        if self.code_pool:
+            short_code = self.code_pool.pop()
+            if short_code:
+                return short_code
+            logger.warning("Short code pool exhausted, falling back to generation")
+
+        # Logic to generate unique code
+        short_code = self._generate_random_code()
+        # Ensure uniqueness (simple retry mechanism)
+        while self.repository.exists(short_code):
+            short_code = self._generate_random_code()
+        return short_code
+
+    def _allocate_codes(self, count: int, reserved: set = frozenset()) -> list:
+        """
+        Reserve count unique short codes, preferring the pre-generated pool.
+        Generated candidates are checked against the repository in one batch.
+        """
+        codes = self.code_pool.pop_many(count) if self.code_pool else []
+        while len(codes) < count:
+            candidates = {
+                self._generate_random_code() for _ in range(count - len(codes))
+            }
+            candidates -= reserved | set(codes)
+            candidates -= self.repository.existing_codes(candidates)
+            codes.extend(candidates)
+        return codes
 
     def _generate_random_code(self) -> str:
         """Helper to generate a random string."""
@@ -1,7 +1,30 @@
-from django.db.models.signals import pre_save, post_delete
-from django.dispatch import receiver
-from django.core.cache import cache
-from .models import URL
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_delete, post_save
+from django.dispatch import Signal, receiver
+from .code_filter import ShortCodeFilter
+from .models import URL, Tag
+from .redirect_cache import redirect_cache
+
+# Sent by bulk inserts, which skip post_save; provides short_codes
+urls_bulk_created = Signal()
+
+logger = logging.getLogger(__name__)
+
+
+def invalidate_on_commit(short_code: str) -> None:
+    """
+    Evict a code from the redirect cache once the current transaction
+    commits: evicting earlier lets a concurrent miss re-cache the old row
+    for a full TTL, and a rollback needs no eviction at all.
+    """
+
+    def invalidate():
+        redirect_cache.invalidate(short_code)
+        logger.debug(f"Redirect cache invalidated for {short_code}")
+
+    transaction.on_commit(invalidate)
 
 
 @receiver(pre_save, sender=URL)
@@ -15,15 +38,60 @@ def invalidate_url_cache_on_update(sender, instance, **kwargs):
     except URL.DoesNotExist:
         return
 
-    # Only invalidate if original_url changed
-    if old_instance.original_url != instance.original_url:
-        cache_key = f"url:{instance.short_code}"
-        cache.delete(cache_key)
-        print(f"Cache invalidated for {cache_key}")
+    # Only invalidate if a field cached for redirects changed
+    if (
+        old_instance.original_url != instance.original_url
+        or old_instance.is_active != instance.is_active
+        or old_instance.expires_at != instance.expires_at
+    ):
+        invalidate_on_commit(old_instance.short_code)
 
 
 @receiver(post_delete, sender=URL)
 def invalidate_url_cache_on_delete(sender, instance, **kwargs):
-    cache_key = f"url:{instance.short_code}"
-    cache.delete(cache_key)
-    print(f"Cache invalidated (delete) for {cache_key}")
+    invalidate_on_commit(instance.short_code)
+
+
+@receiver(post_save, sender=URL)
+def register_created_url(sender, instance, created, **kwargs):
+    if created:
+        register_short_codes([instance.short_code])
+
+
+@receiver(urls_bulk_created)
+def register_bulk_created_urls(sender, short_codes, **kwargs):
+    register_short_codes(short_codes)
+
+
+def register_short_codes(short_codes: list) -> None:
+    """
+    Add new codes to the short code filter and drop any negative cache
+    entries left by earlier lookups of the same codes.
+    """
+    if settings.SHORT_CODE_FILTER_ENABLED:
+        ShortCodeFilter().add(*short_codes)
+    redirect_cache.invalidate_many(short_codes)
+
+
+@receiver(post_save, sender=URL)
+def sync_url_to_redis_repository(sender, instance, **kwargs):
+    # Management APIs write through the ORM; keep the Redis repository in step
+    if settings.URL_REPOSITORY == "write_behind":
+        from .repositories import RedisUrlRepository
+
+        RedisUrlRepository().sync_urls([instance])
+
+
+@receiver(post_delete, sender=URL)
+def delete_url_from_redis_repository(sender, instance, **kwargs):
+    if settings.URL_REPOSITORY == "write_behind":
+        from .repositories import RedisUrlRepository
+
+        RedisUrlRepository().delete_many([instance.short_code])
+
+
+@receiver(post_delete, sender=Tag)
+def forget_deleted_tag(sender, instance, **kwargs):
+    from .tags import tag_cache
+
+    tag_cache.forget(instance.name)
@@ -0,0 +1,89 @@
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Lower
+from .models import Tag
+from .redirect_cache import LocalLRUCache
+
+
+def tag_key(name: str) -> str:
+    """
+    Case-insensitive identity of a tag, matching the LOWER(name) unique index.
+    """
+    return Tag.normalize(name).lower()
+
+
+class TagCache:
+    """
+    In-process tag key -> id cache in front of the LOWER(name) index.
+    Tags are never renamed by the app, so entries only age out with the TTL
+    (or are dropped when a tag is deleted).
+    """
+
+    def __init__(self, max_size: int = None, ttl: float = None):
+        self.local = LocalLRUCache(
+            max_size=settings.TAG_CACHE_SIZE if max_size is None else max_size,
+            ttl=settings.TAG_CACHE_TTL if ttl is None else ttl,
+        )
+
+    def lookup(self, name: str):
+        """
+        Id of an existing tag, or None. At most one indexed query.
+        """
+        key = tag_key(name)
+        if not key:
+            return None
+        tag_id = self.local.get(key)
+        if tag_id is None:
+            tag_id = self._fetch([key]).get(key)
+        return tag_id
+
+    def resolve(self, names) -> dict:
+        """
+        Ids for the given tag names keyed by tag_key(), creating missing tags.
+        Cached names cost nothing; the rest take one query, plus one
+        bulk_create and one query if some tags are new.
+        """
+        spellings = {}
+        for name in names:
+            display = Tag.normalize(name)
+            if display:
+                spellings.setdefault(display.lower(), display)
+
+        tag_ids = {}
+        for key in spellings:
+            tag_id = self.local.get(key)
+            if tag_id is not None:
+                tag_ids[key] = tag_id
+        missing = [key for key in spellings if key not in tag_ids]
+        if missing:
+            tag_ids.update(self._fetch(missing))
+        missing = [key for key in spellings if key not in tag_ids]
+        if missing:
+            # Concurrent creators collide on the LOWER(name) index and are skipped
+            Tag.objects.bulk_create(
+                [Tag(name=spellings[key]) for key in missing], ignore_conflicts=True
+            )
+            tag_ids.update(self._fetch(missing))
+        return tag_ids
+
+    def forget(self, name: str) -> None:
+        self.local.delete(tag_key(name))
+
+    def clear(self) -> None:
+        self.local.clear()
+
+    def _fetch(self, keys: list) -> dict:
+        found = dict(
+            Tag.objects.annotate(key=Lower("name"))
+            .filter(key__in=keys)
+            .values_list("key", "id")
+        )
+        # Only cache ids once they are committed: a tag created by a
+        # transaction that rolls back must not be handed out later
+        for key, tag_id in found.items():
+            transaction.on_commit(partial(self.local.set, key, tag_id))
+        return found
+
+
+tag_cache = TagCache()
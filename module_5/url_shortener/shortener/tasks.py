@@ -1,49 +1,334 @@
+import logging
 from celery import shared_task
+from celery.signals import worker_ready
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
+from . import partitions
+from .cache_warmup import warm_redirect_cache
+from .click_buffer import ClickBuffer
+from .click_counter import ClickCounter
+from .code_pool import ShortCodePool
+from .geoip import geo_enricher
 from .models import URL
-from .repositories import ORMUrlRepository
+from .preview_queue import PreviewQueue
+from .repositories import ORMUrlRepository, RedisUrlRepository, get_url_repository
+from .services import UrlShortenerService
+from .write_behind import (
+    WriteBehindQueue,
+    drain_write_behind_queue,
+    reconcile_url_stores,
+)
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def track_click_task(short_code, click_data):
     """
-    Background task to log a click event for a shortened URL.
+    Background task to log a single click event for a shortened URL.
+    Redirects go through the click buffer instead; this remains for direct callers.
     """
+    geo_enricher.enrich([click_data])
     repo = ORMUrlRepository()
     repo.log_click(short_code, click_data)
     return f"Click tracked for {short_code}"
 
 
 @shared_task
-def archive_expired_urls_task():
+def flush_click_buffer_task(batch_size: int = None):
+    """
+    Periodic task to drain the click buffer into the database.
+    Clicks left in flight by a failed or crashed drain are written first,
+    then only the events buffered when the run starts, so a busy redirect
+    path cannot keep a single run going forever.
+    A Redis lock keeps a single drain running.
+    Each batch is geo-located here (GeoEnricher) rather than on the redirect.
+    """
+    batch_size = batch_size or settings.CLICK_BUFFER_BATCH_SIZE
+    buffer = ClickBuffer()
+    # With write-behind the clicks are counted in Redis and queued for Postgres
+    repo = get_url_repository()
+    lock = buffer.client.lock(
+        f"{buffer.key}:drain", timeout=settings.CLICK_BUFFER_LOCK_TIMEOUT
+    )
+    if not lock.acquire(blocking=False):
+        return "Click buffer drain already running"
+    try:
+        flushed = 0
+        replay = buffer.in_flight()
+        if replay:
+            logger.warning(f"Replaying {len(replay)} unacknowledged click events")
+            flushed += _log_click_batch(buffer, replay, repo)
+
+        remaining = len(buffer)
+        while remaining > 0:
+            events = buffer.claim(min(batch_size, remaining))
+            if not events:
+                break
+            remaining -= len(events)
+            flushed += _log_click_batch(buffer, events, repo)
+    finally:
+        lock.release()
+
+    return f"Flushed {flushed} buffered clicks"
+
+
+def _log_click_batch(buffer: ClickBuffer, events: list, repo) -> int:
+    """
+    Write a claimed batch and acknowledge it. A batch that fails is retried
+    one event at a time so a single bad event is dead-lettered; if every
+    event fails (e.g. the database is down) the batch stays in flight for
+    the next run and the error is raised.
+    """
+    geo_enricher.enrich([event["data"] for event in events if event.get("data")])
+    try:
+        flushed = repo.log_clicks(events)
+    except Exception as e:
+        logger.error(f"Click batch failed, logging one by one: {e}")
+        flushed = 0
+        failed = []
+        for event in events:
+            try:
+                flushed += repo.log_clicks([event])
+            except Exception as event_error:
+                failed.append((event, event_error))
+        if len(failed) == len(events):
+            raise
+        for event, event_error in failed:
+            logger.error(f"Dead-lettering click event {event}: {event_error}")
+            buffer.dead_letter(event)
+    buffer.ack()
+    return flushed
+
+
+@shared_task
+def flush_click_counts_task():
+    """
+    Periodic task to apply the click_count increments accumulated in Redis.
+    A Redis lock keeps two flushes from applying the same claimed counts.
+    """
+    counter = ClickCounter()
+    lock = counter.client.lock(
+        f"{counter.key}:lock", timeout=settings.CLICK_COUNTER_LOCK_TIMEOUT
+    )
+    if not lock.acquire(blocking=False):
+        return "Click count flush already running"
+    try:
+        flushed = counter.flush(ORMUrlRepository().increment_click_counts)
+    finally:
+        lock.release()
+    return f"Flushed {flushed} click count increments"
+
+
+@shared_task
+def archive_expired_urls_task(batch_size: int = None, max_batches: int = None):
     """
-    Periodic task to deactivate expired URLs.
+    Periodic task to deactivate expired URLs, batch_size rows per transaction
+    so no run holds locks on a large row set. Each batch's codes are evicted
+    from the redirect cache in one pipelined round trip when it commits
+    (ORMUrlRepository._set_active). Stops after
+    max_batches; the next run picks up the rest.
     """
-    # Deactivate URLs that have expired but are still marked active
-    updated_count = URL.objects.filter(
-        expires_at__lt=timezone.now(), is_active=True
-    ).update(is_active=False)
+    batch_size = batch_size or settings.ARCHIVE_EXPIRED_BATCH_SIZE
+    max_batches = max_batches or settings.ARCHIVE_EXPIRED_MAX_BATCHES
+    repo = ORMUrlRepository()
+
+    updated_count = 0
+    for _ in range(max_batches):
+        short_codes = repo.deactivate_expired(limit=batch_size)
+        updated_count += len(short_codes)
+        if len(short_codes) < batch_size:
+            break
+    else:
+        logger.info(f"Archived {updated_count} URLs, more remain for the next run")
 
     return f"Deactivated {updated_count} expired URLs"
 
 
-@shared_task(bind=True, max_retries=3)
-def fetch_url_preview_task(self, url_id: int, original_url: str):
+@shared_task
+def refill_short_code_pool_task():
+    """
+    Periodic task to keep the pre-generated short code pool topped up.
+    """
+    repo = ORMUrlRepository()
+    service = UrlShortenerService(repo)
+    added = ShortCodePool().refill(repo, service._generate_random_code)
+    return f"Added {added} short codes to the pool"
+
+
+@shared_task
+def manage_click_partitions_task():
+    """
+    Daily task to create upcoming Click partitions and drop expired ones.
+    """
+    if not partitions.is_partitioned():
+        return "Click table is not partitioned"
+
+    now = timezone.now()
+    created = partitions.ensure_click_partitions(now, settings.CLICK_PARTITIONS_AHEAD)
+    dropped = partitions.drop_expired_click_partitions(
+        now, settings.CLICK_RETENTION_MONTHS
+    )
+    return f"Created {len(created)} and dropped {len(dropped)} click partitions"
+
+
+@shared_task
+def flush_write_behind_task(batch_size: int = None):
+    """
+    Periodic task to apply queued write-behind operations to Postgres.
+    A Redis lock keeps a single drain running, since unacknowledged
+    operations from a crashed drain are replayed by the next one.
+    """
+    batch_size = batch_size or settings.WRITE_BEHIND_BATCH_SIZE
+    queue = WriteBehindQueue()
+    lock = queue.client.lock(
+        f"{queue.key}:drain", timeout=settings.WRITE_BEHIND_LOCK_TIMEOUT
+    )
+    if not lock.acquire(blocking=False):
+        return "Write-behind drain already running"
+    try:
+        applied = drain_write_behind_queue(queue, ORMUrlRepository(), batch_size)
+    finally:
+        lock.release()
+    return f"Applied {applied} write-behind operations"
+
+
+@shared_task
+def reconcile_url_stores_task():
+    """
+    Hourly task to detect and repair drift between the Redis and ORM repositories.
+    """
+    if settings.URL_REPOSITORY != "write_behind":
+        return "Write-behind repository is disabled"
+    redis_repo = RedisUrlRepository()
+    stats = reconcile_url_stores(redis_repo, WriteBehindQueue(client=redis_repo.client))
+    return (
+        f"Reconciled {stats['checked']} URLs: {stats['missing_in_redis']} missing "
+        f"and {stats['stale_in_redis']} stale in Redis, "
+        f"{stats['missing_in_db']} removed from Redis"
+    )
+
+
+@shared_task
+def warm_redirect_cache_task(limit: int = None, ranking: str = None, budget=None):
+    """
+    Preload the redirect cache with the top-N links after a deploy or flush.
+    """
+    result = warm_redirect_cache(limit=limit, ranking=ranking, budget=budget)
+    suffix = " (budget exhausted)" if result["exhausted"] else ""
+    return f"Warmed redirect cache with {result['cached']} links{suffix}"
+
+
+@worker_ready.connect
+def warm_redirect_cache_on_worker_start(sender, **kwargs):
+    """
+    Queue one warm-up per deploy: workers starting together share the
+    marker key, so only the first one enqueues the task.
+    """
+    if not settings.REDIRECT_WARMUP_ON_WORKER_START:
+        return
+    if cache.add(
+        "redirect-warmup:startup", 1, timeout=int(settings.REDIRECT_WARMUP_BUDGET)
+    ):
+        warm_redirect_cache_task.delay()
+
+
+@shared_task
+def fetch_url_preview_task(url_id: int, original_url: str):
+    """
+    Queues one URL for the batched preview worker. New URLs are queued
+    directly; this remains for tasks published before the worker existed.
+    """
+    PreviewQueue().add(
+        URL.objects.filter(pk=url_id).values_list("short_code", flat=True)
+    )
+    return f"Preview queued for URL ID {url_id}"
+
+
+@shared_task
+def fetch_url_previews_task(short_codes: list):
+    """
+    Fetches previews for a batch of URLs concurrently and writes them back
+    with one bulk_update.
+    """
+    return f"Previews fetched for {fetch_previews(short_codes)} URLs"
+
+
+@shared_task
+def fetch_pending_previews_task(batch_size: int = None, max_batches: int = None):
     """
-    Fetches title, description, favicon from the Preview Service
-    and saves them to the URL record.
+    Periodic task draining the preview queue, batch_size URLs at a time.
+    Each batch is fetched concurrently on one event loop, so retry backoff on
+    a slow site no longer holds a worker slot per URL. Stops after
+    max_batches; the next run picks up the rest.
     """
-    from .preview_client import PreviewServiceClient
+    batch_size = batch_size or settings.PREVIEW_BATCH_SIZE
+    max_batches = max_batches or settings.PREVIEW_MAX_BATCHES
+    queue = PreviewQueue()
+
+    fetched = 0
+    for _ in range(max_batches):
+        short_codes = queue.claim(batch_size)
+        if not short_codes:
+            break
+        fetched += _fetch_preview_batch(queue, short_codes)
+    return f"Previews fetched for {fetched} URLs"
+
 
+def _fetch_preview_batch(queue: PreviewQueue, short_codes: list) -> int:
+    """
+    A batch that fails is retried one code at a time, so a single bad URL is
+    dropped (it keeps no preview) instead of failing every run. If every code
+    fails (e.g. the database is down) the batch goes back on the queue and
+    the error is raised.
+    """
     try:
-        client = PreviewServiceClient()
-        preview = client.fetch_preview(original_url)
-        URL.objects.filter(pk=url_id).update(
-            title=preview.get("title"),
-            description=preview.get("description"),
-            favicon=preview.get("favicon"),
+        return fetch_previews(short_codes)
+    except Exception as e:
+        logger.error(f"Preview batch failed, fetching one by one: {e}")
+
+    fetched = 0
+    errors = []
+    for code in short_codes:
+        try:
+            fetched += fetch_previews([code])
+        except Exception as code_error:
+            logger.error(f"Dropping preview for {code}: {code_error}")
+            errors.append(code_error)
+    if len(errors) == len(short_codes):
+        queue.add(short_codes)
+        raise errors[-1]
+    return fetched
+
+
+def fetch_previews(short_codes: list) -> int:
+    """
+    Fetch and store previews for the given codes. Returns the number of URLs
+    updated.
+    """
+    from .preview_client import AsyncPreviewFetcher
+
+    url_objs = list(
+        URL.objects.filter(short_code__in=short_codes).only(
+            "id", "short_code", "original_url"
         )
-        return f"Preview fetched for URL ID {url_id}"
-    except Exception as exc:
-        # Retry with exponential backoff if something unexpected happens
-        raise self.retry(exc=exc, countdown=2**self.request.retries)
+    )
+    if settings.URL_REPOSITORY == "write_behind":
+        # URLs created through the write-behind queue may not be in Postgres yet
+        missing = set(short_codes) - {url_obj.short_code for url_obj in url_objs}
+        if missing:
+            PreviewQueue().add(missing & WriteBehindQueue().pending_codes())
+    if not url_objs:
+        return 0
+    previews = AsyncPreviewFetcher().fetch_many(
+        url_obj.original_url for url_obj in url_objs
+    )
+    for url_obj in url_objs:
+        preview = previews[url_obj.original_url]
+        url_obj.title = preview.get("title")
+        url_obj.description = preview.get("description")
+        url_obj.favicon = preview.get("favicon")
+
+    URL.objects.bulk_update(url_objs, ["title", "description", "favicon"])
+    return len(url_objs)
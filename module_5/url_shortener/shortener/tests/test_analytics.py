@@ -1,9 +1,22 @@
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest.mock import patch
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from rest_framework.test import APIClient
 
 from django.urls import reverse
-from shortener.models import URL, Click
+from shortener import partitions
+from shortener.geoip import GeoEnricher, GeoIPDatabase, write_database
+from shortener.models import URL, Click, DailyClickRollup, HourlyClickRollup
+from shortener.repositories import ORMUrlRepository
+from shortener.rollups import truncate_day, truncate_hour
 
 User = get_user_model()
 
@@ -74,11 +87,274 @@ class AnalyticsIntegrationTests(TestCase):
         self.assertEqual(url_obj.click_count, 0)
 
         # Add clicks
-        from shortener.tasks import track_click_task
+        from shortener.click_counter import ClickCounter
+        from shortener.tasks import flush_click_counts_task, track_click_task
 
-        track_click_task(url_obj.short_code, {"ip_address": "1.1.1.1", "country": "US"})
-        track_click_task(url_obj.short_code, {"ip_address": "2.2.2.2", "country": "GH"})
+        counter = ClickCounter()
+        counter.client.delete(counter.key, counter.flushing_key)
+        with self.captureOnCommitCallbacks(execute=True):
+            track_click_task(
+                url_obj.short_code, {"ip_address": "1.1.1.1", "country": "US"}
+            )
+            track_click_task(
+                url_obj.short_code, {"ip_address": "2.2.2.2", "country": "GH"}
+            )
 
+        # Pending in Redis until the periodic flush
+        url_obj.refresh_from_db()
+        self.assertEqual(url_obj.click_count, 0)
+        self.assertEqual(counter.pending([url_obj.id]), {url_obj.id: 2})
+
+        flush_click_counts_task()
         url_obj.refresh_from_db()
         self.assertEqual(url_obj.click_count, 2)
         self.assertEqual(url_obj.clicks.count(), 2)
+
+
+class ClickRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="rollupuser",
+            email="rollup@example.com",
+            password="password123",
+            tier="Premium",
+            is_premium=True,
+        )
+        self.url_obj = URL.objects.create(
+            short_code="rollup", original_url="http://rollup.com", owner=self.user
+        )
+        self.now = timezone.now().replace(minute=30, second=0, microsecond=0)
+
+    def _event(self, clicked_at, country):
+        return {
+            "short_code": self.url_obj.short_code,
+            "clicked_at": clicked_at.isoformat(),
+            "data": {"country": country},
+        }
+
+    def test_ingestion_maintains_rollups(self):
+        """Test buffered clicks are added to hourly and daily rollups incrementally."""
+        repo = ORMUrlRepository()
+        earlier = self.now - timedelta(hours=1)
+        repo.log_clicks(
+            [
+                self._event(self.now, "US"),
+                self._event(self.now, "US"),
+                self._event(earlier, "GH"),
+            ]
+        )
+        # A second batch increments the existing buckets instead of replacing them
+        repo.log_clicks([self._event(self.now, "US"), self._event(self.now, None)])
+
+        hourly = HourlyClickRollup.objects.get(
+            url=self.url_obj, bucket=truncate_hour(self.now), country="US"
+        )
+        self.assertEqual(hourly.count, 3)
+        self.assertEqual(HourlyClickRollup.objects.filter(url=self.url_obj).count(), 3)
+        daily_total = sum(
+            DailyClickRollup.objects.filter(url=self.url_obj).values_list(
+                "count", flat=True
+            )
+        )
+        self.assertEqual(daily_total, 5)
+
+    def test_analytics_view_reads_rollups(self):
+        """Test premium analytics are served from the rollup tables."""
+        bucket = truncate_day(self.now)
+        DailyClickRollup.objects.create(
+            url=self.url_obj, bucket=bucket, country="US", count=7
+        )
+        DailyClickRollup.objects.create(
+            url=self.url_obj, bucket=bucket, country="", count=2
+        )
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get(
+            reverse("v1:url_analytics", kwargs={"short_code": "rollup"})
+        )
+
+        self.assertEqual(
+            response.data["geo_breakdown"],
+            [
+                {"country": "US", "total_clicks": 7},
+                {"country": None, "total_clicks": 2},
+            ],
+        )
+        self.assertEqual(
+            response.data["time_series"], [{"date": bucket, "total_clicks": 9}]
+        )
+
+    def test_backfill_command_is_idempotent(self):
+        """Test the backfill command rebuilds rollups from raw clicks."""
+        yesterday = self.now - timedelta(days=1)
+        Click.objects.create(url=self.url_obj, country="US", clicked_at=yesterday)
+        Click.objects.create(url=self.url_obj, country="US", clicked_at=yesterday)
+        Click.objects.create(url=self.url_obj, country=None, clicked_at=yesterday)
+
+        for _ in range(2):
+            call_command("backfill_click_rollups", stdout=StringIO())
+
+        rollups = DailyClickRollup.objects.filter(url=self.url_obj)
+        self.assertEqual(
+            rollups.clicks_per_country(),
+            [
+                {"country": "US", "total_clicks": 2},
+                {"country": None, "total_clicks": 1},
+            ],
+        )
+        self.assertEqual(rollups.get(country="US").bucket, truncate_day(yesterday))
+
+
+class ClickPartitionTests(TestCase):
+    def setUp(self):
+        if not partitions.is_partitioned():
+            self.skipTest("Click partitioning requires PostgreSQL")
+        self.user = User.objects.create_user(username="partitions", password="pw")
+        self.url = URL.objects.create(
+            original_url="https://example.com", short_code="part1", owner=self.user
+        )
+        self.now = datetime(2031, 6, 15, tzinfo=dt_timezone.utc)
+
+    def _partition_of(self, click):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tableoid::regclass::text FROM shortener_click WHERE id = %s",
+                [click.id],
+            )
+            return cursor.fetchone()[0]
+
+    def test_ensure_partitions_moves_rows_out_of_default(self):
+        click = Click.objects.create(
+            url=self.url, clicked_at=datetime(2031, 7, 2, tzinfo=dt_timezone.utc)
+        )
+        self.assertEqual(self._partition_of(click), "shortener_click_default")
+
+        created = partitions.ensure_click_partitions(self.now, months_ahead=1)
+
+        self.assertEqual(
+            created, ["shortener_click_p203106", "shortener_click_p203107"]
+        )
+        self.assertEqual(self._partition_of(click), "shortener_click_p203107")
+        self.assertEqual(partitions.ensure_click_partitions(self.now, 1), [])
+
+    def test_retention_drops_old_partitions_and_keeps_rollups(self):
+        old_time = datetime(2030, 1, 10, tzinfo=dt_timezone.utc)
+        partitions.create_click_partition(partitions.month_start(old_time))
+        ORMUrlRepository().log_clicks(
+            [
+                {
+                    "short_code": "part1",
+                    "clicked_at": old_time.isoformat(),
+                    "data": {"country": "US"},
+                }
+            ]
+        )
+
+        dropped = partitions.drop_expired_click_partitions(self.now, 12)
+
+        self.assertIn("shortener_click_p203001", dropped)
+        self.assertNotIn("shortener_click_p203001", partitions.list_click_partitions())
+        self.assertFalse(Click.objects.filter(url=self.url).exists())
+        self.assertEqual(DailyClickRollup.objects.get(url=self.url).count, 1)
+
+    def test_time_range_query_prunes_partitions(self):
+        partitions.ensure_click_partitions(self.now, months_ahead=1)
+        queryset = Click.objects.filter(
+            url=self.url,
+            clicked_at__gte=datetime(2031, 7, 1, tzinfo=dt_timezone.utc),
+        )
+
+        plan = queryset.explain()
+
+        self.assertIn("shortener_click_p203107", plan)
+        self.assertNotIn("shortener_click_p203106", plan)
+
+    def test_backfill_keeps_rollups_before_retention_cutoff(self):
+        old_bucket = partitions.month_start(
+            timezone.now(), -(settings.CLICK_RETENTION_MONTHS + 2)
+        )
+        DailyClickRollup.objects.create(
+            url=self.url, bucket=old_bucket, country="US", count=5
+        )
+
+        call_command("backfill_click_rollups", stdout=StringIO())
+        self.assertEqual(DailyClickRollup.objects.get(url=self.url).count, 5)
+
+        with self.assertRaisesMessage(CommandError, "no longer kept"):
+            call_command(
+                "backfill_click_rollups",
+                f"--since={old_bucket:%Y-%m-%d}",
+                stdout=StringIO(),
+            )
+        self.assertEqual(DailyClickRollup.objects.get(url=self.url).count, 5)
+
+    def test_manage_click_partitions_command(self):
+        out = StringIO()
+        call_command("manage_click_partitions", "--no-drop", stdout=out)
+        self.assertIn("monthly partitions", out.getvalue())
+
+
+class GeoIPTests(TestCase):
+    RANGES = [
+        ("41.66.0.0", "41.66.255.255", "GH", "Accra"),
+        ("8.8.8.0", "8.8.8.255", "US", "Mountain View"),
+        ("81.2.69.0", "81.2.69.255", "gb", None),
+        ("2001:db8::", "2001:db8::ffff", "XX", "Skipped"),
+    ]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "geoip.bin")
+
+    def test_range_lookup(self):
+        self.assertEqual(write_database(self.path, self.RANGES), 3)
+        database = GeoIPDatabase(self.path)
+
+        self.assertEqual(database.lookup("8.8.8.8"), ("US", "Mountain View"))
+        self.assertEqual(database.lookup("41.66.0.0"), ("GH", "Accra"))
+        self.assertEqual(database.lookup("41.66.255.255"), ("GH", "Accra"))
+        self.assertEqual(database.lookup("81.2.69.160"), ("GB", None))
+        self.assertEqual(database.lookup("::ffff:8.8.8.8"), ("US", "Mountain View"))
+        for ip in ("8.8.9.0", "1.1.1.1", "255.255.255.255", "2001:db8::1", "bad"):
+            self.assertEqual(database.lookup(ip), (None, None))
+
+    def test_enricher_caches_and_reloads(self):
+        write_database(self.path, self.RANGES)
+        enricher = GeoEnricher(self.path)
+        clicks = [{"ip_address": "8.8.8.8"}, {"ip_address": "8.8.8.8"}, {}]
+
+        self.assertEqual(enricher.enrich(clicks), 2)
+        self.assertEqual(clicks[0]["country"], "US")
+        self.assertEqual(clicks[1]["city"], "Mountain View")
+        self.assertNotIn("country", clicks[2])
+
+        # Addresses already seen are served from the LRU
+        with patch.object(GeoIPDatabase, "lookup") as mock_lookup:
+            enricher.enrich([{"ip_address": "8.8.8.8"}])
+            self.assertFalse(mock_lookup.called)
+
+        # A replaced file is picked up and the LRU dropped
+        write_database(self.path, [("8.8.8.0", "8.8.8.255", "CA", "Toronto")])
+        click = {"ip_address": "8.8.8.8"}
+        enricher.enrich([click])
+        self.assertEqual(click["country"], "CA")
+
+    def test_enricher_without_database(self):
+        click = {"ip_address": "8.8.8.8"}
+        self.assertEqual(GeoEnricher(self.path).enrich([click]), 0)
+        self.assertNotIn("country", click)
+
+    def test_build_geoip_database_command(self):
+        csv_path = os.path.join(os.path.dirname(self.path), "ranges.csv")
+        with open(csv_path, "w") as f:
+            f.write("start_ip,end_ip,country,city\n")
+            f.write("41.66.0.0,41.66.255.255,GH,Accra\n")
+            f.write("8.8.8.0,8.8.8.255,US\n")
+
+        out = StringIO()
+        call_command("build_geoip_database", csv_path, output=self.path, stdout=out)
+
+        self.assertIn("2 ranges", out.getvalue())
+        self.assertEqual(GeoIPDatabase(self.path).lookup("8.8.8.1"), ("US", None))
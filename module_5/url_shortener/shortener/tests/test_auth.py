@@ -4,7 +4,7 @@ from rest_framework.test import APITestCase
 from rest_framework import status
 from django.core.cache import cache
 from shortener.models import URL
-
+from shortener.repositories import ORMUrlRepository
 
 User = get_user_model()
 
@@ -149,11 +149,12 @@ class RBACTests(APITestCase):
         """Test free users are limited to 10 active URLs."""
         self.client.force_authenticate(user=self.free_user)
 
-        # Create 10 URLs
+        # Create 10 URLs through the repository, which maintains the counter
+        repo = ORMUrlRepository()
         for i in range(10):
-            URL.objects.create(
-                short_code=f"c{i}", original_url="http://x.com", owner=self.free_user
-            )
+            repo.save_mapping(f"c{i}", "http://x.com", user=self.free_user)
+        self.free_user.refresh_from_db()
+        self.assertEqual(self.free_user.active_url_count, 10)
 
         # 11th attempt should fail
         response = self.client.post(self.shorten_url, {"url": "http://google.com"})
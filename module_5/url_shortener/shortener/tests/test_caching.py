@@ -1,19 +1,60 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+from io import StringIO
 from django.test import TestCase
 from django.urls import reverse
 from django.core.cache import cache
-from unittest.mock import patch
+from django.core.management import call_command
+from django.utils import timezone
+from unittest.mock import Mock, patch
 from rest_framework import status
-from rest_framework.test import APIClient
-from shortener.models import URL
+from rest_framework.test import APIClient, APIRequestFactory
+from celery.signals import after_task_publish, before_task_publish
+from api.views import AsyncRedirectView, RedirectView
+from core import metrics
+from core.handlers import FastPathASGIHandler
+from prometheus_client import REGISTRY
+from shortener.cache_warmup import warm_redirect_cache
+from shortener.click_buffer import ClickBuffer
+from shortener.connections import get_redis_client
+from shortener.models import URL, HourlyClickRollup
+from shortener.redirect_cache import (
+    MISSING,
+    LocalLRUCache,
+    RedirectCache,
+    RedirectRecord,
+    redirect_cache,
+)
+from shortener.rollups import truncate_hour
+from shortener.tasks import warm_redirect_cache_on_worker_start
+from shortener.repositories import ORMUrlRepository, RedisUrlRepository
+from shortener.services import UrlShortenerService
+from shortener.write_behind import WriteBehindQueue
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.signals import got_request_exception
+from django_redis import get_redis_connection
 
 User = get_user_model()
 
 
+def make_record(original_url, expires_at=None, is_active=True):
+    return RedirectRecord(original_url, expires_at, is_active, "Free")
+
+
 class CachingTests(TestCase):
     def setUp(self):
         self.client = APIClient()
         cache.clear()
+        redirect_cache.clear_local()
         self.user = User.objects.create_user(
             username="testuser", password="password", tier="Premium", is_premium=True
         )
@@ -32,17 +73,34 @@ class CachingTests(TestCase):
         response = self.client.get(redirect_url)
         self.assertEqual(response.status_code, status.HTTP_302_FOUND)
         self.assertEqual(
-            cache.get(f"url:{self.url_obj.short_code}"), self.url_obj.original_url
+            cache.get(f"url:{self.url_obj.short_code}"),
+            ("https://example.com", None, True, "Premium"),
         )
 
         # Second request: Cache Hit
-        # We can patch RedirectView.get_service to ensure it's not called if hit cache (actually views.py checks cache FIRST)
-        with patch("api.views.RedirectView.get_service") as mock_service:
+        # We can patch AsyncRedirectView.get_service to ensure it's not called if hit cache (actually views.py checks cache FIRST)
+        with patch("api.views.AsyncRedirectView.get_service") as mock_service:
             response = self.client.get(redirect_url)
             self.assertEqual(response.status_code, status.HTTP_302_FOUND)
             # Service should NOT be called because it returns from cache early
             self.assertFalse(mock_service.called)
 
+    def test_sync_redirect_view(self):
+        """RedirectView is still routed when REDIRECT_ASYNC_VIEW is off."""
+        view = RedirectView.as_view()
+        request = APIRequestFactory().get("/cached/")
+
+        response = view(request, short_code="cached")
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(response.url, "https://example.com")
+        self.assertEqual(cache.get("url:cached")[0], "https://example.com")
+        self.assertEqual(len(ClickBuffer()), 1)
+
+        with patch("api.views.RedirectView.get_service") as mock_service:
+            response = view(APIRequestFactory().get("/cached/"), short_code="cached")
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertFalse(mock_service.called)
+
     def test_cache_invalidation_on_update(self):
         """Test that updating a URL clears its cache entry."""
         # Prime the cache
@@ -64,6 +122,392 @@ class CachingTests(TestCase):
         self.assertIsNone(cache.get(f"url:{self.url_obj.short_code}"))
 
 
+class RedirectRecordTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        redirect_cache.clear_local()
+        self.user = User.objects.create_user(username="recorduser", password="pw")
+        self.url_obj = URL.objects.create(
+            short_code="rec1",
+            original_url="https://example.com",
+            owner=self.user,
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.redirect_url = reverse("redirect_url", kwargs={"short_code": "rec1"})
+
+    def test_cache_ttl_tracks_expires_at(self):
+        """Test a live link's entry expires with the link, not after the full TTL."""
+        self.client.get(self.redirect_url)
+
+        ttl = cache.ttl("url:rec1")
+        self.assertGreater(ttl, 3500)
+        self.assertLessEqual(ttl, 3600)
+
+    def test_expired_hit_returns_gone_without_database(self):
+        expired = make_record("https://example.com", expires_at=time.time() - 1)
+        redirect_cache.set("rec1", expired, timeout=3600)
+        redirect_cache.clear_local()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.redirect_url)
+
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(response.json(), {"error": "URL has expired"})
+        self.assertEqual(len(ClickBuffer()), 0)
+
+    def test_deactivation_invalidates_and_is_enforced(self):
+        self.client.get(self.redirect_url)
+
+        self.url_obj.is_active = False
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.url_obj.save()
+            # Evicted only once the change commits
+            self.assertIsNotNone(cache.get("url:rec1"))
+        self.assertEqual(len(callbacks), 1)
+
+        response = self.client.get(self.redirect_url)
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        # The inactive record is cached, so later hits skip the database
+        with self.assertNumQueries(0):
+            response = self.client.get(self.redirect_url)
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_legacy_bare_url_entry_is_refilled(self):
+        cache.set("url:rec1", "https://stale.example.com")
+
+        response = self.client.get(self.redirect_url)
+
+        self.assertEqual(response.url, "https://example.com")
+        self.assertEqual(cache.get("url:rec1")[0], "https://example.com")
+
+
+class LocalCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_lru_eviction_and_counters(self):
+        """Test the L1 cache is size-bounded and tracks hits and misses."""
+        local = LocalLRUCache(max_size=2, ttl=60)
+        local.set("a", "https://a.com")
+        local.set("b", "https://b.com")
+        local.get("a")  # "a" becomes most recently used
+        local.set("c", "https://c.com")  # evicts "b"
+
+        self.assertIsNone(local.get("b"))
+        self.assertEqual(local.get("a"), "https://a.com")
+        self.assertEqual(local.stats()["size"], 2)
+        self.assertEqual(local.hits, 2)
+        self.assertEqual(local.misses, 1)
+
+    def test_ttl_expiry(self):
+        """Test L1 entries expire after their TTL."""
+        local = LocalLRUCache(max_size=10, ttl=0.01)
+        local.set("a", "https://a.com")
+        time.sleep(0.02)
+        self.assertIsNone(local.get("a"))
+
+    def test_l1_hit_skips_redis(self):
+        """Test a warm L1 entry is served without a Redis round trip."""
+        tier = RedirectCache(LocalLRUCache(max_size=10, ttl=60))
+        tier.set("hot", make_record("https://hot.com"), timeout=60)
+
+        with patch("shortener.redirect_cache.cache.get") as mock_get:
+            self.assertEqual(tier.get("hot").original_url, "https://hot.com")
+            self.assertFalse(mock_get.called)
+
+    def test_invalidation_broadcast_to_other_workers(self):
+        """Test pub/sub invalidation drops L1 entries held by other workers."""
+        worker = RedirectCache(LocalLRUCache(max_size=10, ttl=60))
+        other_worker = RedirectCache(LocalLRUCache(max_size=10, ttl=60))
+        worker.get("warmup")  # starts the listener thread
+        time.sleep(0.2)  # allow the subscription to be established
+
+        worker.set("shared", make_record("https://old.com"), timeout=60)
+        other_worker.invalidate("shared")
+
+        deadline = time.monotonic() + 2
+        while worker.local.get("shared") and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNone(worker.local.get("shared"))
+
+
+class SingleFlightFillTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Fills go through the service to a slow repository, as in the views
+        self.repo = Mock(spec=ORMUrlRepository)
+        self.repo.get_redirect_record.side_effect = self.slow_lookup
+        self.service = UrlShortenerService(self.repo)
+
+    def slow_lookup(self, short_code):
+        time.sleep(0.2)
+        return make_record("https://hot.example.com")
+
+    def fill_for(self, short_code):
+        return lambda: self.service.get_redirect_record(short_code)
+
+    def test_concurrent_misses_fill_once(self):
+        """Test a burst of misses on one key runs a single fill across workers."""
+        results = []
+
+        def request():
+            # A fresh tier per thread, like separate workers with their own L1
+            tier = RedirectCache(LocalLRUCache(max_size=10, ttl=60))
+            results.append(
+                tier.get_or_fill("stampede", self.fill_for("stampede"), timeout=60)
+            )
+
+        threads = [threading.Thread(target=request) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.repo.get_redirect_record.assert_called_once_with("stampede")
+        self.assertEqual(results, [make_record("https://hot.example.com")] * 10)
+
+    async def test_concurrent_async_misses_fill_once(self):
+        async def fill():
+            return await sync_to_async(self.service.get_redirect_record)("astampede")
+
+        tiers = [RedirectCache(LocalLRUCache(max_size=10, ttl=60)) for _ in range(10)]
+        results = await asyncio.gather(
+            *(tier.aget_or_fill("astampede", fill, timeout=60) for tier in tiers)
+        )
+
+        self.repo.get_redirect_record.assert_called_once_with("astampede")
+        self.assertEqual(set(results), {make_record("https://hot.example.com")})
+
+    def test_unknown_code_cached_as_missing(self):
+        tier = RedirectCache(LocalLRUCache(max_size=10, ttl=60))
+
+        self.assertEqual(tier.get_or_fill("nope", lambda: None, timeout=60), MISSING)
+        self.assertEqual(cache.get("url:nope"), MISSING)
+
+    def test_entry_near_expiry_refreshed_early(self):
+        """Test XFetch refreshes an entry whose TTL is small next to the fill time."""
+        tier = RedirectCache(LocalLRUCache(max_size=10, ttl=60))
+        tier.set("warm", make_record("https://old.example.com"), timeout=1)
+        tier.clear_local()
+        tier._fill_time = 100.0
+
+        # Pin the XFetch draw; an unlucky one could otherwise skip the refresh
+        with patch("shortener.redirect_cache.random.random", return_value=0.5):
+            record = tier.get_or_fill("warm", self.fill_for("warm"), timeout=60)
+
+        self.repo.get_redirect_record.assert_called_once_with("warm")
+        self.assertEqual(record.original_url, "https://hot.example.com")
+
+    def test_fresh_entry_not_refreshed(self):
+        tier = RedirectCache(LocalLRUCache(max_size=10, ttl=60))
+        tier.set("warm", make_record("https://old.example.com"), timeout=3600)
+        tier.clear_local()
+
+        record = tier.get_or_fill("warm", self.fill_for("warm"), timeout=60)
+
+        self.repo.get_redirect_record.assert_not_called()
+        self.assertEqual(record.original_url, "https://old.example.com")
+
+
+class CacheWarmupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="warmuser", password="pw")
+
+    def make_url(self, short_code, click_count=0, **kwargs):
+        return URL.objects.create(
+            short_code=short_code,
+            original_url=f"https://example.com/{short_code}",
+            owner=self.user,
+            click_count=click_count,
+            **kwargs,
+        )
+
+    def test_top_links_by_click_count(self):
+        self.make_url("top", click_count=50)
+        self.make_url("second", click_count=10)
+        self.make_url("third", click_count=5)
+        self.make_url("off", click_count=500, is_active=False)
+        self.make_url("old", click_count=500, expires_at=timezone.now())
+
+        result = warm_redirect_cache(limit=2, ranking="clicks", batch_size=1)
+
+        self.assertEqual(result, {"considered": 2, "cached": 2, "exhausted": False})
+        self.assertEqual(cache.get("url:top")[0], "https://example.com/top")
+        self.assertIsNotNone(cache.get("url:second"))
+        for short_code in ("third", "off", "old"):
+            self.assertIsNone(cache.get(f"url:{short_code}"))
+
+    def test_top_links_by_recent_clicks(self):
+        busy = self.make_url("busy", click_count=1)
+        self.make_url("legacy", click_count=1000)
+        HourlyClickRollup.objects.create(
+            url=busy, bucket=truncate_hour(timezone.now()), count=30
+        )
+
+        warm_redirect_cache(limit=1, ranking="recent")
+
+        self.assertIsNotNone(cache.get("url:busy"))
+        self.assertIsNone(cache.get("url:legacy"))
+
+    def test_existing_entries_not_overwritten(self):
+        self.make_url("top", click_count=50)
+        redirect_cache.set("top", make_record("https://fresh.example.com"), 60)
+
+        result = warm_redirect_cache(limit=10, ranking="clicks")
+
+        self.assertEqual(result["cached"], 0)
+        self.assertEqual(cache.get("url:top")[0], "https://fresh.example.com")
+
+    def test_stops_when_budget_spent(self):
+        self.make_url("top", click_count=50)
+
+        result = warm_redirect_cache(limit=10, ranking="clicks", budget=1e-9)
+
+        self.assertTrue(result["exhausted"])
+        self.assertIsNone(cache.get("url:top"))
+
+    def test_command(self):
+        self.make_url("top", click_count=50)
+        out = StringIO()
+
+        call_command("warm_redirect_cache", "--limit", "5", stdout=out)
+
+        self.assertIn("Cached 1 of 1 links", out.getvalue())
+        self.assertIsNotNone(cache.get("url:top"))
+
+    @patch("shortener.tasks.warm_redirect_cache_task.delay")
+    def test_worker_startup_queues_one_warmup(self, mock_delay):
+        warm_redirect_cache_on_worker_start(sender=None)
+        warm_redirect_cache_on_worker_start(sender=None)
+
+        mock_delay.assert_called_once_with()
+
+
+class AsyncRedirectTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        redirect_cache.clear_local()
+        self.user = User.objects.create_user(username="asyncuser", password="pw")
+        self.url_obj = URL.objects.create(
+            short_code="async1", original_url="https://example.com", owner=self.user
+        )
+        self.redirect_url = reverse("redirect_url", kwargs={"short_code": "async1"})
+
+    def test_miss_fills_cache_shared_with_sync_path(self):
+        response = self.client.get(self.redirect_url)
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(response.url, "https://example.com")
+        # Written with the asyncio client, readable through the Django cache
+        self.assertEqual(cache.get("url:async1")[0], "https://example.com")
+        self.assertEqual(len(ClickBuffer()), 1)
+
+    def test_hit_skips_database(self):
+        redirect_cache.set(
+            "async1", make_record("https://cached.example.com"), timeout=60
+        )
+        redirect_cache.clear_local()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.redirect_url)
+
+        self.assertEqual(response.url, "https://cached.example.com")
+        buffer = ClickBuffer()
+        event = json.loads(buffer.client.lindex(buffer.key, 0))
+        self.assertEqual(event["short_code"], "async1")
+
+    async def asgi_get(self, path, host=b"localhost"):
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": b"",
+            "headers": [(b"host", host)],
+            "client": ("127.0.0.1", 5000),
+        }
+        with patch("core.handlers.ASGIHandler.__call__") as django_call:
+            await FastPathASGIHandler()(scope, receive, send)
+
+        self.assertFalse(django_call.called)
+        return sent[0]
+
+    async def test_asgi_fast_path_serves_cached_redirect(self):
+        await redirect_cache.aset(
+            "async1", make_record("https://cached.example.com"), timeout=60
+        )
+
+        start = await self.asgi_get("/async1/")
+
+        self.assertEqual(start["status"], status.HTTP_302_FOUND)
+        self.assertIn((b"Location", b"https://cached.example.com"), start["headers"])
+
+    def test_asgi_fast_path_misses_do_not_share_a_thread(self):
+        threads = []
+
+        def resolve(view, short_code, recycle_connections=False):
+            threads.append(threading.get_ident())
+            time.sleep(0.05)
+            return MISSING
+
+        async def main():
+            return await asyncio.gather(
+                self.asgi_get("/missing1/"), self.asgi_get("/missing2/")
+            )
+
+        # A plain event loop, as under a server: an async test method would
+        # run thread-sensitive code in the test runner's own thread
+        with patch.object(AsyncRedirectView, "resolve", resolve):
+            responses = asyncio.run(main())
+
+        self.assertEqual(
+            [start["status"] for start in responses], [status.HTTP_404_NOT_FOUND] * 2
+        )
+        # Each request has its own ThreadSensitiveContext
+        self.assertEqual(len(set(threads)), 2)
+
+    async def test_asgi_fast_path_rejects_disallowed_host(self):
+        start = await self.asgi_get("/async1/", host=b"evil.example.com")
+
+        self.assertEqual(start["status"], status.HTTP_400_BAD_REQUEST)
+
+    async def test_asgi_fast_path_view_error_returns_500(self):
+        received = []
+
+        def receiver(sender, request, **kwargs):
+            received.append(request.path)
+
+        got_request_exception.connect(receiver)
+        try:
+            with patch.object(
+                AsyncRedirectView, "get", side_effect=RuntimeError("boom")
+            ), self.assertLogs("django.request", "ERROR"):
+                start = await self.asgi_get("/async1/")
+        finally:
+            got_request_exception.disconnect(receiver)
+
+        self.assertEqual(start["status"], status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(received, ["/async1/"])
+
+    def test_inactive_url_returns_gone(self):
+        self.url_obj.is_active = False
+        self.url_obj.save()
+
+        response = self.client.get(self.redirect_url)
+
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(response.json(), {"error": "URL is inactive"})
+
+
 class HealthEndpointTests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -92,3 +536,174 @@ class HealthEndpointTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
         self.assertEqual(response.data["status"], "error")
         self.assertIn("redis", response.data["components"])
+
+
+class SharedConnectionPoolTests(TestCase):
+    def test_clients_share_one_pool_per_database(self):
+        pool = get_redis_client().connection_pool
+        self.assertIs(RedisUrlRepository().client.connection_pool, pool)
+        self.assertIs(WriteBehindQueue().client.connection_pool, pool)
+        self.assertEqual(pool.max_connections, settings.REDIS_MAX_CONNECTIONS)
+
+    def test_django_redis_uses_shared_pool(self):
+        cache_url = settings.CACHES["default"]["LOCATION"]
+        self.assertIs(
+            get_redis_connection("default").connection_pool,
+            get_redis_client(cache_url, decode_responses=False).connection_pool,
+        )
+
+    def test_repository_reuses_connections(self):
+        pool = get_redis_client().connection_pool
+        RedisUrlRepository(key_prefix="test:pool:").exists("missing")
+        opened = len(pool._connections)
+        for _ in range(20):
+            RedisUrlRepository(key_prefix="test:pool:").exists("missing")
+        # Connections go back to the pool instead of being opened per instance
+        self.assertEqual(len(pool._connections), opened)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        redirect_cache.clear_local()
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_are_timed_per_view(self):
+        labels = {"view": "v1:health_check", "method": "GET", "status": "200"}
+        before = self.sample("http_request_duration_seconds_count", **labels)
+        queries_before = self.sample(
+            "http_request_db_queries_sum", view="v1:health_check"
+        )
+
+        self.client.get(reverse("v1:health_check"))
+
+        self.assertEqual(
+            self.sample("http_request_duration_seconds_count", **labels), before + 1
+        )
+        self.assertGreater(
+            self.sample("http_request_db_queries_sum", view="v1:health_check"),
+            queries_before,
+        )
+
+    def test_redirect_cache_hits_and_misses_are_counted(self):
+        record = make_record("https://example.com/metrics")
+        redirect_cache.set("metrics1", record, timeout=60)
+        redirect_cache.clear_local()
+        counts = {
+            (tier, result): self.sample(
+                "redirect_cache_lookups_total", tier=tier, result=result
+            )
+            for tier in ("l1", "redis")
+            for result in ("hit", "miss")
+        }
+
+        redirect_cache.get("metrics1")  # L1 miss, Redis hit
+        redirect_cache.get("metrics1")  # L1 hit
+
+        def delta(tier, result):
+            return (
+                self.sample("redirect_cache_lookups_total", tier=tier, result=result)
+                - counts[tier, result]
+            )
+
+        self.assertEqual(delta("l1", "miss"), 1)
+        self.assertEqual(delta("redis", "hit"), 1)
+        self.assertEqual(delta("l1", "hit"), 1)
+        self.assertEqual(delta("redis", "miss"), 0)
+
+    def test_celery_enqueue_latency_is_recorded(self):
+        task = "shortener.tasks.example_task"
+        before = self.sample("celery_task_enqueue_duration_seconds_count", task=task)
+
+        headers = {"id": "metrics-task-id", "task": task}
+        before_task_publish.send(sender=task, headers=headers)
+        after_task_publish.send(sender=task, headers=headers)
+
+        self.assertEqual(
+            self.sample("celery_task_enqueue_duration_seconds_count", task=task),
+            before + 1,
+        )
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("v1:health_check"))
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn("http_request_duration_seconds_bucket", body)
+        self.assertIn("redirect_cache_lookups_total", body)
+
+    def test_metrics_endpoint_access(self):
+        response = self.client.get("/metrics", REMOTE_ADDR="203.0.113.9")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        # Published container ports see outside clients as the bridge gateway
+        response = self.client.get("/metrics", REMOTE_ADDR="172.17.0.1")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        with self.settings(METRICS_ALLOWED_NETWORKS=["127.0.0.0/8", "10.20.0.0/16"]):
+            response = self.client.get("/metrics", REMOTE_ADDR="10.20.3.4")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.settings(METRICS_AUTH_TOKEN="scrape-token"):
+            response = self.client.get("/metrics")
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            response = self.client.get(
+                "/metrics",
+                REMOTE_ADDR="203.0.113.9",
+                HTTP_AUTHORIZATION="Bearer scrape-token",
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_failed_publish_timers_are_dropped(self):
+        stale = time.perf_counter() - metrics.PUBLISH_TIMER_EXPIRY - 1
+        for n in range(metrics.PUBLISH_TIMER_PRUNE_SIZE):
+            metrics._publish_started[f"failed-publish-{n}"] = stale
+
+        before_task_publish.send(sender="task", headers={"id": "next-publish"})
+
+        self.assertEqual(list(metrics._publish_started), ["next-publish"])
+        metrics._publish_started.clear()
+
+    def test_import_without_multiprocess_dir(self):
+        # manage.py commands import core.metrics before gunicorn creates it
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ,
+                "PROMETHEUS_MULTIPROC_DIR": os.path.join(tmp, "missing"),
+            }
+            subprocess.run(
+                [sys.executable, "-c", "import django; django.setup()"],
+                cwd=settings.BASE_DIR,
+                env={**env, "DJANGO_SETTINGS_MODULE": "config.settings"},
+                capture_output=True,
+                check=True,
+            )
+
+    def test_multiprocess_mode_merges_workers(self):
+        project_dir = settings.BASE_DIR
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": metrics_dir}
+
+            def run(code):
+                return subprocess.run(
+                    [sys.executable, "-c", code],
+                    cwd=project_dir,
+                    env=env,
+                    capture_output=True,
+                    check=True,
+                    text=True,
+                ).stdout
+
+            # Two "workers" record a lookup each; a third renders the scrape
+            for _ in range(2):
+                run("from core.metrics import record_cache_lookup as r; r('l1', True)")
+            output = run(
+                "from core.metrics import render_latest; print(render_latest().decode())"
+            )
+
+        self.assertIn(
+            'redirect_cache_lookups_total{result="hit",tier="l1"} 2.0', output
+        )
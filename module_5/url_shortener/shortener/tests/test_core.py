@@ -1,11 +1,32 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.conf import settings
+from django.db import OperationalError
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
 from unittest.mock import patch
 from django.contrib.auth import get_user_model
 from shortener.services import UrlShortenerService
-from shortener.repositories import ORMUrlRepository
+from shortener.repositories import (
+    ORMUrlRepository,
+    RedisUrlRepository,
+    WriteBehindUrlRepository,
+)
+from shortener.write_behind import (
+    WriteBehindQueue,
+    drain_write_behind_queue,
+    reconcile_url_stores,
+)
+from shortener.click_counter import ClickCounter
+from shortener.code_filter import ShortCodeFilter
+from shortener.code_pool import ShortCodePool
+from shortener.redirect_cache import MISSING, RedirectRecord, redirect_cache
+from shortener.models import URL
+from shortener.click_buffer import ClickBuffer
+from shortener.tasks import flush_click_buffer_task, flush_click_counts_task
 
 User = get_user_model()
 
@@ -45,6 +66,435 @@ class CoreServiceTests(TestCase):
         self.assertTrue(code.isalnum())
 
 
+class RedisUrlRepositoryTests(TestCase):
+    def setUp(self):
+        self.repo = RedisUrlRepository(key_prefix="test:shorturl:")
+        self.user = User.objects.create_user(
+            username="redisrepo", password="password", tier="Premium"
+        )
+
+    def tearDown(self):
+        keys = list(self.repo.client.scan_iter("test:shorturl:*"))
+        if keys:
+            self.repo.client.delete(*keys)
+
+    def test_mapping_stored_as_hash_with_expiry_ttl(self):
+        expires_at = timezone.now() + timedelta(hours=1)
+        self.repo.save_mapping(
+            "hash1", "https://example.com", user=self.user, expires_at=expires_at
+        )
+
+        stored = self.repo.client.hgetall("test:shorturl:hash1")
+        self.assertEqual(stored["url"], "https://example.com")
+        self.assertEqual(stored["owner"], str(self.user.pk))
+        self.assertEqual(stored["is_active"], "1")
+        ttl = self.repo.client.ttl("test:shorturl:hash1")
+        retention = settings.REDIS_URL_EXPIRED_RETENTION
+        self.assertGreater(ttl, retention + 3500)
+        self.assertLessEqual(ttl, retention + 3600)
+
+    def test_redirect_path_runs_on_redis(self):
+        service = UrlShortenerService(self.repo)
+        self.repo.save_mapping("live", "https://live.com", user=self.user)
+        self.repo.save_mapping(
+            "old", "https://old.com", expires_at=timezone.now() - timedelta(hours=1)
+        )
+        self.repo.save_mapping("off", "https://off.com")
+        self.repo.set_active("off", False)
+
+        with self.assertNumQueries(0):
+            url = service.get_original_url("live", click_data={"ip_address": "::1"})
+            with self.assertRaisesMessage(ValueError, "URL has expired"):
+                service.get_original_url("old")
+            with self.assertRaisesMessage(ValueError, "URL is inactive"):
+                service.get_original_url("off")
+            self.assertIsNone(service.get_original_url("nope"))
+
+        self.assertEqual(url, "https://live.com")
+        self.assertEqual(self.repo.get_click_count("live"), 1)
+        self.assertEqual(service.get_redirect_record("live").owner_tier, "Premium")
+
+    def test_batch_apis(self):
+        self.repo.save_many(
+            [
+                {"short_code": "b1", "original_url": "https://b1.com"},
+                {"short_code": "b2", "original_url": "https://b2.com"},
+            ],
+            user=self.user,
+        )
+
+        records = self.repo.get_many(["b1", "b2", "nope"])
+        self.assertEqual(set(records), {"b1", "b2"})
+        self.assertEqual(records["b2"].original_url, "https://b2.com")
+        self.assertEqual(self.repo.existing_codes(["b1", "nope"]), {"b1"})
+
+        counted = self.repo.log_clicks(
+            [{"short_code": "b1"}, {"short_code": "b1"}, {"short_code": "gone"}]
+        )
+        self.assertEqual(counted, 2)
+        self.assertEqual(self.repo.get_click_count("b1"), 2)
+        # Clicks on unknown codes do not create hashes
+        self.assertFalse(self.repo.exists("gone"))
+        self.assertFalse(self.repo.set_active("gone", False))
+
+
+class WriteBehindRepositoryTests(TestCase):
+    def setUp(self):
+        redis_repo = RedisUrlRepository(key_prefix="test:shorturl:")
+        self.queue = WriteBehindQueue(client=redis_repo.client, key="test:write-behind")
+        self.repo = WriteBehindUrlRepository(redis_repo=redis_repo, queue=self.queue)
+        self.orm = ORMUrlRepository()
+        self.user = User.objects.create_user(username="wbuser", password="password")
+
+    def tearDown(self):
+        client = self.repo.redis.client
+        keys = list(client.scan_iter("test:shorturl:*"))
+        keys += list(client.scan_iter("test:write-behind*"))
+        if keys:
+            client.delete(*keys)
+        counter = ClickCounter()
+        counter.client.delete(counter.key, counter.flushing_key)
+
+    def drain(self):
+        return drain_write_behind_queue(self.queue, self.orm, batch_size=100)
+
+    def test_redis_serves_writes_before_postgres_catches_up(self):
+        service = UrlShortenerService(self.repo)
+        self.repo.save_mapping(
+            "wb1", "https://example.com", user=self.user, tags=["news"]
+        )
+
+        self.assertFalse(URL.objects.filter(short_code="wb1").exists())
+        with self.assertNumQueries(0):
+            self.assertEqual(service.get_original_url("wb1"), "https://example.com")
+
+        self.assertEqual(self.drain(), 1)
+        url_obj = URL.objects.get(short_code="wb1")
+        self.assertEqual(url_obj.owner, self.user)
+        self.assertEqual(list(url_obj.tags.values_list("name", flat=True)), ["news"])
+        self.assertEqual(len(self.queue), 0)
+
+    def test_unacknowledged_batch_replayed_after_crash(self):
+        self.repo.save_mapping("wb2", "https://example.com", user=self.user)
+        # A drain claimed the batch and died before applying it
+        self.queue.claim(10)
+        self.assertEqual(len(self.queue), 0)
+
+        self.assertEqual(self.drain(), 1)
+        self.assertTrue(URL.objects.filter(short_code="wb2").exists())
+        self.assertEqual(self.queue.in_flight(), [])
+
+    def test_failing_operation_is_dead_lettered(self):
+        self.repo.save_mapping("wb3", "https://example.com", user=self.user)
+        self.queue.push({"op": "bogus", "short_code": "wb3"})
+
+        self.assertEqual(self.drain(), 1)
+        self.assertTrue(URL.objects.filter(short_code="wb3").exists())
+        self.assertEqual(self.queue.client.llen(self.queue.dead_letter_key), 1)
+
+    def test_batch_kept_in_flight_when_every_operation_fails(self):
+        self.repo.save_mapping("lost1", "https://example.com", user=self.user)
+
+        with patch(
+            "shortener.write_behind.apply_operations",
+            side_effect=OperationalError("down"),
+        ):
+            with self.assertRaises(OperationalError):
+                self.drain()
+
+        self.assertEqual(len(self.queue.in_flight()), 1)
+        self.assertEqual(self.queue.client.llen(self.queue.dead_letter_key), 0)
+        # Still pending, so reconciliation leaves the Redis copy alone
+        stats = reconcile_url_stores(self.repo.redis, self.queue)
+        self.assertEqual(stats["missing_in_db"], 0)
+        self.assertTrue(self.repo.redis.exists("lost1"))
+
+        self.assertEqual(self.drain(), 1)
+        self.assertTrue(URL.objects.filter(short_code="lost1").exists())
+
+    def test_dead_lettered_codes_are_not_reconciled_away(self):
+        self.repo.redis.save_mapping("dead1", "https://example.com")
+        self.queue.dead_letter({"op": "save", "short_code": "dead1"})
+
+        stats = reconcile_url_stores(self.repo.redis, self.queue)
+
+        self.assertEqual(stats["missing_in_db"], 0)
+        self.assertTrue(self.repo.redis.exists("dead1"))
+
+    def test_clicks_counted_in_redis_and_written_behind(self):
+        self.repo.save_mapping("wb4", "https://example.com", user=self.user)
+        self.drain()
+
+        self.repo.log_click("wb4", {"country": "GH"})
+        self.assertEqual(self.repo.redis.get_click_count("wb4"), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.drain()
+        flush_click_counts_task()
+
+        url_obj = URL.objects.get(short_code="wb4")
+        self.assertEqual(url_obj.click_count, 1)
+        self.assertEqual(url_obj.clicks.get().country, "GH")
+
+    def test_deactivation_evicts_redirect_cache(self):
+        self.repo.save_mapping("wb5", "https://example.com", user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.drain()
+        redirect_cache.set("wb5", self.repo.get_redirect_record("wb5"), timeout=60)
+
+        # Evicted as soon as Redis changes, before the write reaches Postgres
+        self.repo.set_active("wb5", False)
+        self.assertIsNone(redirect_cache.get("wb5"))
+
+        redirect_cache.set(
+            "wb5",
+            RedirectRecord.from_url(URL.objects.get(short_code="wb5")),
+            timeout=60,
+        )
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.drain()
+            self.assertIsNotNone(redirect_cache.get("wb5"))
+        self.assertEqual(len(callbacks), 1)
+        self.assertIsNone(redirect_cache.get("wb5"))
+        self.assertFalse(URL.objects.get(short_code="wb5").is_active)
+
+    def test_redis_miss_falls_back_to_postgres_and_repairs(self):
+        URL.objects.create(
+            short_code="orm1", original_url="https://orm.com", owner=self.user
+        )
+
+        self.assertEqual(self.repo.get_original_url("orm1"), "https://orm.com")
+        self.assertTrue(self.repo.redis.exists("orm1"))
+        self.assertEqual(self.repo.existing_codes(["orm1", "nope"]), {"orm1"})
+
+    def test_reconciliation_detects_and_repairs_drift(self):
+        redis_repo = self.repo.redis
+        URL.objects.create(
+            short_code="only-db", original_url="https://a.com", owner=self.user
+        )
+        stale = URL.objects.create(
+            short_code="stale", original_url="https://b.com", owner=self.user
+        )
+        redis_repo.sync_urls([stale])
+        URL.objects.filter(pk=stale.pk).update(is_active=False)
+        redis_repo.save_mapping("orphan", "https://c.com")
+        self.repo.save_mapping("pending", "https://d.com", user=self.user)
+
+        stats = reconcile_url_stores(redis_repo, self.queue, repair=False)
+        self.assertEqual(
+            stats,
+            {
+                "checked": 2,
+                "missing_in_redis": 1,
+                "stale_in_redis": 1,
+                "missing_in_db": 1,
+            },
+        )
+        self.assertTrue(redis_repo.exists("orphan"))
+
+        reconcile_url_stores(redis_repo, self.queue)
+        self.assertFalse(redis_repo.exists("orphan"))
+        self.assertTrue(redis_repo.exists("pending"))
+        self.assertFalse(redis_repo.get_redirect_record("stale").is_active)
+        stats = reconcile_url_stores(redis_repo, self.queue, repair=False)
+        self.assertEqual(stats["missing_in_redis"] + stats["stale_in_redis"], 0)
+
+
+@override_settings(
+    URL_REPOSITORY="write_behind",
+    REDIS_URL_KEY_PREFIX="test:shorturl:",
+    WRITE_BEHIND_QUEUE_KEY="test:write-behind",
+    SHORT_CODE_POOL_ENABLED=False,
+)
+class WriteBehindRoutingTests(TestCase):
+    """The API and click drain write through WriteBehindUrlRepository."""
+
+    def setUp(self):
+        cache.clear()
+        redirect_cache.clear_local()
+        self.user = User.objects.create_user(
+            username="wbroute", password="password", tier="Premium", is_premium=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.queue = WriteBehindQueue()
+        self.buffer = ClickBuffer()
+
+    def tearDown(self):
+        client = self.queue.client
+        keys = list(client.scan_iter("test:shorturl:*"))
+        keys += list(client.scan_iter("test:write-behind*"))
+        if keys:
+            client.delete(*keys)
+        self.buffer.client.delete(
+            self.buffer.key, self.buffer.in_flight_key, settings.PREVIEW_QUEUE_KEY
+        )
+        counter = ClickCounter()
+        counter.client.delete(counter.key, counter.flushing_key)
+
+    def drain(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return drain_write_behind_queue(
+                self.queue, ORMUrlRepository(), batch_size=100
+            )
+
+    def test_create_deactivate_and_clicks_are_written_behind(self):
+        response = self.client.post(
+            reverse("v1:url_list_create"),
+            {"url": "https://example.com", "custom_alias": "wbapi"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # Live in Redis before Postgres catches up
+        self.assertFalse(URL.objects.filter(short_code="wbapi").exists())
+        redirect_url = reverse("redirect_url", kwargs={"short_code": "wbapi"})
+        self.assertEqual(self.client.get(redirect_url).status_code, 302)
+
+        self.drain()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.active_url_count, 1)
+
+        flush_click_buffer_task()
+        self.assertEqual(RedisUrlRepository().get_click_count("wbapi"), 1)
+        self.drain()
+        self.assertEqual(URL.objects.get(short_code="wbapi").clicks.count(), 1)
+
+        detail_url = reverse("v1:url_detail", kwargs={"short_code": "wbapi"})
+        self.assertEqual(self.client.delete(detail_url).status_code, 204)
+        self.assertEqual(self.client.get(redirect_url).status_code, 410)
+
+        self.drain()
+        self.assertFalse(URL.objects.get(short_code="wbapi").is_active)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.active_url_count, 0)
+
+
+class ShortCodePoolTests(TestCase):
+    def setUp(self):
+        self.repo = ORMUrlRepository()
+        self.pool = ShortCodePool(key="test:shortcode:pool")
+        self.pool.client.delete(self.pool.key)
+        self.user = User.objects.create_user(username="pooluser", password="password")
+
+    def tearDown(self):
+        self.pool.client.delete(self.pool.key)
+
+    def test_refill_skips_existing_codes(self):
+        """Test refill only pools codes that are not already in use."""
+        URL.objects.create(
+            short_code="TAKEN1", original_url="http://taken.com", owner=self.user
+        )
+        candidates = iter(["TAKEN1", "FREE01", "FREE01", "FREE02", "FREE03"])
+
+        added = self.pool.refill(
+            self.repo, lambda: next(candidates), target_size=3, batch_size=2
+        )
+
+        self.assertEqual(added, 3)
+        self.assertEqual(set(self.pool.pop_many(10)), {"FREE01", "FREE02", "FREE03"})
+
+    def test_service_pops_from_pool_without_exists_check(self):
+        """Test shorten_url takes a pooled code without probing the repository."""
+        self.pool.client.sadd(self.pool.key, "POOLED")
+        service = UrlShortenerService(self.repo, code_pool=self.pool)
+
+        with patch.object(self.repo, "exists") as mock_exists:
+            code = service.shorten_url("http://pooled.com", user=self.user)
+
+        self.assertEqual(code, "POOLED")
+        self.assertFalse(mock_exists.called)
+        self.assertEqual(self.pool.size(), 0)
+
+    def test_service_falls_back_when_pool_empty(self):
+        """Test shorten_url still generates a unique code if the pool is empty."""
+        service = UrlShortenerService(self.repo, code_pool=self.pool)
+        code = service.shorten_url("http://fallback.com", user=self.user)
+        self.assertTrue(URL.objects.filter(short_code=code).exists())
+
+    def test_custom_alias_removed_from_pool(self):
+        """Test a custom alias can never be handed out again by the pool."""
+        self.pool.client.sadd(self.pool.key, "myalias")
+        service = UrlShortenerService(self.repo, code_pool=self.pool)
+
+        service.shorten_url("http://alias.com", user=self.user, custom_alias="myalias")
+
+        self.assertIsNone(self.pool.pop())
+
+
+@override_settings(
+    SHORT_CODE_FILTER_KEY="test:shortcode:filter", SHORT_CODE_FILTER_CAPACITY=1000
+)
+class ShortCodeFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        redirect_cache.clear_local()
+        self.filter = ShortCodeFilter()
+        self.user = User.objects.create_user(username="filteruser", password="pw")
+
+    def tearDown(self):
+        self.filter.client.delete(self.filter.key, self.filter.stats_key)
+
+    def test_unbuilt_filter_never_rejects(self):
+        """Test a filter that was never built answers maybe and ignores adds."""
+        self.filter.add("ABC123")
+        self.assertTrue(self.filter.might_contain("ZZZ999"))
+        self.assertFalse(self.filter.stats()["ready"])
+
+    def test_rebuild_and_add(self):
+        """Test built filter keeps every code and rejects unknown ones."""
+        codes = [f"code{i}" for i in range(500)]
+        self.filter.rebuild(codes)
+        self.filter.add("late01")
+
+        for code in codes + ["late01"]:
+            self.assertTrue(self.filter.might_contain(code))
+        rejected = sum(
+            not self.filter.might_contain(f"missing{i}") for i in range(1000)
+        )
+        self.assertGreater(rejected, 950)
+        self.assertEqual(self.filter.stats()["rejected"], rejected)
+
+    def test_unknown_code_skips_database_and_is_negatively_cached(self):
+        """Test a 404 for an unknown code costs no query, and a later create clears it."""
+        self.filter.rebuild([])
+        redirect_url = reverse("redirect_url", kwargs={"short_code": "Ghost1"})
+
+        with self.assertNumQueries(0):
+            response = self.client.get(redirect_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(cache.get("url:Ghost1"), MISSING)
+
+        # Served from the negative cache: the filter is not consulted again
+        self.client.get(redirect_url)
+        self.assertEqual(self.filter.stats()["rejected"], 1)
+
+        URL.objects.create(
+            short_code="Ghost1", original_url="https://ghost.com", owner=self.user
+        )
+        response = self.client.get(redirect_url)
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+    def test_false_positive_metric(self):
+        """Test a code that passes the filter but is missing counts as a false positive."""
+        self.filter.rebuild(["Ghost2"])
+        service = UrlShortenerService(ORMUrlRepository(), code_filter=self.filter)
+
+        self.assertIsNone(service.get_original_url("Ghost2", log_click=False))
+        self.assertIsNone(service.get_original_url("Ghost3", log_click=False))
+
+        stats = self.filter.stats()
+        self.assertEqual(stats["false_positives"], 1)
+        self.assertEqual(stats["false_positive_rate"], 0.5)
+
+    def test_bulk_created_codes_are_added(self):
+        """Test bulk inserts, which skip post_save, still reach the filter."""
+        self.filter.rebuild([])
+        ORMUrlRepository().save_many(
+            [{"short_code": "Bulk01", "original_url": "https://bulk.com"}],
+            user=self.user,
+        )
+        self.assertTrue(self.filter.might_contain("Bulk01"))
+
+
 class ApiTests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -55,35 +505,24 @@ class ApiTests(TestCase):
         self.client.force_authenticate(user=self.user)
 
     @patch("api.views.UrlShortenerService")
-    @patch("api.views.fetch_url_preview_task.delay")
-    def test_shorten_url_success(self, mock_preview_delay, mock_service_class):
+    @patch("api.views.PreviewQueue.add")
+    def test_shorten_url_success(self, mock_preview_add, mock_service_class):
         """
-        Test that posting a valid URL returns a short code and triggers preview task.
+        Test that posting a valid URL returns a short code and queues its preview.
         """
         # Mocking the service instance and its method
         mock_service_instance = mock_service_class.return_value
         mock_service_instance.shorten_url.return_value = "TestCode"
 
-        # Mocking URL object return for views logic
-        from shortener.models import URL
-
-        with patch("api.views.URL.objects.get") as mock_url_get:
-            mock_url_obj = URL(
-                id=1, short_code="TestCode", original_url="https://www.example.com"
-            )
-            mock_url_get.return_value = mock_url_obj
-
-            data = {"url": "https://www.example.com"}
-            response = self.client.post(self.shorten_url, data, format="json")
+        data = {"url": "https://www.example.com"}
+        response = self.client.post(self.shorten_url, data, format="json")
 
-            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-            self.assertEqual(response.data["short_code"], "TestCode")
-            self.assertIn("/TestCode/", response.data["short_url"])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["short_code"], "TestCode")
+        self.assertIn("/TestCode/", response.data["short_url"])
 
-            # Verify preview task was triggered
-            mock_preview_delay.assert_called_once_with(
-                mock_url_obj.id, "https://www.example.com"
-            )
+        # Verify the preview was queued
+        mock_preview_add.assert_called_once_with(["TestCode"])
 
     def test_shorten_url_invalid(self):
         """
@@ -100,7 +539,9 @@ class ApiTests(TestCase):
         Test that accessing a valid short code redirects to the original URL.
         """
         mock_service_instance = mock_service_class.return_value
-        mock_service_instance.get_original_url.return_value = "https://www.example.com"
+        mock_service_instance.get_redirect_record.return_value = RedirectRecord(
+            "https://www.example.com", None, True, "Premium"
+        )
 
         url = reverse("redirect_url", kwargs={"short_code": "TestCode"})
         response = self.client.get(url)
@@ -115,7 +556,7 @@ class ApiTests(TestCase):
         Test that accessing a non-existent short code returns 404.
         """
         mock_service_instance = mock_service_class.return_value
-        mock_service_instance.get_original_url.return_value = None
+        mock_service_instance.get_redirect_record.return_value = None
 
         url = reverse("redirect_url", kwargs={"short_code": "Missing"})
         response = self.client.get(url)
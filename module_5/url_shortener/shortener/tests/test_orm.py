@@ -1,10 +1,21 @@
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 from unittest.mock import patch
+from shortener.click_counter import ClickCounter
 from shortener.models import URL, Tag, Click
+from shortener.repositories import ORMUrlRepository
+from shortener.tags import tag_cache
+from api.serializers import URLDetailSerializer
 
 User = get_user_model()
 
@@ -33,8 +44,8 @@ class ORMIntegrationTests(TestCase):
         if not Tag.objects.filter(name="Marketing").exists():
             Tag.objects.create(name="Marketing")
 
-    @patch("api.views.fetch_url_preview_task.delay")
-    def test_shorten_url_with_user_and_alias(self, mock_preview_delay):
+    @patch("api.views.PreviewQueue.add")
+    def test_shorten_url_with_user_and_alias(self, mock_preview_add):
         """
         Test shortening a URL with an authenticated user and a custom alias.
         """
@@ -44,9 +55,8 @@ class ORMIntegrationTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data["short_code"], "myalias")
 
-        # Verify preview task was triggered
-        url = URL.objects.get(short_code="myalias")
-        mock_preview_delay.assert_called_once_with(url.id, "https://www.example.com")
+        # Verify the preview was queued
+        mock_preview_add.assert_called_once_with(["myalias"])
 
         # Verify DB
         url = URL.objects.get(short_code="myalias")
@@ -66,10 +76,10 @@ class ORMIntegrationTests(TestCase):
         response = self.client.post(self.shorten_url, data, format="json")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
-    @patch("api.views.track_click_task.delay")
-    def test_click_logging(self, mock_click_delay):
+    @patch("api.views.ClickBuffer.apush")
+    def test_click_logging(self, mock_click_push):
         """
-        Test that accessing the redirect URL triggers an async click log task.
+        Test that accessing the redirect URL buffers the click for async ingestion.
         """
         code = "clicks"
         URL.objects.create(
@@ -83,10 +93,10 @@ class ORMIntegrationTests(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_302_FOUND)
 
-        # Verify async task was triggered
-        self.assertTrue(mock_click_delay.called)
+        # Verify the click was buffered
+        self.assertTrue(mock_click_push.called)
         # Check that it was called with the correct short_code
-        args, _ = mock_click_delay.call_args
+        args, _ = mock_click_push.call_args
         self.assertEqual(args[0], code)
 
     def test_owner_relationship(self):
@@ -208,3 +218,341 @@ class ORMIntegrationTests(TestCase):
             for u in urls:
                 _ = u.owner.username
                 _ = list(u.tags.all())
+
+
+class BulkShortenTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.bulk_url = reverse("v1:url_bulk_create")
+        self.premium_user = User.objects.create_user(
+            username="bulkpremium",
+            email="bulkpremium@example.com",
+            password="password123",
+            tier="Premium",
+            is_premium=True,
+        )
+        self.free_user = User.objects.create_user(
+            username="bulkfree",
+            email="bulkfree@example.com",
+            password="password123",
+            tier="Free",
+        )
+
+    @patch("api.views.PreviewQueue.add")
+    def test_bulk_shorten_per_item_results(self, mock_preview_add):
+        """Test valid items are created and invalid ones reported by index."""
+        self.client.force_authenticate(user=self.premium_user)
+        URL.objects.create(
+            short_code="taken", original_url="http://t.com", owner=self.premium_user
+        )
+        data = {
+            "urls": [
+                {"url": "https://one.com", "tags": ["Bulk", "Marketing"]},
+                {"url": "not-a-url"},
+                {"url": "https://two.com", "custom_alias": "bulkalias"},
+                {"url": "https://three.com", "custom_alias": "taken"},
+            ]
+        }
+        response = self.client.post(self.bulk_url, data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        results = response.data["results"]
+        self.assertEqual([r["index"] for r in results], [0, 1, 2, 3])
+        self.assertIn("short_code", results[0])
+        self.assertIn("url", results[1]["errors"])
+        self.assertEqual(results[2]["short_code"], "bulkalias")
+        self.assertIn("already taken", results[3]["error"])
+
+        created = URL.objects.get(short_code=results[0]["short_code"])
+        self.assertEqual(created.owner, self.premium_user)
+        self.assertEqual(
+            set(created.tags.values_list("name", flat=True)), {"Bulk", "Marketing"}
+        )
+        mock_preview_add.assert_called_once_with(
+            [results[0]["short_code"], "bulkalias"]
+        )
+
+    @patch("api.views.PreviewQueue.add")
+    def test_bulk_shorten_query_count_is_constant(self, mock_preview_add):
+        """Test the number of queries does not grow with the batch size."""
+        self.client.force_authenticate(user=self.premium_user)
+
+        def post_batch(size, prefix):
+            data = {
+                "urls": [
+                    {"url": f"https://{prefix}{i}.com", "tags": [f"{prefix}{i}"]}
+                    for i in range(size)
+                ]
+            }
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.bulk_url, data, format="json")
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(post_batch(2, "small"), post_batch(50, "large"))
+
+    @patch("api.views.PreviewQueue.add")
+    def test_bulk_shorten_free_tier_limit(self, mock_preview_add):
+        """Test the Free tier limit is enforced for the batch as a whole."""
+        self.client.force_authenticate(user=self.free_user)
+        data = {"urls": [{"url": f"https://free{i}.com"} for i in range(11)]}
+        response = self.client.post(self.bulk_url, data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(URL.objects.filter(owner=self.free_user).exists())
+        self.assertFalse(mock_preview_add.called)
+
+
+class ActiveUrlCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="counted", email="counted@example.com", password="password123"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.repo = ORMUrlRepository()
+
+    def active_url_count(self):
+        self.user.refresh_from_db()
+        return self.user.active_url_count
+
+    def detail_url(self, short_code):
+        return reverse("v1:url_detail", kwargs={"short_code": short_code})
+
+    def test_creates_increment_the_counter(self):
+        self.repo.save_mapping("cnt1", "https://one.com", user=self.user)
+        self.repo.save_many(
+            [
+                {"short_code": "cnt2", "original_url": "https://two.com"},
+                {"short_code": "cnt3", "original_url": "https://three.com"},
+            ],
+            user=self.user,
+        )
+        self.assertEqual(self.active_url_count(), 3)
+
+    @patch("api.views.PreviewQueue.add")
+    def test_free_limit_check_does_not_scan_urls(self, mock_preview_add):
+        response = self.client.post(
+            reverse("v1:url_list_create"), {"url": "https://new.com"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.active_url_count(), 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("v1:url_list_create"), {"url": "https://b.com"})
+        self.assertFalse(any("COUNT(" in q["sql"] for q in queries.captured_queries))
+
+    def test_deactivation_and_delete_decrement_once(self):
+        self.repo.save_mapping("cnt1", "https://one.com", user=self.user)
+        self.repo.save_mapping("cnt2", "https://two.com", user=self.user)
+        self.client.delete(self.detail_url("cnt1"))
+        self.assertEqual(self.active_url_count(), 1)
+        # Deleting the already inactive URL does not count it again
+        self.client.delete(self.detail_url("cnt1") + "?permanent=true")
+        self.assertEqual(self.active_url_count(), 1)
+        self.client.delete(self.detail_url("cnt2") + "?permanent=true")
+        self.assertEqual(self.active_url_count(), 0)
+
+    def test_archive_task_decrements_expired_urls(self):
+        from shortener.tasks import archive_expired_urls_task
+
+        past = timezone.now() - timedelta(hours=1)
+        self.repo.save_mapping("old1", "https://one.com", user=self.user)
+        self.repo.save_mapping("old2", "https://two.com", user=self.user)
+        self.repo.save_mapping("live", "https://three.com", user=self.user)
+        URL.objects.filter(short_code__startswith="old").update(expires_at=past)
+
+        self.assertIn("Deactivated 2", archive_expired_urls_task())
+        self.assertEqual(self.active_url_count(), 1)
+        self.assertIn("Deactivated 0", archive_expired_urls_task())
+        self.assertEqual(self.active_url_count(), 1)
+
+    def test_recount_command_repairs_drift(self):
+        self.repo.save_mapping("cnt1", "https://one.com", user=self.user)
+        # Raw ORM writes bypass the counter
+        URL.objects.create(
+            short_code="raw", original_url="https://raw.com", owner=self.user
+        )
+        out = StringIO()
+        call_command("recount_active_urls", stdout=out)
+
+        self.assertIn("Repaired active URL count for 1 users", out.getvalue())
+        self.assertEqual(self.active_url_count(), 2)
+        with self.assertRaises(CommandError):
+            call_command("recount_active_urls", "--user", "nobody")
+
+
+class UrlListPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.list_url = reverse("v1:url_list_create")
+        self.user = User.objects.create_user(
+            username="lister", email="lister@example.com", password="password123"
+        )
+        self.client.force_authenticate(user=self.user)
+        base = timezone.now()
+        for i in range(7):
+            URL.objects.create(
+                short_code=f"list{i}", original_url=f"https://{i}.com", owner=self.user
+            )
+        # Shared timestamps must not drop or repeat rows across pages
+        URL.objects.filter(short_code__in=["list2", "list3", "list4"]).update(
+            created_at=base - timedelta(minutes=1)
+        )
+        URL.objects.filter(short_code__in=["list0", "list1"]).update(
+            created_at=base - timedelta(minutes=2)
+        )
+
+    def expected_order(self):
+        return list(
+            URL.objects.filter(owner=self.user)
+            .order_by("-created_at", "-id")
+            .values_list("short_code", flat=True)
+        )
+
+    def test_cursor_walk_returns_every_row_once(self):
+        codes = []
+        next_url = f"{self.list_url}?page_size=2"
+        while next_url:
+            response = self.client.get(next_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            codes += [row["short_code"] for row in response.data["results"]]
+            next_url = response.data["next"]
+        self.assertEqual(codes, self.expected_order())
+
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get(f"{self.list_url}?page_size=3").data
+        self.assertIsNone(first["previous"])
+        second = self.client.get(first["next"]).data
+        back = self.client.get(second["previous"]).data
+
+        self.assertEqual(back["results"], first["results"])
+        self.assertIsNone(back["previous"])
+
+    def test_page_queries_skip_count_and_offset(self):
+        first = self.client.get(f"{self.list_url}?page_size=2").data
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first["next"])
+        sql = " ".join(q["sql"] for q in queries.captured_queries)
+        self.assertNotIn("COUNT(", sql)
+        self.assertNotIn("OFFSET", sql)
+        # One query for the rows, one for their tags
+        self.assertEqual(len(queries), 2)
+
+    def test_rows_match_detail_serializer(self):
+        url_obj = URL.objects.get(short_code="list6")
+        URL.objects.filter(pk=url_obj.pk).update(
+            title="Listed", custom_alias="listed", click_count=4
+        )
+        url_obj.refresh_from_db()
+        url_obj.tags.add(Tag.objects.get_or_create(name="Listed")[0])
+        counter = ClickCounter()
+        counter.client.delete(counter.key, counter.flushing_key)
+        self.addCleanup(counter.client.delete, counter.key, counter.flushing_key)
+        counter.add({url_obj.id: 2})
+
+        row = self.client.get(self.list_url).data["results"][0]
+        expected = URLDetailSerializer(url_obj).data
+        self.assertEqual(list(row), list(expected))
+        self.assertEqual(row, expected)
+        self.assertEqual(row["click_count"], 6)
+
+    def test_rows_follow_detail_serializer_fields(self):
+        # A field added to the detail serializer shows up in list rows too
+        fields = URLDetailSerializer.Meta.fields + ["expires_at", "is_active"]
+        url_obj = URL.objects.get(short_code="list6")
+        URL.objects.filter(pk=url_obj.pk).update(
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+        url_obj.refresh_from_db()
+
+        with patch.object(URLDetailSerializer.Meta, "fields", fields):
+            row = self.client.get(self.list_url).data["results"][0]
+            expected = URLDetailSerializer(url_obj).data
+        self.assertEqual(list(row), fields)
+        self.assertEqual(row, expected)
+
+    def test_tag_filter_and_invalid_cursor(self):
+        URL.objects.get(short_code="list3").tags.add(
+            Tag.objects.get_or_create(name="Picked")[0]
+        )
+        response = self.client.get(f"{self.list_url}?tag=picked")
+        self.assertEqual(
+            [row["short_code"] for row in response.data["results"]], ["list3"]
+        )
+
+        response = self.client.get(f"{self.list_url}?cursor=bogus")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TagNormalizationTests(TestCase):
+    def setUp(self):
+        self.repo = ORMUrlRepository()
+        self.user = User.objects.create_user(
+            username="tagger", email="tagger@example.com", password="password123"
+        )
+        tag_cache.clear()
+
+    def tearDown(self):
+        # Cached ids would outlive the rolled-back test transaction
+        tag_cache.clear()
+
+    def tag_names(self, short_code):
+        return sorted(
+            URL.objects.get(short_code=short_code).tags.values_list("name", flat=True)
+        )
+
+    def test_names_are_normalized_and_case_insensitive(self):
+        self.repo.save_mapping(
+            "tag1",
+            "https://one.com",
+            user=self.user,
+            tags=["News", " news ", "Big  Day"],
+        )
+        self.repo.save_mapping("tag2", "https://two.com", user=self.user, tags=["NEWS"])
+
+        self.assertEqual(self.tag_names("tag1"), ["Big Day", "News"])
+        self.assertEqual(self.tag_names("tag2"), ["News"])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Tag.objects.create(name="big day")
+
+    def test_cached_tags_are_attached_without_tag_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.repo.save_mapping(
+                "tag1", "https://one.com", user=self.user, tags=["Alpha", "Beta"]
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            self.repo.save_mapping(
+                "tag2", "https://two.com", user=self.user, tags=["alpha", "BETA"]
+            )
+        tag_table = Tag._meta.db_table
+        self.assertFalse(
+            any(f'"{tag_table}"' in q["sql"] for q in queries.captured_queries)
+        )
+        self.assertEqual(self.tag_names("tag2"), ["Alpha", "Beta"])
+
+    def test_rolled_back_tags_are_not_cached(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    tag_cache.resolve(["Ghost"])
+                    raise RuntimeError("rollback")
+            except RuntimeError:
+                pass
+
+        self.assertIsNone(tag_cache.local.get("ghost"))
+
+    def test_list_filter_uses_tag_id(self):
+        self.repo.save_mapping("tag1", "https://one.com", user=self.user, tags=["Go"])
+        self.repo.save_mapping("tag2", "https://two.com", user=self.user)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        list_url = reverse("v1:url_list_create")
+
+        response = client.get(f"{list_url}?tag=GO")
+        self.assertEqual(
+            [row["short_code"] for row in response.data["results"]], ["tag1"]
+        )
+        response = client.get(f"{list_url}?tag=unknown")
+        self.assertEqual(response.data["results"], [])
@@ -1,25 +1,48 @@
 import httpx
+import threading
+import time
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from unittest.mock import patch, MagicMock
-from shortener.preview_client import PreviewServiceClient
+from prometheus_client import REGISTRY
+from shortener.circuit_breaker import CircuitBreaker, preview_breaker
+from shortener.preview_cache import PreviewCache, normalize_url
+from shortener.preview_client import (
+    AsyncPreviewFetcher,
+    PreviewServiceClient,
+    get_http_client,
+)
 from django.core.cache import cache
+from preview_service.parsing import HeadReader
+
+# The real classes, for building clients while httpx.Client is patched
+HTTP_CLIENT_CLASSES = {False: httpx.Client, True: httpx.AsyncClient}
+
+
+def mock_http_client(handler, asynchronous=False):
+    """
+    Side effect for a patched httpx client class: a real client whose requests
+    are answered by handler.
+    """
+    return lambda **kwargs: HTTP_CLIENT_CLASSES[asynchronous](
+        transport=httpx.MockTransport(handler), **kwargs
+    )
 
 
 class PreviewServiceTests(TestCase):
     def setUp(self):
         self.client = APIClient()
         self.fetch_url = reverse("preview:preview_fetch")
+        self.batch_url = reverse("preview:preview_batch")
 
     @patch("preview_service.views.httpx.Client")
     def test_preview_fetch_success(self, mock_client):
         """
         Test that PreviewView successfully parses a mock HTML response.
         """
-        mock_response = MagicMock()
-        mock_response.text = """
+        html = """
         <html>
             <head>
                 <title>Test Page</title>
@@ -29,11 +52,9 @@ class PreviewServiceTests(TestCase):
             <body></body>
         </html>
         """
-        mock_response.status_code = 200
-        mock_response.raise_for_status = MagicMock()
-
-        mock_instance = mock_client.return_value.__enter__.return_value
-        mock_instance.get.return_value = mock_response
+        mock_client.side_effect = mock_http_client(
+            lambda request: httpx.Response(200, html=html)
+        )
 
         response = self.client.post(
             self.fetch_url, {"url": "https://example.com"}, format="json"
@@ -44,6 +65,100 @@ class PreviewServiceTests(TestCase):
         self.assertEqual(response.data["description"], "This is a test description")
         self.assertEqual(response.data["favicon"], "https://example.com/favicon.ico")
 
+    @patch("preview_service.views.httpx.Client")
+    def test_preview_fetch_stops_at_end_of_head(self, mock_client):
+        chunks_sent = []
+
+        def body():
+            yield b"<html><head><title>Big &amp; Slow</title>"
+            yield b'<meta property="og:description" content="OG only"></head>'
+            for _ in range(1000):
+                chunks_sent.append(1)
+                yield b"<p>" + b"x" * 10_000 + b"</p>"
+
+        mock_client.side_effect = mock_http_client(
+            lambda request: httpx.Response(200, content=body())
+        )
+
+        response = self.client.post(
+            self.fetch_url, {"url": "https://big.example.com/page"}, format="json"
+        )
+
+        self.assertEqual(response.data["title"], "Big & Slow")
+        self.assertEqual(response.data["description"], "OG only")
+        self.assertEqual(
+            response.data["favicon"], "https://big.example.com/favicon.ico"
+        )
+        self.assertLess(len(chunks_sent), 2)
+
+    def test_head_reader_caps_bytes_read(self):
+        reader = HeadReader("utf-8", max_bytes=100)
+        self.assertFalse(reader.feed(b"<html><head><title>" + b"t" * 50))
+        self.assertTrue(reader.feed(b"t" * 500))
+        self.assertEqual(reader.bytes_read, 100)
+        self.assertIsNone(reader.preview("https://example.com")["title"])
+
+    @patch("preview_service.views.httpx.AsyncClient")
+    def test_preview_batch(self, mock_client):
+        def handler(request):
+            if request.url.host == "missing.com":
+                return httpx.Response(404)
+            return httpx.Response(
+                200,
+                html=f"<html><head><title>{request.url.host}</title></head></html>",
+            )
+
+        mock_client.side_effect = mock_http_client(handler, asynchronous=True)
+        urls = ["https://a.com", "https://missing.com", "https://b.com"]
+
+        response = self.client.post(self.batch_url, {"urls": urls}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual([result["url"] for result in results], urls)
+        self.assertEqual(results[0]["title"], "a.com")
+        self.assertEqual(results[1]["description"], "HTTP Error: 404")
+        self.assertEqual(results[2]["title"], "b.com")
+
+    def test_preview_batch_validation(self):
+        for data in ({}, {"urls": []}, {"urls": "https://a.com"}, {"urls": [1]}):
+            response = self.client.post(self.batch_url, data, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.settings(PREVIEW_BATCH_MAX_URLS=2):
+            response = self.client.post(
+                self.batch_url, {"urls": ["https://a.com"] * 3}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch("preview_service.views.httpx.Client")
+    def test_preview_fetch_conditional(self, mock_client):
+        def handler(request):
+            if request.headers.get("If-None-Match") == '"v1"':
+                return httpx.Response(304, headers={"ETag": '"v1"'})
+            return httpx.Response(
+                200,
+                html="<html><head><title>Versioned</title></head></html>",
+                headers={"ETag": '"v1"', "Last-Modified": "Sat, 17 Oct 2026"},
+            )
+
+        mock_client.side_effect = mock_http_client(handler)
+
+        response = self.client.post(
+            self.fetch_url, {"url": "https://example.com"}, format="json"
+        )
+        self.assertEqual(response.data["title"], "Versioned")
+        self.assertEqual(response.data["etag"], '"v1"')
+        self.assertEqual(response.data["last_modified"], "Sat, 17 Oct 2026")
+
+        response = self.client.post(
+            self.fetch_url,
+            {"url": "https://example.com", "etag": '"v1"'},
+            format="json",
+        )
+        self.assertTrue(response.data["not_modified"])
+        self.assertNotIn("title", response.data)
+
     def test_preview_fetch_missing_url(self):
         response = self.client.post(self.fetch_url, {}, format="json")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -53,13 +168,14 @@ class PreviewClientTests(TestCase):
     def setUp(self):
         self.client = PreviewServiceClient()
         cache.clear()
+        preview_breaker.clear_local()
 
-    @patch("shortener.preview_client.httpx.Client")
+    @patch("shortener.preview_client.get_http_client")
     def test_client_retry_logic(self, mock_client):
         """
         Test that PreviewServiceClient retries on failure.
         """
-        mock_instance = mock_client.return_value.__enter__.return_value
+        mock_instance = mock_client.return_value
 
         # Fail twice, then succeed
         mock_instance.post.side_effect = [
@@ -81,12 +197,12 @@ class PreviewClientTests(TestCase):
         self.assertEqual(result["title"], "Success")
         self.assertEqual(mock_instance.post.call_count, 3)
 
-    @patch("shortener.preview_client.httpx.Client")
+    @patch("shortener.preview_client.get_http_client")
     def test_circuit_breaker_opens(self, mock_client):
         """
         Test that circuit breaker opens after multiple failures.
         """
-        mock_instance = mock_client.return_value.__enter__.return_value
+        mock_instance = mock_client.return_value
         mock_instance.post.side_effect = httpx.RequestError("Permanent error")
 
         # 5 failures should open the circuit
@@ -101,3 +217,217 @@ class PreviewClientTests(TestCase):
         result = self.client.fetch_preview("https://fail.com")
         self.assertEqual(result["description"], "Circuit Open")
         self.assertEqual(mock_instance.post.call_count, 15)  # No more calls to httpx
+
+    def test_http_client_is_shared(self):
+        client = get_http_client()
+        self.assertIs(get_http_client(), client)
+        self.assertFalse(client.is_closed)
+
+
+class PreviewCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        preview_breaker.clear_local()
+        self.preview_cache = PreviewCache()
+        self.client = PreviewServiceClient(self.preview_cache)
+
+    def service_response(self, payload):
+        return MagicMock(status_code=200, json=lambda: payload)
+
+    def test_normalize_url(self):
+        self.assertEqual(
+            normalize_url("HTTPS://Example.COM:443?b=2&a=1&utm_source=x#top"),
+            "https://example.com/?a=1&b=2",
+        )
+        self.assertEqual(
+            normalize_url("http://example.com:8080/Path"),
+            "http://example.com:8080/Path",
+        )
+        # An invalid port keeps the authority instead of raising
+        self.assertEqual(
+            normalize_url("http://Example.com:99999/a"),
+            "http://example.com:99999/a",
+        )
+        self.assertEqual(
+            PreviewCache.page_key("https://example.com/?a=1&b=2"),
+            PreviewCache.page_key("https://EXAMPLE.com?b=2&a=1#x"),
+        )
+
+    @patch("shortener.preview_client.get_http_client")
+    def test_same_page_is_fetched_once(self, mock_client):
+        mock_post = mock_client.return_value.post
+        mock_post.return_value = self.service_response(
+            {"title": "Cached", "description": None, "favicon": "https://a.com/i.png"}
+        )
+
+        first = self.client.fetch_preview("https://a.com/page?x=1")
+        second = self.client.fetch_preview("https://A.com/page?x=1#section")
+
+        self.assertEqual(first, second)
+        self.assertEqual(first["title"], "Cached")
+        self.assertEqual(mock_post.call_count, 1)
+
+    @patch("shortener.preview_client.get_http_client")
+    def test_stale_entry_is_revalidated(self, mock_client):
+        mock_post = mock_client.return_value.post
+        mock_post.side_effect = [
+            self.service_response(
+                {"title": "Page", "description": None, "favicon": None, "etag": '"v1"'}
+            ),
+            self.service_response({"not_modified": True, "etag": '"v1"'}),
+        ]
+        self.preview_cache.ttl = 0
+
+        self.client.fetch_preview("https://a.com/")
+        result = self.client.fetch_preview("https://a.com/")
+
+        self.assertEqual(result["title"], "Page")
+        self.assertEqual(
+            mock_post.call_args.kwargs["json"],
+            {"url": "https://a.com/", "etag": '"v1"'},
+        )
+        self.assertEqual(self.preview_cache.get("https://a.com/").etag, '"v1"')
+
+    @patch("shortener.preview_client.get_http_client")
+    def test_failed_refresh_serves_cached_preview(self, mock_client):
+        self.preview_cache.set("https://a.com/", {"title": "Old", "favicon": None})
+        self.preview_cache.ttl = 0
+        mock_client.return_value.post.side_effect = httpx.RequestError("down")
+
+        with patch("tenacity.nap.time.sleep", return_value=None):
+            result = self.client.fetch_preview("https://a.com/")
+
+        self.assertEqual(result["title"], "Old")
+
+    @patch("shortener.preview_client.get_http_client")
+    def test_failed_fetches_are_not_cached(self, mock_client):
+        mock_post = mock_client.return_value.post
+        mock_post.return_value = self.service_response(
+            {
+                "title": None,
+                "description": "HTTP Error: 404",
+                "favicon": None,
+                "error": True,
+            }
+        )
+
+        self.client.fetch_preview("https://a.com/missing")
+        self.client.fetch_preview("https://a.com/missing")
+
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertIsNone(self.preview_cache.get("https://a.com/missing"))
+
+    def test_favicon_is_cached_per_domain(self):
+        self.preview_cache.set("https://a.com/one", {"favicon": "https://a.com/f.ico"})
+
+        previews = self.preview_cache.fill_favicons(
+            {"https://a.com/two": {"favicon": None}, "https://b.com/": {}}
+        )
+
+        self.assertEqual(
+            previews["https://a.com/two"]["favicon"], "https://a.com/f.ico"
+        )
+        self.assertNotIn("favicon", previews["https://b.com/"])
+
+    @patch("shortener.preview_client.AsyncPreviewFetcher._call_service")
+    def test_batch_fetch_uses_cache(self, mock_call_service):
+        self.preview_cache.set("https://cached.com/", {"title": "Cached"})
+        calls = []
+
+        async def call_service(http, url, **validators):
+            calls.append(url)
+            return {"title": "Fetched", "description": None, "favicon": None}
+
+        mock_call_service.side_effect = call_service
+        urls = ["https://cached.com/", "https://new.com/"]
+
+        previews = AsyncPreviewFetcher(self.client).fetch_many(urls)
+        self.assertEqual(previews["https://cached.com/"]["title"], "Cached")
+        self.assertEqual(previews["https://new.com/"]["title"], "Fetched")
+        self.assertEqual(calls, ["https://new.com/"])
+
+        AsyncPreviewFetcher(self.client).fetch_many(urls)
+        self.assertEqual(calls, ["https://new.com/"])
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.breaker = CircuitBreaker(
+            "test", failure_threshold=3, cooldown=0.2, state_cache_ttl=60
+        )
+
+    def transitions(self, event):
+        return (
+            REGISTRY.get_sample_value(
+                "circuit_breaker_transitions_total",
+                {"breaker": "test", "event": event},
+            )
+            or 0
+        )
+
+    def test_closed_state_is_served_from_process_cache(self):
+        self.assertTrue(self.breaker.allow("a.com"))
+
+        with patch.object(self.breaker, "_acquire") as mock_acquire:
+            self.assertTrue(self.breaker.allow("a.com"))
+            self.breaker.record_success("a.com")
+            self.assertFalse(mock_acquire.called)
+
+    def test_concurrent_failures_are_all_counted(self):
+        def fail():
+            CircuitBreaker("test", failure_threshold=100).record_failure("a.com")
+
+        threads = [threading.Thread(target=fail) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        failures = self.breaker.client.hget(self.breaker.key("a.com"), "failures")
+        self.assertEqual(int(failures), 20)
+
+    def test_trip_half_open_and_reset(self):
+        trips, resets = self.transitions("trip"), self.transitions("reset")
+        for _ in range(3):
+            self.breaker.record_failure("a.com")
+        self.assertEqual(self.transitions("trip"), trips + 1)
+        self.assertFalse(self.breaker.allow("a.com"))
+
+        # Another worker sees the open circuit too
+        other_worker = CircuitBreaker("test", state_cache_ttl=60)
+        self.assertFalse(other_worker.allow("a.com"))
+
+        # After the cooldown exactly one worker gets the trial call
+        time.sleep(0.25)
+        self.breaker.clear_local()
+        other_worker.clear_local()
+        self.assertTrue(self.breaker.allow("a.com"))
+        self.assertFalse(other_worker.allow("a.com"))
+        self.assertFalse(self.breaker.allow("a.com"))
+
+        self.breaker.record_success("a.com")
+        self.assertEqual(self.transitions("reset"), resets + 1)
+        self.assertTrue(self.breaker.allow("a.com"))
+        self.assertFalse(self.breaker.client.exists(self.breaker.key("a.com")))
+
+    def test_failed_trial_reopens(self):
+        for _ in range(3):
+            self.breaker.record_failure("a.com")
+        time.sleep(0.25)
+        self.breaker.clear_local()
+        self.assertTrue(self.breaker.allow("a.com"))
+
+        self.breaker.record_failure("a.com")
+
+        self.breaker.clear_local()
+        self.assertFalse(self.breaker.allow("a.com"))
+
+    def test_success_clears_failures_seen_by_worker(self):
+        for _ in range(2):
+            self.breaker.record_failure("a.com")
+        self.breaker.record_success("a.com")
+        self.breaker.record_failure("a.com")
+
+        self.breaker.clear_local()
+        self.assertTrue(self.breaker.allow("a.com"))
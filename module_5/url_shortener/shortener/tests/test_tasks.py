@@ -1,9 +1,36 @@
+import asyncio
+import httpx
+import json
+import os
+import tempfile
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.db.models import QuerySet
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from api.serializers import URLDetailSerializer
 from django.utils import timezone
 from datetime import timedelta
+from shortener.click_buffer import ClickBuffer
+from shortener.circuit_breaker import preview_breaker
+from shortener.click_counter import ClickCounter
+from shortener.geoip import GeoEnricher, write_database
 from shortener.models import URL, Click
-from shortener.tasks import track_click_task, archive_expired_urls_task
+from shortener.preview_client import AsyncPreviewFetcher
+from shortener.preview_queue import PreviewQueue
+from shortener.redirect_cache import RedirectRecord, redirect_cache
+from shortener.repositories import ORMUrlRepository
+from shortener.tasks import (
+    track_click_task,
+    archive_expired_urls_task,
+    flush_click_buffer_task,
+    flush_click_counts_task,
+    fetch_url_previews_task,
+    fetch_pending_previews_task,
+)
 from django.contrib.auth import get_user_model
+from unittest.mock import patch
 
 User = get_user_model()
 
@@ -16,6 +43,11 @@ class TaskTests(TestCase):
         self.url_obj = URL.objects.create(
             short_code="task-test", original_url="https://example.com", owner=self.user
         )
+        self.counter = ClickCounter()
+        self.counter.client.delete(self.counter.key, self.counter.flushing_key)
+
+    def tearDown(self):
+        self.counter.client.delete(self.counter.key, self.counter.flushing_key)
 
     def test_track_click_task(self):
         """Test track_click_task creates a Click record."""
@@ -25,12 +57,14 @@ class TaskTests(TestCase):
             "referer": "http://ref.com",
         }
 
-        result = track_click_task(self.url_obj.short_code, click_data)
+        with self.captureOnCommitCallbacks(execute=True):
+            result = track_click_task(self.url_obj.short_code, click_data)
 
         self.assertIn("Click tracked", result)
         self.assertTrue(
             Click.objects.filter(url=self.url_obj, ip_address="8.8.8.8").exists()
         )
+        flush_click_counts_task()
         self.url_obj.refresh_from_db()
         self.assertEqual(self.url_obj.click_count, 1)
 
@@ -58,3 +92,391 @@ class TaskTests(TestCase):
 
         self.assertFalse(URL.objects.get(short_code="expired-1").is_active)
         self.assertTrue(URL.objects.get(short_code="active-1").is_active)
+
+    def test_archive_runs_in_batches_and_evicts_cache(self):
+        """Test archiving is chunked, resumable and evicts archived codes."""
+        past = timezone.now() - timedelta(hours=1)
+        for i in range(5):
+            url_obj = URL.objects.create(
+                short_code=f"exp-{i}",
+                original_url="http://expired.com",
+                owner=self.user,
+                expires_at=past - timedelta(minutes=i),
+            )
+            redirect_cache.set(
+                url_obj.short_code, RedirectRecord.from_url(url_obj), timeout=60
+            )
+        redirect_cache.clear_local()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = archive_expired_urls_task(batch_size=2, max_batches=2)
+        self.assertIn("Deactivated 4", result)
+        # Oldest expiries go first; the rest is left for the next run
+        self.assertEqual(
+            list(
+                URL.objects.filter(
+                    short_code__startswith="exp-", is_active=True
+                ).values_list("short_code", flat=True)
+            ),
+            ["exp-0"],
+        )
+        self.assertIsNone(redirect_cache.get("exp-4"))
+        self.assertEqual(redirect_cache.get("exp-0").original_url, "http://expired.com")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIn("Deactivated 1", archive_expired_urls_task(batch_size=2))
+        self.assertIsNone(redirect_cache.get("exp-0"))
+
+    @patch("shortener.preview_client.AsyncPreviewFetcher._call_service")
+    def test_fetch_url_previews_task(self, mock_call_service):
+        """Test grouped preview fetching updates every URL in the batch."""
+        other = URL.objects.create(
+            short_code="task-other", original_url="https://other.com", owner=self.user
+        )
+
+        async def call_service(http, url):
+            return {"title": f"Title for {url}", "description": "Desc", "favicon": None}
+
+        mock_call_service.side_effect = call_service
+
+        result = fetch_url_previews_task([self.url_obj.short_code, other.short_code])
+
+        self.assertIn("2 URLs", result)
+        self.url_obj.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.url_obj.title, "Title for https://example.com")
+        self.assertEqual(other.title, "Title for https://other.com")
+
+
+class PreviewWorkerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="previewuser", email="preview@ex.com", password="password"
+        )
+        self.queue = PreviewQueue()
+        self.queue.client.delete(self.queue.key)
+        cache.clear()
+        preview_breaker.clear_local()
+
+    def tearDown(self):
+        self.queue.client.delete(self.queue.key)
+
+    @patch("shortener.preview_client.AsyncPreviewFetcher._call_service")
+    def test_pending_previews_are_fetched_in_batches(self, mock_call_service):
+        for n in range(5):
+            URL.objects.create(
+                short_code=f"pv{n}",
+                original_url=f"https://site{n}.com",
+                owner=self.user,
+            )
+        self.queue.add(f"pv{n}" for n in range(5))
+
+        async def call_service(http, url):
+            return {"title": url, "description": None, "favicon": None}
+
+        mock_call_service.side_effect = call_service
+
+        result = fetch_pending_previews_task(batch_size=2, max_batches=2)
+        self.assertIn("4 URLs", result)
+        self.assertEqual(len(self.queue), 1)
+
+        fetch_pending_previews_task(batch_size=2)
+        self.assertEqual(len(self.queue), 0)
+        self.assertEqual(
+            dict(
+                URL.objects.filter(short_code__startswith="pv").values_list(
+                    "short_code", "title"
+                )
+            ),
+            {f"pv{n}": f"https://site{n}.com" for n in range(5)},
+        )
+
+    def test_bad_url_does_not_fail_the_batch(self):
+        self.queue.add(["ok1", "bad", "ok2"])
+
+        def fetch_previews(short_codes):
+            if "bad" in short_codes:
+                raise ValueError("unparseable URL")
+            return len(short_codes)
+
+        with patch("shortener.tasks.fetch_previews", side_effect=fetch_previews):
+            result = fetch_pending_previews_task(batch_size=3)
+            self.assertIn("2 URLs", result)
+            # The bad code is dropped, not retried forever
+            self.assertEqual(len(self.queue), 0)
+
+    def test_failed_batch_is_requeued_when_nothing_succeeds(self):
+        self.queue.add(["pv1", "pv2"])
+
+        with patch("shortener.tasks.fetch_previews", side_effect=DatabaseError("down")):
+            with self.assertRaises(DatabaseError):
+                fetch_pending_previews_task(batch_size=2)
+
+        self.assertEqual(len(self.queue), 2)
+
+    @patch("shortener.preview_client.AsyncPreviewFetcher._call_service")
+    def test_concurrency_is_limited_per_domain(self, mock_call_service):
+        in_flight = {}
+        peak = {}
+
+        async def call_service(http, url):
+            domain = url.split("/")[2]
+            in_flight[domain] = in_flight.get(domain, 0) + 1
+            peak[domain] = max(peak.get(domain, 0), in_flight[domain])
+            peak["total"] = max(peak.get("total", 0), sum(in_flight.values()))
+            await asyncio.sleep(0.01)
+            in_flight[domain] -= 1
+            return {"title": None, "description": None, "favicon": None}
+
+        mock_call_service.side_effect = call_service
+        urls = [f"https://a.com/{n}" for n in range(4)]
+        urls += [f"https://b.com/{n}" for n in range(4)]
+
+        previews = AsyncPreviewFetcher(per_domain_limit=2).fetch_many(urls)
+
+        self.assertEqual(len(previews), 8)
+        self.assertEqual(peak["a.com"], 2)
+        self.assertEqual(peak["b.com"], 2)
+        self.assertEqual(peak["total"], 4)
+
+    @patch("shortener.preview_client.AsyncPreviewFetcher._call_service")
+    def test_failures_feed_the_circuit_breaker(self, mock_call_service):
+        async def call_service(http, url):
+            if "down.com" in url:
+                raise httpx.ConnectError("refused")
+            return {"title": "ok", "description": None, "favicon": None}
+
+        mock_call_service.side_effect = call_service
+        fetcher = AsyncPreviewFetcher()
+        urls = [f"https://down.com/{n}" for n in range(5)] + ["https://up.com/"]
+
+        previews = fetcher.fetch_many(urls)
+        self.assertTrue(
+            previews["https://down.com/0"]["description"].startswith("Fetch failed")
+        )
+        self.assertEqual(previews["https://up.com/"]["title"], "ok")
+
+        # Five failures opened the circuit: the domain is skipped without a call
+        calls = mock_call_service.call_count
+        previews = fetcher.fetch_many(["https://down.com/again"])
+        self.assertEqual(
+            previews["https://down.com/again"]["description"], "Circuit Open"
+        )
+        self.assertEqual(mock_call_service.call_count, calls)
+
+
+class ClickBufferTaskTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="bufferuser", email="buffer@ex.com", password="password"
+        )
+        self.url_a = URL.objects.create(
+            short_code="buf-a", original_url="https://a.com", owner=self.user
+        )
+        self.url_b = URL.objects.create(
+            short_code="buf-b", original_url="https://b.com", owner=self.user
+        )
+        self.buffer = ClickBuffer()
+        self.buffer_keys = (
+            self.buffer.key,
+            self.buffer.in_flight_key,
+            self.buffer.dead_letter_key,
+        )
+        self.buffer.client.delete(*self.buffer_keys)
+        self.counter = ClickCounter()
+        self.counter.client.delete(self.counter.key, self.counter.flushing_key)
+
+    def tearDown(self):
+        self.buffer.client.delete(*self.buffer_keys)
+        self.counter.client.delete(self.counter.key, self.counter.flushing_key)
+
+    def test_flush_click_buffer_task(self):
+        """Test buffered clicks are bulk-inserted and counters aggregated."""
+        for _ in range(3):
+            self.buffer.push("buf-a", {"ip_address": "8.8.8.8", "country": "US"})
+        self.buffer.push("buf-b", {"ip_address": "1.1.1.1", "country": "GH"})
+        # Clicks for unknown codes are dropped
+        self.buffer.push("missing", {"ip_address": "9.9.9.9"})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = flush_click_buffer_task(batch_size=2)
+
+        self.assertIn("Flushed 4", result)
+        self.assertEqual(len(self.buffer), 0)
+        self.assertIn("Flushed 4", flush_click_counts_task())
+        self.url_a.refresh_from_db()
+        self.url_b.refresh_from_db()
+        self.assertEqual(self.url_a.click_count, 3)
+        self.assertEqual(self.url_b.click_count, 1)
+        self.assertEqual(Click.objects.filter(url=self.url_a).count(), 3)
+        self.assertEqual(
+            Click.objects.get(url=self.url_b).country,
+            "GH",
+        )
+
+    def test_flush_geo_locates_clicks(self):
+        """Test the drain adds country and city from the GeoIP database."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "geoip.bin")
+            write_database(path, [("41.66.0.0", "41.66.255.255", "GH", "Accra")])
+            self.buffer.push("buf-a", {"ip_address": "41.66.1.1"})
+            self.buffer.push("buf-b", {"ip_address": "203.0.113.7"})
+
+            with patch("shortener.tasks.geo_enricher", GeoEnricher(path)):
+                flush_click_buffer_task()
+
+        click = Click.objects.get(url=self.url_a)
+        self.assertEqual((click.country, click.city), ("GH", "Accra"))
+        click = Click.objects.get(url=self.url_b)
+        self.assertEqual((click.country, click.city), (None, None))
+
+    def test_flush_preserves_redirect_timestamp(self):
+        """Test clicked_at reflects the redirect time, not the flush time."""
+        self.buffer.push("buf-a", {"ip_address": "8.8.8.8"})
+        pushed_at = timezone.now()
+
+        flush_click_buffer_task()
+
+        click = Click.objects.get(url=self.url_a)
+        self.assertLessEqual(click.clicked_at, pushed_at)
+
+    def test_failed_flush_keeps_clicks_for_next_run(self):
+        """Test a batch is not lost when the database write fails."""
+        self.buffer.push("buf-a", {"ip_address": "8.8.8.8"})
+        self.buffer.push("buf-b", {"ip_address": "1.1.1.1"})
+
+        with patch(
+            "shortener.tasks.ORMUrlRepository.log_clicks",
+            side_effect=DatabaseError("down"),
+        ):
+            with self.assertRaises(DatabaseError):
+                flush_click_buffer_task()
+
+        self.assertEqual(len(self.buffer.in_flight()), 2)
+        self.assertEqual(Click.objects.count(), 0)
+
+        self.assertIn("Flushed 2", flush_click_buffer_task())
+        self.assertEqual(self.buffer.in_flight(), [])
+        self.assertEqual(Click.objects.count(), 2)
+
+    def test_bad_click_event_is_dead_lettered(self):
+        """Test one bad event does not block the rest of its batch."""
+        self.buffer.push("buf-a", {"ip_address": "8.8.8.8"})
+        self.buffer.client.rpush(
+            self.buffer.key,
+            json.dumps({"short_code": "buf-b", "clicked_at": "not-a-date"}),
+        )
+
+        result = flush_click_buffer_task()
+
+        self.assertIn("Flushed 1", result)
+        self.assertEqual(Click.objects.get().url, self.url_a)
+        self.assertEqual(self.buffer.in_flight(), [])
+        self.assertEqual(self.buffer.client.llen(self.buffer.dead_letter_key), 1)
+
+    def test_flush_empty_buffer(self):
+        """Test flushing an empty buffer is a no-op."""
+        result = flush_click_buffer_task()
+        self.assertIn("Flushed 0", result)
+
+
+class ClickCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="counteruser", email="counter@ex.com", password="password"
+        )
+        self.url_a = URL.objects.create(
+            short_code="cnt-a", original_url="https://a.com", owner=self.user
+        )
+        self.url_b = URL.objects.create(
+            short_code="cnt-b", original_url="https://b.com", owner=self.user
+        )
+        self.counter = ClickCounter()
+        self.counter.client.delete(self.counter.key, self.counter.flushing_key)
+
+    def tearDown(self):
+        self.counter.client.delete(self.counter.key, self.counter.flushing_key)
+
+    def test_clicks_counted_without_touching_url_row(self):
+        """Test log_click only inserts the click; the increment goes to Redis."""
+        repo = ORMUrlRepository()
+        with self.captureOnCommitCallbacks(execute=True):
+            repo.log_click("cnt-a", {"country": "US"})
+            repo.log_click("cnt-a", {"country": "GH"})
+
+        self.url_a.refresh_from_db()
+        self.assertEqual(self.url_a.click_count, 0)
+        self.assertEqual(self.counter.pending([self.url_a.id])[self.url_a.id], 2)
+
+        self.assertIn("Flushed 2", flush_click_counts_task())
+        self.url_a.refresh_from_db()
+        self.assertEqual(self.url_a.click_count, 2)
+        self.assertEqual(self.counter.pending([self.url_a.id])[self.url_a.id], 0)
+
+    def test_rolled_back_clicks_are_not_counted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    ORMUrlRepository().log_click("cnt-a", {"country": "US"})
+                    raise RuntimeError("rollback")
+            except RuntimeError:
+                pass
+
+        self.assertEqual(self.counter.pending([self.url_a.id])[self.url_a.id], 0)
+
+    def test_partially_failed_flush_is_not_counted_twice(self):
+        # Two distinct deltas, so the flush runs two UPDATEs
+        self.counter.add({self.url_a.id: 3, self.url_b.id: 1})
+        update = QuerySet.update
+        calls = []
+
+        def fail_second_update(queryset, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 2:
+                raise DatabaseError("connection lost")
+            return update(queryset, **kwargs)
+
+        with patch.object(QuerySet, "update", fail_second_update):
+            with self.assertRaises(DatabaseError):
+                flush_click_counts_task()
+
+        self.assertIn("Flushed 4", flush_click_counts_task())
+        self.url_a.refresh_from_db()
+        self.url_b.refresh_from_db()
+        self.assertEqual((self.url_a.click_count, self.url_b.click_count), (3, 1))
+        self.assertEqual(self.counter.pending([self.url_a.id])[self.url_a.id], 0)
+
+    def test_failed_flush_is_retried(self):
+        self.counter.add({self.url_a.id: 3, self.url_b.id: 1})
+
+        def fail(deltas):
+            raise RuntimeError("database unavailable")
+
+        with self.assertRaises(RuntimeError):
+            self.counter.flush(fail)
+        # Clicks arriving meanwhile are kept apart from the claimed counts
+        self.counter.add({self.url_a.id: 1})
+        self.assertEqual(self.counter.pending([self.url_a.id])[self.url_a.id], 4)
+
+        self.assertIn("Flushed 4", flush_click_counts_task())
+        self.assertIn("Flushed 1", flush_click_counts_task())
+        self.url_a.refresh_from_db()
+        self.url_b.refresh_from_db()
+        self.assertEqual(self.url_a.click_count, 4)
+        self.assertEqual(self.url_b.click_count, 1)
+
+    def test_reads_include_pending_clicks(self):
+        URL.objects.filter(id=self.url_a.id).update(click_count=10)
+        self.counter.add({self.url_a.id: 2, self.url_b.id: 5})
+
+        data = URLDetailSerializer(
+            URL.objects.filter(owner=self.user).order_by("short_code"), many=True
+        ).data
+        self.assertEqual([row["click_count"] for row in data], [12, 5])
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get(
+            reverse("v1:url_analytics", kwargs={"short_code": "cnt-a"})
+        )
+        self.assertEqual(response.data["total_clicks"], 12)
@@ -0,0 +1,252 @@
+import json
+import logging
+from django.conf import settings
+from django.db import transaction
+from .connections import get_redis_client
+from .models import URL
+from .redirect_cache import RedirectRecord
+
+logger = logging.getLogger(__name__)
+
+# Moves up to ARGV[1] operations from the queue to the in-flight list in one
+# step, so a crash between claiming and applying never loses them
+CLAIM_SCRIPT = """
+local ops = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #ops > 0 then
+    redis.call('LTRIM', KEYS[1], #ops, -1)
+    redis.call('RPUSH', KEYS[2], unpack(ops))
+end
+return ops
+"""
+
+
+class WriteBehindQueue:
+    """
+    Durable Redis list of pending Postgres writes for WriteBehindUrlRepository.
+    Operations are claimed into an in-flight list and only removed (ack())
+    once applied, so after a crash the next drain replays them first.
+    Delivery is at-least-once: saves are upserts and replay safely, a click
+    can be counted twice if a drain dies between commit and ack().
+    Operations that keep failing are parked on a dead-letter list.
+    The queue lives in the same Redis database as RedisUrlRepository, so a
+    save and its queued write can commit in one MULTI/EXEC.
+    """
+
+    def __init__(self, client=None, key: str = None):
+        self.client = client or get_redis_client()
+        self.key = key or settings.WRITE_BEHIND_QUEUE_KEY
+        self.in_flight_key = f"{self.key}:in-flight"
+        self.dead_letter_key = f"{self.key}:dead"
+        self._claim = self.client.register_script(CLAIM_SCRIPT)
+
+    def push(self, *operations: dict, pipe=None) -> None:
+        """
+        Queue operations, optionally as part of the caller's pipeline.
+        """
+        if operations:
+            (pipe or self.client).rpush(
+                self.key, *(json.dumps(op) for op in operations)
+            )
+
+    def claim(self, batch_size: int) -> list:
+        """
+        Move up to batch_size operations to the in-flight list and return them.
+        """
+        raw_ops = self._claim(keys=[self.key, self.in_flight_key], args=[batch_size])
+        return self._decode(raw_ops)
+
+    def in_flight(self) -> list:
+        """
+        Operations claimed by a drain that never acknowledged them.
+        """
+        return self._decode(self.client.lrange(self.in_flight_key, 0, -1))
+
+    def ack(self) -> None:
+        self.client.delete(self.in_flight_key)
+
+    def dead_letter(self, operation: dict) -> None:
+        self.client.rpush(self.dead_letter_key, json.dumps(operation))
+
+    def pending_codes(self) -> set:
+        """
+        Short codes with operations still waiting to reach Postgres, including
+        dead-lettered ones (they never got there).
+        """
+        pipe = self.client.pipeline(transaction=False)
+        pipe.lrange(self.key, 0, -1)
+        pipe.lrange(self.in_flight_key, 0, -1)
+        pipe.lrange(self.dead_letter_key, 0, -1)
+        queued, in_flight, dead = pipe.execute()
+        return {op["short_code"] for op in self._decode(queued + in_flight + dead)}
+
+    def _decode(self, raw_ops) -> list:
+        ops = []
+        for raw in raw_ops or []:
+            try:
+                ops.append(json.loads(raw))
+            except ValueError:
+                logger.warning(f"Dropping malformed write-behind operation: {raw!r}")
+        return ops
+
+    def __len__(self) -> int:
+        return self.client.llen(self.key)
+
+
+def apply_operations(operations: list, orm_repo) -> None:
+    """
+    Apply a batch of queued operations to Postgres in one transaction:
+    saves first (one upsert; the last save of a code wins), then active
+    flag changes, then clicks through the ORM repository's log_clicks().
+    """
+    saves = {}
+    active_flags = {}
+    clicks = []
+    for op in operations:
+        if op["op"] == "save":
+            saves[op["short_code"]] = op
+        elif op["op"] == "set_active":
+            active_flags[op["short_code"]] = op["is_active"]
+        elif op["op"] == "click":
+            clicks.append(op)
+        else:
+            raise ValueError(f"Unknown write-behind operation '{op['op']}'")
+
+    with transaction.atomic():
+        if saves:
+            orm_repo.upsert_many(list(saves.values()))
+
+        for is_active in (True, False):
+            codes = [code for code, flag in active_flags.items() if flag == is_active]
+            if codes:
+                orm_repo.set_active_many(codes, is_active)
+
+        if clicks:
+            orm_repo.log_clicks(clicks)
+
+
+def drain_write_behind_queue(queue: WriteBehindQueue, orm_repo, batch_size: int):
+    """
+    Replay operations left in flight by a crashed drain, then apply the
+    operations queued when the run starts, batch_size at a time.
+    A batch that fails is retried one operation at a time so a single bad
+    operation is dead-lettered instead of blocking the queue. If every
+    operation fails (e.g. Postgres is down) the batch stays in flight for the
+    next run and the error is raised.
+    Returns the number of operations applied.
+    """
+    applied = 0
+    replay = queue.in_flight()
+    if replay:
+        logger.warning(f"Replaying {len(replay)} unacknowledged write-behind ops")
+        applied += _apply_batch(queue, replay, orm_repo)
+
+    remaining = len(queue)
+    while remaining > 0:
+        operations = queue.claim(min(batch_size, remaining))
+        if not operations:
+            break
+        remaining -= len(operations)
+        applied += _apply_batch(queue, operations, orm_repo)
+    return applied
+
+
+def _apply_batch(queue: WriteBehindQueue, operations: list, orm_repo) -> int:
+    try:
+        apply_operations(operations, orm_repo)
+        applied = len(operations)
+    except Exception as e:
+        logger.error(f"Write-behind batch failed, applying one by one: {e}")
+        applied = 0
+        failed = []
+        for op in operations:
+            try:
+                apply_operations([op], orm_repo)
+                applied += 1
+            except Exception as op_error:
+                failed.append((op, op_error))
+        if not applied:
+            raise
+        for op, op_error in failed:
+            logger.error(f"Dead-lettering write-behind op {op}: {op_error}")
+            queue.dead_letter(op)
+    queue.ack()
+    return applied
+
+
+def reconcile_url_stores(
+    redis_repo, queue: WriteBehindQueue, chunk_size: int = 1000, repair: bool = True
+) -> dict:
+    """
+    Compare the Redis repository with Postgres, the system of record, and
+    optionally repair the drift:
+    - URLs missing from Redis or whose Redis record differs (e.g. changed by
+      the management API or a bulk UPDATE) are rewritten from Postgres;
+    - codes only in Redis and with no pending write are removed from Redis.
+    Codes with queued writes are skipped, since Postgres has not caught up.
+    Returns counts per kind of drift.
+    """
+    pending = queue.pending_codes()
+    stats = {
+        "checked": 0,
+        "missing_in_redis": 0,
+        "stale_in_redis": 0,
+        "missing_in_db": 0,
+    }
+
+    url_objs = (
+        URL.objects.select_related("owner")
+        .only(
+            "short_code",
+            "original_url",
+            "expires_at",
+            "is_active",
+            "click_count",
+            "owner__tier",
+        )
+        .order_by("id")
+        .iterator(chunk_size=chunk_size)
+    )
+    chunk = []
+    for url_obj in url_objs:
+        chunk.append(url_obj)
+        if len(chunk) >= chunk_size:
+            _reconcile_chunk(redis_repo, chunk, pending, stats, repair)
+            chunk = []
+    if chunk:
+        _reconcile_chunk(redis_repo, chunk, pending, stats, repair)
+
+    orphaned = []
+    for codes in redis_repo.iter_codes(chunk_size):
+        known = pending.union(
+            URL.objects.filter(short_code__in=codes).values_list(
+                "short_code", flat=True
+            )
+        )
+        orphaned.extend(code for code in codes if code not in known)
+    # Codes saved while Redis was being scanned are pending by now
+    pending = queue.pending_codes()
+    orphaned = [code for code in orphaned if code not in pending]
+    stats["missing_in_db"] = len(orphaned)
+    if repair and orphaned:
+        redis_repo.delete_many(orphaned)
+
+    logger.info(f"URL store reconciliation: {stats}")
+    return stats
+
+
+def _reconcile_chunk(redis_repo, url_objs, pending, stats, repair) -> None:
+    records = redis_repo.get_many(url_obj.short_code for url_obj in url_objs)
+    drifted = []
+    for url_obj in url_objs:
+        if url_obj.short_code in pending:
+            continue
+        record = records.get(url_obj.short_code)
+        if record is None:
+            stats["missing_in_redis"] += 1
+            drifted.append(url_obj)
+        elif record != RedirectRecord.from_url(url_obj):
+            stats["stale_in_redis"] += 1
+            drifted.append(url_obj)
+    stats["checked"] += len(url_objs)
+    if repair and drifted:
+        redis_repo.sync_urls(drifted)